@@ -15,15 +15,41 @@ malfunctions are not warrantied by Minus Forty or Kinno
 
 import gc
 import utime
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    import uos as os
+except ImportError:
+    import os
 from umodbus.modbus import Modbus
+from umodbus import planner
+from umodbus.asyncmodbus import AsyncModbus
+from umodbus import scheduler as bus
+from umodbus.exceptions import CRCError, ExceptionResponse, IllegalDataAddress, IllegalFunction, ModbusError
+from umodbus.exceptions import NoResponseError
+from umodbus.retry import RetryPolicy
+from umodbus.cache import RegisterCache
+from umodbus.metrics import Metrics
+from umodbus.poller import Poller
+from umodbus.regmap import ModelRegistry, RegisterMap
+from umodbus.regmap import load as load_map
+from umodbus.snapshot import SnapshotReporter
+from umodbus.windowstats import WindowStats
+from umodbus.dutycycle import DutyCycle
+from umodbus import transaction
+from param import X34, Y39, alert_bits, change_letters, poll_schedule
 
 
 #####################################################################
 ##### Setup and Config for Ascon RCU in relation to ESP32 UART  #####
 #####################################################################
 
-# Custom SOCK for UART connection with 'FF' filter.
-s = Modbus()    # Modbus.py takes care of the protocol. Modified for our FF problem.
+# Custom SOCK for UART connection with 'FF' filter. Modbus.py takes care of the protocol. Modified for our FF problem.
+s = None    # Made by init() / init_sync(). Importing this module does not touch the UART or the RCU.
+param = None        # Register map of the RCU at slave ID 1 (default_unit.param). Set by init().
+boot_units = []     # RCUs found by init().
 
 # Collect Garbage to keep memory clean
 gc.collect()
@@ -33,27 +59,244 @@ door_previous = [0]         # Set the door to closed on initial startup.
 
 frequent_poll_data = {}     # Have blank dictionary created for storing data from polling.
 
+max_register_gap = planner.MAX_GAP     # Unwanted registers we will read to merge two requests into one block.
+
+retry_policy = RetryPolicy()    # Busy, silent or garbled RCU replies are asked for again with a backoff.
+
+metrics = Metrics()         # Round trip histograms and error counters of every transaction, for the diagnostics topic.
+retries_reported = 0        # retry_policy.retries at the last metrics_summary().
+
+a = None    # AsyncModbus on the same UART. Made on first use by async_client() so importing stays cheap.
+scheduler = None    # BusScheduler handing the async client out by priority. Made by bus_scheduler().
+gateway = None      # TcpGateway while the Modbus TCP server is running. See start_tcp_gateway().
+
+# Product code prefix -> register map. param.py's models here, the register map files in model_dir by load_models().
+models = ModelRegistry()
+models.add(('T', 'Y'), Y39)
+models.add(('X',), X34)
+model_dir = '/models'       # Register map files (*.map, see umodbus/regmap.py) for more RCU models. None: param.py's only.
+
+cache = RegisterCache()     # Values of slow changing registers, so repeat queries stay off the bus.
+
+# Cache classes by param.py register name. Registers not listed are config - set points, thresholds, delays, timers,
+# units, buzzer. Addresses in no register map (a cloud 'r' of any address) are treated as live.
+cache_classes = {'cabinet_temp': 'live', 'evap_temp': 'live',
+                 'door_status': 'status', 'alert_mask': 'status', 'rcu_memory_error': 'status',
+                 'compressor_status': 'status', 'defrost_status': 'status', 'lock_status': 'status'}
+cache_ttl_ms = {'live': 0, 'status': 1000, 'config': 600000, 'identity': None}     # 0 never cached, None forever.
+
+register_maps = {}          # param.py map -> RegisterMap. Compiled on first use, see register_map().
+full_snapshot_every = 24    # Parameter reports between two full snapshots. See umodbus/snapshot.py.
+temperature_slot_ms = 300000    # Min / max / mean / last of every temperature sample per slot. Sample rate in param.py.
+temperature_slots = 2           # Slots per temperature payload - one payload every 10 min.
+alert_tables = {}           # param.py map -> alert mask lookup table. Made on first use, see alert_table().
+
+# Alert state - one bit per alert, decoded from the alert mask (bits per model in param.alert_bits) and memory error.
+ALERT_HIGH_TEMP = 0x01
+ALERT_LOW_TEMP = 0x02
+ALERT_DOOR_OPEN = 0x04
+ALERT_MALFUNCTION = 0x08
+alert_names = {'high_temp': ALERT_HIGH_TEMP, 'low_temp': ALERT_LOW_TEMP, 'door_open': ALERT_DOOR_OPEN}
+# Event letters per alert - upper case when it comes on, lower case when it clears. Like 'C' / 'c' for the door.
+alert_letters = ((ALERT_HIGH_TEMP, 'H', 'h'), (ALERT_LOW_TEMP, 'L', 'l'), (ALERT_DOOR_OPEN, 'O', 'o'),
+                 (ALERT_MALFUNCTION, 'M', 'm'))
+
+identity_file = '/rcu_identity.txt'     # Detected RCUs kept on flash for a fast boot, None not to. See restore_units().
+
+scan_addresses = range(1, 9)    # Slave IDs tried by scan_bus(). RCUs ship as slave ID 1.
+scan_timeout_ms = None          # None: the client's response_timeout_ms. Any shorter takes a slow RCU for no RCU.
+init_timeout_ms = 30000         # init() gives up detecting RCUs after this long.
+detect_retry_ms = 2000          # Wait between detection attempts while no RCU answers.
+
+
+# One RCU on the RS-485 line. Several RCUs can share the bus (multi-drop), each with its own slave ID and model.
+class Unit:
+
+    def __init__(self, slave_addr=1, param_map=None):
+        self.slave_addr = slave_addr        # Modbus slave ID set on the RCU.
+        self.param = param_map              # Register map (param.py Y39 / X34, or a model file) for this RCU model.
+        self.product_code = ''
+        self.serial = None                  # RCU serial number. Also the MQTT topic for this unit.
+        self.frequent_poll_data = {}        # Last frequent poll results for this unit.
+        self.poller = None                  # Poller from param.poll_schedule. Made on the first poll_due().
+        self.reporter = None                # SnapshotReporter for parameter reports. Made by reporter_for().
+
+        self.alert_state = 0                # ALERT_* bits last reported. No alerts on boot, the most common state.
+        self.temperatures = None            # Samples waiting for the push. See temperature_stats_for().
+        self.duty = None                    # Compressor and defrost cycles of the window. See duty_cycle_for().
+
+
+default_unit = Unit()   # The RCU at slave ID 1. Gets the register map detected by init().
+
 #################################################
 ##### Tools and Functions For ASCON RCU     #####
 #################################################
 
 
-# Deinit For shutting down and restarting.
-def init():
-    s.init()      # Denit passed into Modbus.py Moodbus.py sets up the UART.
+# Opens the RCU bus. bus is anything from umodbus.transport (or a machine.UART), None for the RCU UART.
+def open_bus(bus=None):
+    global s
+    if s is None:
+        s = Modbus(bus)
+        s.metrics = metrics
+    return s
+
+
+# Open the RCU bus, add the model files (load_models()) and find the RCUs on it: the identities saved on flash if they
+# still match, otherwise a bus scan, tried again every detect_retry_ms until an RCU answers or timeout_ms is up. Awaits
+# the bus, so main.py can bring the modem up meanwhile. Returns the units found, [] if none. Also kept in boot_units.
+async def init(bus=None, timeout_ms=None):
+    open_bus(bus)
+    load_models()
+    return await detect(timeout_ms)
+
+
+# The RCU detection of init() on its own, to try again when init() found none.
+async def detect(timeout_ms=None):
+    try:
+        units = await asyncio.wait_for(_detect_async(), (timeout_ms or init_timeout_ms) / 1000)
+    except asyncio.TimeoutError:
+        print('No RCU detected within ' + str(timeout_ms or init_timeout_ms) + ' ms.')
+        units = []
+    return _detected(units)
+
+
+async def _detect_async():
+    while True:
+        units = await restore_units_async()
+        restored = bool(units)
+        if not units:
+            units = await scan_bus_async()
+        if units:
+            for unit in units:
+                unit.serial = (await identify_async(unit.slave_addr)).serial
+            if not restored:
+                save_identities()
+            return units
+        print('No RCU answered. Trying again in ' + str(detect_retry_ms) + ' ms.')
+        await asyncio.sleep(detect_retry_ms / 1000)
+
+
+# init() for code without an event loop. One attempt, blocking.
+def init_sync(bus=None):
+    open_bus(bus)
+    load_models()
+    units = restore_units()
+    restored = bool(units)
+    if not units:
+        units = scan_bus()
+    for unit in units:
+        unit.serial = identify(unit.slave_addr).serial
+    if units and not restored:
+        save_identities()
+    return _detected(units)
+
+
+def _detected(units):
+    global param, boot_units
+    boot_units = units
+    param = default_unit.param      # Register map for the RCU at slave ID 1.
+    if param is not None:
+        print(param.__name__ + ' Controller Detected!')
+    return units
 
 
 # Deinit For shutting down and restarting.
 def deinit():
-    s.deinit()      # Denit passed into Modbus.py Moodbus.py sets up the UART.
+    if s is not None:
+        stop_recording()
+        s.deinit()      # Denit passed into Modbus.py Moodbus.py sets up the UART.
+
+
+# Record every request and raw reply on the RCU bus to a ring file on flash, for replaying field problems on a PC
+# with benchmarks/replay.py. Sync and async clients share one recorder.
+def start_recording(path='/modbus.rec', max_bytes=32768):
+    from umodbus.recorder import Recorder      # Off unless asked for. Not loaded on every boot.
+    recorder = Recorder(path, max_bytes)
+    s.recorder = recorder
+    if a is not None:
+        a.recorder = recorder       # Otherwise async_client() hands it over when it makes the client.
+    return recorder
+
+
+def stop_recording():
+    recorder = s.recorder
+    if recorder is not None:
+        recorder.flush()        # Whatever is still in the RAM buffer.
+    s.recorder = None
+    if a is not None:
+        a.recorder = None
+
+
+# Async client for the uasyncio tasks in main.py. Shares the transport (the UART) Modbus.py set up.
+def async_client():
+    global a
+    if a is None:
+        a = AsyncModbus.from_transport(s.transport)
+        a.recorder = s.recorder
+        a.metrics = s.metrics
+    return a
+
+
+# One window of bus metrics as bytes (layout in umodbus/metrics.py) for the diagnostics topic. Starts the next window.
+def metrics_summary():
+    global retries_reported
+    payload = metrics.encode(max(0, retry_policy.retries - retries_reported))
+    retries_reported = retry_policy.retries
+    metrics.reset()
+    return payload
+
+
+# Every async RCU access queues here so door polls go before temperatures, cloud commands and parameter dumps.
+def bus_scheduler():
+    global scheduler
+    if scheduler is None:
+        scheduler = bus.BusScheduler(async_client())
+    return scheduler
+
+
+# Modbus TCP server on the PPP link for technicians and the backend. Requests queue at cloud command priority. The
+# gateway caches for ttl_ms on its own - set points held here for minutes are not served - and a write over TCP drops
+# the register from the register cache, so the next 'p' reads it again.
+async def start_tcp_gateway(port=502, ttl_ms=1000):
+    global gateway
+    from umodbus.tcpgateway import TcpGateway      # Off unless asked for. Not loaded on every boot.
+    stop_tcp_gateway()
+    gateway = TcpGateway(bus_scheduler().client(bus.PRIORITY_COMMAND), ttl_ms=ttl_ms, retry=retry_policy,
+                         max_gap=max_register_gap, default_slave=default_unit.slave_addr, shared_cache=cache)
+    await gateway.start(port)
+    print('Modbus TCP gateway listening on port %d' % port)
+    return gateway
+
+
+def stop_tcp_gateway():
+    global gateway
+    if gateway is not None:
+        gateway.stop()
+        gateway = None
+
+
+# Write-through for the register cache. The value the RCU echoed is cached as written. A failed write forgets the
+# register so the next read asks the RCU.
+def _cache_write(slave_addr, address, value):
+    if value is None:
+        cache.invalidate(slave_addr, address)
+    else:
+        cache.store(slave_addr, address, value, register_ttl.get(address, 0))
+
+
+# Forget everything cached about an RCU - register values and identity. The next queries go to the bus.
+def refresh(slave_addr=int(1)):
+    cache.invalidate(slave_addr)
+    identities.pop(slave_addr, None)
 
 
 # For Writing to the Ascon RCU via Modbus. Comes form MQTT messages.
-def write_register(register_address, value):
+def write_register(register_address, value, slave_addr=int(1)):
 
     try:
-        payload = s.write_single_register(slave_addr=int(1), register_address=register_address,
-                                          register_value=int(value))
+        payload = retry_policy.call(s.write_single_register, slave_addr, register_address, int(value))
+        _cache_write(slave_addr, int(str(register_address), 16), payload)
         return payload
 
     except ValueError as e:
@@ -66,69 +309,441 @@ def write_register(register_address, value):
         # Error Reporting. Broad error catch.
         print('Error in Writting Register ASCON module.')
         print(str(e))
+        cache.invalidate(slave_addr)        # Not sure what the RCU holds now.
         pass
 
 
-# General Query function for getting values from RCU
-def query_rcu(send_data_list, signed=True):
+# write_register for uasyncio tasks, queued on the bus at cloud command priority.
+async def write_register_async(register_address, value, slave_addr=int(1)):
+
+    try:
+        payload = await retry_policy.call_async(bus_scheduler().client(bus.PRIORITY_COMMAND).write_single_register,
+                                                slave_addr, register_address, int(value))
+        _cache_write(slave_addr, int(str(register_address), 16), payload)
+        return payload
 
-    update_values = []      # List to hold the values returned from send data list.
-    for i in range(len(send_data_list)):
+    except ValueError as e:
+        print("Hex Parameter: " + value + " NOT recognized by Controller")
+        print(str(e))
+
+    except Exception as e:
+        print('Error in Writting Register ASCON module.')
+        print(str(e))
+        cache.invalidate(slave_addr)
+
+
+# Register writes from a cloud command - (hex address, value) pairs - to {address: value} for the write planner.
+# Pairs that can not be used go into failed as given.
+def _write_values(writes, failed):
+
+    values = {}
+    for register, value in writes:
         try:
-            payload = s.read_holding_registers(starting_addr=send_data_list[i], slave_addr=int(1),
-                                               register_qty=int(1), signed=signed)     # Query the RCU.
+            values[int(str(register), 16)] = int(value)
+        except (TypeError, ValueError) as e:        # TypeError: no value given.
+            print("Hex Parameter: " + str(register) + " or value " + str(value) + " NOT usable.")
+            print(str(e))
+            failed.append(str(register))
+    return values
+
 
-            # Adding Returned values to make a list of all values at end of polling loop.
-            update_values = update_values + [payload]   # Might be better to 'update_values.append(payload)'
+def _write_failures(slave_addr, values, written, errors, failed):
+    # Hex addresses (as param.py writes them) of every value the RCU did not confirm. Updates the cache on the way.
+    for address, value in values.items():
+        _cache_write(slave_addr, address, value if address in written else None)
+        if address not in written:
+            print('Error Writting Register ' + hex(address) + ' - ' + str(errors.get(address)))
+            failed.append('%X' % address)
+    return failed
+
+
+# Several register writes in as few bus transactions as the addresses allow. Consecutive addresses go out as one
+# Write Multiple Registers. Returns the hex addresses that were NOT written - an empty list if all went through.
+def write_registers(writes, slave_addr=int(1)):
+
+    failed = []
+    values = _write_values(writes, failed)
+    errors = {}
+    try:
+        written = planner.write_planned(s, slave_addr, values, errors=errors, retry=retry_policy)
+    except Exception as e:
+        print('Error in Writting Registers ASCON module.')
+        print(e)
+        written = []
+    return _write_failures(slave_addr, values, written, errors, failed)
+
+
+# Several register writes as one transaction: the registers are read first, written in as few bus transactions as the
+# addresses allow, read back, and put back as they were if any did not take the new value (umodbus/transaction.py).
+# Returns a transaction.WriteResult - status() is the reply for the cloud. Nothing is written if a pair is not usable.
+def write_transaction(writes, slave_addr=int(1)):
+
+    invalid = []
+    values = _write_values(writes, invalid)
+    if invalid:
+        return transaction.refused(values, invalid)
+    try:
+        result = transaction.write_verified(s, slave_addr, values, retry=retry_policy, max_gap=max_register_gap)
+    except Exception as e:
+        print('Error in Writting Registers ASCON module.')
+        print(e)
+        result = _transaction_lost(values)
+    return _transaction_done(slave_addr, result)
+
+
+# write_transaction for uasyncio tasks, queued on the bus at cloud command priority.
+async def write_transaction_async(writes, slave_addr=int(1)):
+
+    invalid = []
+    values = _write_values(writes, invalid)
+    if invalid:
+        return transaction.refused(values, invalid)
+    try:
+        result = await transaction.write_verified_async(bus_scheduler().client(bus.PRIORITY_COMMAND), slave_addr,
+                                                        values, retry=retry_policy, max_gap=max_register_gap)
+    except Exception as e:
+        print('Error in Writting Registers ASCON module.')
+        print(e)
+        result = _transaction_lost(values)
+    return _transaction_done(slave_addr, result)
+
+
+def _transaction_lost(values):
+    # A transaction cut short by something other than a Modbus error. Any register may have changed.
+    result = transaction.WriteResult(values)
+    result.code = transaction.MIXED
+    result.failed = sorted(values)
+    result.unrestored = sorted(values)
+    return result
+
+
+def _transaction_done(slave_addr, result):
+    # The cache gets what the RCU holds after the transaction, as far as it is known.
+    if result.code == transaction.NOT_READ:
+        return result       # Nothing written.
+    for address, value in result.values.items():
+        if result.code == transaction.OK:
+            _cache_write(slave_addr, address, value)
+        elif result.code == transaction.ROLLED_BACK:
+            _cache_write(slave_addr, address, result.before[address])
+        else:
+            _cache_write(slave_addr, address, None)
+    if not result.ok():
+        print('Register write transaction ' + result.status())
+    return result
 
+
+# Compiled tables of a param.py register map - integer addresses sorted, names and signed flags beside them. Compiled
+# once per map. Registers the polling schedule reads unsigned (door, alert mask, memory error) are unsigned in every dump.
+def register_map(param_map):
+    regmap = register_maps.get(param_map)
+    if regmap is None:
+        regmap = register_maps[param_map] = RegisterMap(param_map, _unsigned_registers())
+    return regmap
+
+
+def _unsigned_registers():
+    return [name for name, (period_ms, priority, signed) in poll_schedule.items() if not signed]
+
+
+# Adds every register map file in directory (model_dir) to the models, compiled as it is read - a new controller is a
+# file copied to the gateway. Files that do not parse are reported and skipped. Returns the number of models loaded.
+def load_models(directory=None):
+    directory = directory or model_dir
+    if directory is None:
+        return 0
+    try:
+        files = sorted(os.listdir(directory))
+    except OSError:
+        return 0        # No model files on this gateway.
+    loaded = 0
+    for file in files:
+        if not file.endswith('.map'):
+            continue
+        try:
+            param_map, items, prefixes, alerts = load_map(directory + '/' + file, alert_names)
+        except (OSError, ValueError) as e:
+            print('Register map ' + file + ' not loaded.')
+            print(e)
+            continue
+        register_maps[param_map] = RegisterMap(param_map, _unsigned_registers(), items)
+        if alerts:
+            alert_bits[param_map] = alerts
+        models.add(prefixes, param_map)
+        loaded += 1
+    if loaded:
+        register_ttl.clear()
+        register_ttl.update(_register_ttl())
+    return loaded
+
+
+# Hex strings from param.py to integer addresses for the planner.
+def _to_addresses(send_data_list):
+
+    addresses = []      # Integer addresses in the same order as send data list. None if not a usable hex address.
+    for register in send_data_list:
+        try:
+            addresses.append(int(str(register), 16))
         except ValueError as e:
             # Error Reporting.
-            print("Hex Parameter: " + send_data_list[i] + " NOT recognized by Controller")
+            print("Hex Parameter: " + str(register) + " NOT recognized by Controller")
             print(str(e))
-            pass
+            addresses.append(None)
+    return addresses
+
+
+def _report_errors(errors):
+    # Error Reporting. CRC failures are reported on their own - the RCU answered but the line is noisy.
+    for address, error in errors.items():
+        if isinstance(error, CRCError):
+            print('CRC error reading register ' + hex(address) + ' - ' + str(error))
+        elif isinstance(error, IllegalDataAddress):
+            print('RCU has no register ' + hex(address) + ' - ' + str(error))
+        elif isinstance(error, ExceptionResponse):
+            print('RCU refused register ' + hex(address) + ' - ' + str(error))
+        elif isinstance(error, NoResponseError):
+            print('I/O error - Device slave ID NOT found reading register ' + hex(address))
+        else:
+            print('Other Error in Reading Register ' + hex(address) + ' from RCU.')
+            print(error)
+
+
+# Cached values for the addresses into results. Returns the addresses that still have to be read from the RCU.
+def _from_cache(addresses, slave_addr, signed, results):
+    wanted = []
+    for address in addresses:
+        if address is None or address in results:
+            continue
+        value = cache.lookup(slave_addr, address, signed) if register_ttl.get(address, 0) != 0 else None
+        if value is None:
+            wanted.append(address)
+        else:
+            results[address] = value
+    return wanted
 
-        except IOError as e:
-            # Error Reporting.
-            print('I/O error - Device slave ID NOT found')
-            print(str(e))
-            pass
-        except Exception as e:
-            # Error Reporting.
-            print('Other Error in Reading Register from RCU.')
-            print(e)
-            pass
-    # Return the full list of values from controller.
-    return update_values
 
+def _to_cache(values, slave_addr):
+    for address, value in values.items():
+        cache.store(slave_addr, address, value, register_ttl.get(address, 0))
 
-# Temperature Function
-def get_temperatures():
 
-    temperatures_list = [param.cabinet_temp, param.evap_temp]       # Hex addresses from param.py
-    return query_rcu(temperatures_list)                             # Query the RCU and return values.
+# Reads integer addresses into {address: value}. Neighbouring registers are fetched as one block read, registers
+# with a fresh cached value are answered from the cache. Registers that could not be read are left out.
+def _read(addresses, signed, slave_addr):
 
+    errors = {}         # Address -> ModbusError for every register that could not be read.
+    results = {}
+    wanted = _from_cache(addresses, slave_addr, signed, results)
+    try:
+        if wanted:
+            values = planner.read_planned(s, slave_addr, wanted, signed=signed, max_gap=max_register_gap,
+                                          errors=errors, retry=retry_policy)    # As few blocks as possible.
+            _to_cache(values, slave_addr)
+            results.update(values)
+    except Exception as e:
+        # Error Reporting.
+        print('Other Error in Reading Register from RCU.')
+        print(e)
+
+    _report_errors(errors)
+    return results
 
-# Frequent Polling operations
-def frequent_polling():
 
-    global frequent_poll_data       # Global to hold our returns
+# _read for uasyncio tasks. Other tasks keep running while the RCU answers. Each block read is queued on the
+# bus scheduler at the given priority.
+async def _read_async(addresses, signed, priority, slave_addr):
 
+    errors = {}
+    results = {}
+    wanted = _from_cache(addresses, slave_addr, signed, results)
     try:
+        if wanted:
+            values = await planner.read_planned_async(bus_scheduler().client(priority), slave_addr, wanted,
+                                                      signed=signed, max_gap=max_register_gap, errors=errors,
+                                                      retry=retry_policy)
+            _to_cache(values, slave_addr)
+            results.update(values)
+    except Exception as e:
+        print('Other Error in Reading Register from RCU.')
+        print(e)
+
+    _report_errors(errors)
+    return results
+
+
+# General Query function for getting values from RCU, by hex address string (the cloud 'r' command).
+def query_rcu(send_data_list, signed=True, slave_addr=int(1)):
+
+    addresses = _to_addresses(send_data_list)
+    results = _read(addresses, signed, slave_addr)
+
+    # Return the full list of values from controller. Same order as asked.
+    return [results.get(i) if i is not None else None for i in addresses]
+
+
+# query_rcu for uasyncio tasks.
+async def query_rcu_async(send_data_list, signed=True, priority=bus.PRIORITY_COMMAND, slave_addr=int(1)):
+
+    addresses = _to_addresses(send_data_list)
+    results = await _read_async(addresses, signed, priority, slave_addr)
+    return [results.get(i) if i is not None else None for i in addresses]
+
+
+# Integer addresses of named registers in the map of a unit.
+def _addresses(unit, names):
+    regmap = register_map(unit.param)
+    return [regmap.address(name) for name in names]
+
+
+# Poller for a unit from the polling schedule in param.py. Registers its map does not have are left out.
+def poller_for(unit):
+    regmap = register_map(unit.param)
+    registers = []
+    for name, (period_ms, priority, signed) in poll_schedule.items():
+        if name in regmap.index:
+            registers.append((name, regmap.address(name), period_ms, priority, signed))
+    return Poller(registers)
+
+
+def _polled(unit, values):
+    # Scheduled reads are as fresh as it gets. Keep them for 'p' and other readers of the cache.
+    regmap = register_map(unit.param)
+    for name, value in values.items():
+        address = regmap.address(name)
+        cache.store(unit.slave_addr, address, value, register_ttl.get(address, 0))
+    return values
+
+
+# Reads the registers of a unit that are due on the polling schedule, as few block reads as possible.
+# Returns ({name: value} read this time, [(name, old value, new value)] for every register that changed).
+def poll_due(unit=None):
+    unit = unit or default_unit
+    if unit.poller is None:
+        unit.poller = poller_for(unit)
+    values, changes = unit.poller.poll(s, unit.slave_addr, retry=retry_policy, max_gap=max_register_gap)
+    return _polled(unit, values), changes
+
+
+# poll_due for uasyncio tasks. Each priority on the schedule is queued at that priority on the bus scheduler.
+async def poll_due_async(unit=None):
+    unit = unit or default_unit
+    if unit.poller is None:
+        unit.poller = poller_for(unit)
+    values, changes = await unit.poller.poll_async(bus_scheduler().client, unit.slave_addr, retry=retry_policy,
+                                                   max_gap=max_register_gap)
+    return _polled(unit, values), changes
+
+
+# Milliseconds until any of the units has a register due. 0 before the first poll.
+def ms_until_due(units):
+    waits = [unit.poller.ms_until_due() for unit in units if unit.poller is not None]
+    waits = [wait for wait in waits if wait is not None]
+    if len(waits) < len(units):
+        return 0
+    return min(waits) if waits else None
+
+
+alert_registers = ('alert_mask', 'rcu_memory_error')        # Decoded together into the ALERT_* bits.
+
+
+# Event messages for the changes of a scheduled poll (poll_due): the param.py change_letters letter for the value a
+# register turned to, and an alert_event() if the alert mask or memory error turned an alert on or off. A register
+# read for the first time changed from 0 - door closed, no alerts - as nothing was reported before.
+def change_events(unit, changes):
+    events = []
+    alerts = False
+    for name, old, new in changes:
+        if name in alert_registers:
+            alerts = True
+            continue
+        letters = change_letters.get(name)
+        if letters is None or new == (old or 0):
+            continue
+        if 0 <= new < len(letters):
+            events.append(letters[new])
+        else:
+            print('Unexpected ' + name + ' ' + str(new) + ' from slave ID ' + str(unit.slave_addr) + '.')
+    if alerts:
+        values = unit.poller.values
+        if values.get('alert_mask') is not None and values.get('rcu_memory_error') is not None:
+            state = decode_alerts(alert_table(unit.param), values['alert_mask'], values['rcu_memory_error'])
+            changed = state ^ unit.alert_state
+            if changed:
+                events.append(alert_event(changed, state))
+                unit.alert_state = state
+    return events
+
+
+# Temperature Function
+def get_temperatures(unit=None):
+
+    unit = unit or default_unit
+    addresses = _addresses(unit, temperature_registers)
+    results = _read(addresses, True, unit.slave_addr)       # Query the RCU and return values.
+    return [results.get(address) for address in addresses]
+
+
+temperature_registers = ('cabinet_temp', 'evap_temp')     # Channels of the temperature payload, in this order.
+
+
+# Temperature samples of a unit as min / max / mean / last per slot (umodbus/windowstats.py). Made on first use.
+def temperature_stats_for(unit):
+    if unit.temperatures is None:
+        unit.temperatures = WindowStats(len(temperature_registers), temperature_slots, temperature_slot_ms)
+    return unit.temperatures
+
+
+# Adds the temperatures of a scheduled poll to the unit's window. False if a temperature was missing.
+def add_temperatures(unit, values):
+    stats = temperature_stats_for(unit)
+    stats.roll()
+    complete = True
+    for channel in range(len(temperature_registers)):
+        value = values.get(temperature_registers[channel])
+        if value is None:
+            complete = False
+        else:
+            stats.add(channel, value)
+    return complete
+
+
+duty_registers = ('compressor_status', 'defrost_status')    # Channels of the duty cycle payload, in this order.
+
+
+# Compressor and defrost on time and cycles of a unit per payload window (umodbus/dutycycle.py). Made on first use.
+def duty_cycle_for(unit):
+    if unit.duty is None:
+        unit.duty = DutyCycle(len(duty_registers))
+    return unit.duty
+
+
+# Feeds the compressor and defrost status of a scheduled poll to the unit's duty cycles. Registers not read this time
+# (not due, no answer, not in the unit's map) change nothing.
+def update_duty_cycles(unit, values):
+    duty = duty_cycle_for(unit)
+    now = utime.ticks_ms()
+    for channel in range(len(duty_registers)):
+        value = values.get(duty_registers[channel])
+        if value is not None:
+            duty.update(channel, value, now)
 
-        # Door Status query - Get status of the door right now.
-        door_now = query_rcu([param.door_status])[0]  # Query the RCU for the current door status.
-        utime.sleep_ms(200)     # Give time for Ascon RCU before next question.
 
-        frequent_poll_data = {'door_status': door_now}      # Add door status to the frequent poll data return.
+frequent_registers = ('door_status', 'alert_mask', 'rcu_memory_error')     # Read by frequent polling as one plan.
 
-        # Defrost Status - Get status of defrost right now.
-        # defrost_status = query_rcu([param.defrost_status])[0]  # Query the RCU for the current defrost status.
-        # utime.sleep_ms(200)     # Give time for Ascon RCU before next question.
-        # frequent_poll_data['defrost_status'] = defrost_status  # Add defrost status to the frequent poll data return.
 
-        get_alert_status()      # Query the Alert Register.
+# Door, alert mask and memory error of a unit. Signed false as the alert mask is a bitmask.
+def _frequent_values(unit, results):
+    return [results.get(address) for address in _addresses(unit, frequent_registers)]
 
-        return frequent_poll_data
+
+# Frequent Polling operations
+def frequent_polling(unit=None):
+
+    unit = unit or default_unit
+    try:
+        # Door, alert mask and memory error in one planned read.
+        results = _read(_addresses(unit, frequent_registers), False, unit.slave_addr)
+        return _frequent_results(*_frequent_values(unit, results), unit=unit)
 
     except Exception as e:
         print('Error in Frequent Polling! - ASCON MODULE')
@@ -136,193 +751,480 @@ def frequent_polling():
         pass
 
 
-# Alert Management
-def get_alert_status():     # TODO have this return values NOT use global dictionary.
-
-    global frequent_poll_data
-
-    # Alerts
-    utime.sleep_ms(200)
-    alert_mask = query_rcu([param.alert_mask], signed=False)  # Alert Mask - Signed false as it returns mask.
-    utime.sleep_ms(200)
-    # print('RAW ALERT MASK IS: ' + str(alert_mask))    # DEBUG
-
-    # Check for errors, bad returns, known non-responses (Type None or String).
-    if type(alert_mask[0]) is int and alert_mask[0] > 0:    # make sure the return is usable.
-
-        # Turn decimal returned to bitmask using function.
-        alert_mask = dec_to_bitmask(alert_mask[0])      # Convert the decimal response to the bitrange we can use.
-        # print('ALERT MASK IS: ' + alert_mask)     # For debugging the alert mask conversion.
-
-        # High-Temp Alert
-        if alert_mask[6] == '1':  # TODO Have separate params for X34 and Y39 bitmask params.
-            # print('High Temp Alert')
-            frequent_poll_data['high_temp_alert'] = 'yes'
-            # alert('high_temp')
-        if alert_mask[6] == '0':
-            frequent_poll_data['high_temp_alert'] = 'no'
-            # print('NO - High Temp Alert')
-
-        # Low Temp Alert
-        if alert_mask[5] == '1':
-            # print('Low Temp Alert')
-            frequent_poll_data['low_temp_alert'] = 'yes'
-            # alert('high_temp')
-        if alert_mask[5] == '0':
-            frequent_poll_data['low_temp_alert'] = 'no'
-            # print('NO - Low Temp Alert')
-
-        # Door Open Alert
-        if alert_mask[4] == '1':
-            # print('Door Open Alert')
-            frequent_poll_data['door_open_alert'] = 'yes'
-            # alert('high_temp')
-        if alert_mask[4] == '0':
-            frequent_poll_data['door_open_alert'] = 'no'
-            # print('NO Door Open Alert')
-        else:
-            print('Negative RCU alert mask.')
-            pass
-    else:
-        frequent_poll_data['high_temp_alert'] = 'no'
-        frequent_poll_data['low_temp_alert'] = 'no'
-        frequent_poll_data['door_open_alert'] = 'no'
+# Build the frequent poll dictionary from the door, alert mask and memory error values.
+def _frequent_results(door_now, alert_mask, mem_err, unit):
+
+    global frequent_poll_data       # Global to hold our returns for the RCU at slave ID 1.
 
-    # Malfunctioning Alert
-    mem_err = query_rcu(['299'])
-    # print(mem_err)
-    if mem_err[0] == 1:
-        # print('Memory Error')
-        frequent_poll_data['malfunctioning_alert'] = 'yes'
-        # alert('high_temp')
-    if mem_err[0] == 0:
-        frequent_poll_data['malfunctioning_alert'] = 'no'
-        # print('NO - Memory Error')
+    if door_now is None or alert_mask is None or mem_err is None:
+        # Still no answer after the retries. Skip this poll rather than report made up door and alert changes.
+        print('Frequent poll incomplete for slave ID ' + str(unit.slave_addr) + '. Skipped.')
+        return None
 
-        # TODO Power Out Alert
-        # TODO Check GPIO for voltage
+    # Door status and the decoded Alert Register.
+    poll_data = {'door_status': door_now, 'alert_state': decode_alerts(alert_table(unit.param), alert_mask, mem_err)}
 
+    # Defrost Status - Get status of defrost right now.
+    # defrost_status = query_rcu([param.defrost_status])[0]  # Query the RCU for the current defrost status.
+    # frequent_poll_data['defrost_status'] = defrost_status  # Add defrost status to the frequent poll data return.
 
-# Converts decimal value returned by RCU to bitmask to then compare for active alerts.
-def dec_to_bitmask(decimal_value):
-    num_of_bits = 16  # Zfill number of total bits in bitmask.
-    alert_mask = bin(decimal_value)[2:]     # Convert to Binary and strip the string b'
-    alert_mask = zfill(alert_mask, num_of_bits) # Use zfill function to fill out preceding 0's
-    return alert_mask
+    unit.frequent_poll_data = poll_data
+    if unit is default_unit:
+        frequent_poll_data = poll_data
+    return poll_data
+
+
+# Alert Management. The alert mask of a model is decoded through a lookup table made from its bits in param.py: the
+# alert state bits for every value of the low byte, then of the high byte. Two lookups and an OR per poll.
+def alert_table(param_map):
+    table = alert_tables.get(param_map)
+    if table is None:
+        table = bytearray(512)
+        for name, bit in alert_bits.get(param_map, ()):
+            for value in range(256):
+                if value >> (bit & 7) & 1:
+                    table[(bit >> 3) * 256 + value] |= alert_names[name]
+        alert_tables[param_map] = table
+    return table
+
+
+# Alert state bits from the alert mask and memory error values.
+def decode_alerts(table, alert_mask, mem_err):
+    state = table[alert_mask & 0xFF] | table[256 + (alert_mask >> 8 & 0xFF)]
+    if mem_err == 1:
+        state |= ALERT_MALFUNCTION
+    # TODO Power Out Alert - check GPIO for voltage.
+    return state
+
+
+# Event message for the alerts in changed (state XOR the last state) - one letter per alert, upper case if it is on
+# in state now, lower case if it cleared. Only made when something changed.
+def alert_event(changed, state):
+    msg = ''
+    for bit, on, off in alert_letters:
+        if changed & bit:
+            msg += on if state & bit else off
+    return msg
 
 
 # Get controller information
-def get_rcu_serial():
-    try:
-        send_data_list = ['CF44', 'CF43', 'CF42']       # The serial number located in these register.
+serial_registers = ['CF44', 'CF43', 'CF42']             # The serial number located in these register.
+firmware_registers = ['CF12', 'CF13']                   # Firmware located in these registers.
+type_registers = ['CF38', 'CF39', 'CF3A', 'CF3B']       # RCU name contained in these registers.
 
-        serial_number_hex = ''      # Set the string container for the serial number.
+# All of the above as integers. CF12 to CF44 is 51 registers, so with identity_gap the planner reads the lot as one
+# block. An RCU that refuses the unmapped registers in between gets the three runs instead, remembered after that.
+identity_addresses = [int(register, 16) for register in firmware_registers + type_registers + serial_registers]
+identity_gap = 48
 
-        for i in range(len(send_data_list)):
-            try:
-                pay_load = s.read_holding_registers(starting_addr=send_data_list[i], slave_addr=int(1),
-                                                   register_qty=int(1))
-                hex_serial = hex(int(pay_load))     # Convert the payload
+identities = {}         # Slave ID -> RcuIdentity. Valid identities only, reused until refreshed.
+no_device_id = set()    # Slave IDs that answered Read Device Identification with ILLEGAL_FUNCTION.
 
-                serial_number_hex = serial_number_hex + hex_serial[2:]      # Add the results together.
 
-            except Exception as e:
-                print("Error Communicating with RCU for determining Serial Number.")
-                print(str(e))
-                pass
-        # serial_number = int.from_bytes(str.encode(serial_number_hex), byteorder=sys.byteorder)
-        serial_number = str(int(serial_number_hex, 16))
-        return str(serial_number)
-    except Exception as e:
-        print('Error Getting RCU Serial.')
-        print(e)
+# Cache time to live for every address in the register maps and the identity block. Where two models use an address
+# for different registers the shorter time wins.
+def _register_ttl():
+    ttl = {}
+    for model in models.maps():
+        regmap = register_map(model)
+        for i in range(len(regmap)):
+            address = regmap.addresses[i]
+            ttl_ms = cache_ttl_ms[cache_classes.get(regmap.names[i], 'config')]
+            if address not in ttl or ttl[address] is None or (ttl_ms is not None and ttl_ms < ttl[address]):
+                ttl[address] = ttl_ms
+    for address in identity_addresses:
+        ttl[address] = cache_ttl_ms['identity']
+    return ttl
+
 
+register_ttl = _register_ttl()      # Address -> cache time to live in ms. 0 never cached, None never expires.
 
-def get_rcu_fw():
-    send_data_list = ['CF12', 'CF13']       # Firmware located in these registers.
-    payload = 'N/A'                         # Payload set to N/A
 
-    for i in range(len(send_data_list)):
+# Serial number string from the serial register values.
+def _serial_from(values):
+    serial_number_hex = ''      # Set the string container for the serial number.
+
+    for pay_load in values:
         try:
-            payload = s.read_holding_registers(starting_addr=send_data_list[i], slave_addr=int(1),
-                                               register_qty=int(1))
+            hex_serial = hex(int(pay_load))     # Convert the payload
+            serial_number_hex = serial_number_hex + hex_serial[2:]      # Add the results together.
+
         except Exception as e:
-            print("Error in determining the Firmware version of RCU.")
+            print("Error Communicating with RCU for determining Serial Number.")
             print(str(e))
             pass
-
-    return payload
+    # serial_number = int.from_bytes(str.encode(serial_number_hex), byteorder=sys.byteorder)
+    serial_number = str(int(serial_number_hex, 16))
+    return str(serial_number)
 
 
-# RCU name
-def get_rcu_type():
-    send_data_list = ['CF38', 'CF39', 'CF3A', 'CF3B']       # RCU name contained in these registers.
+# Product code string ('Y39...') from the type register values.
+def _product_code_from(values):
     product_code = ''
 
-    for i in range(len(send_data_list)):
+    for pay_load in values:
         try:
-            pay_load = s.read_holding_registers(starting_addr=send_data_list[i], slave_addr=int(1),
-                                               register_qty=int(1))
             if pay_load == 0:
                 break
-            else:
-                pass
 
             letter = convert_to_ascii(pay_load)             # Convert the result to a letter.
             product_code = product_code + str(letter)       # Add em up!
 
-
         except Exception as e:
             print('Error Retrieving RCU Type. RCU not communicating or no register exist for model type.')
             print(e)
             return 'RCU Not Recognized'
-            pass
     return product_code
 
 
-# Param Pull
-def get_rcu_param():
+# Product code, serial number and firmware of one RCU. Read together by identify() and kept in identities.
+class RcuIdentity:
+
+    def __init__(self, slave_addr=1):
+        self.slave_addr = slave_addr
+        self.product_code = 'RCU Not Recognized'
+        self.serial = None
+        self.firmware = None
+        self.reads = 0          # Bus transactions the identification took, retries included.
+
+    def is_valid(self):
+        return self.product_code not in ('', 'RCU Not Recognized')
+
+    def load_registers(self, values):
+        # From the {address: value} identity block read. Registers that could not be read are None.
+        type_values = [values.get(int(register, 16)) for register in type_registers]
+        serial_values = [values.get(int(register, 16)) for register in serial_registers]
+        self.product_code = _product_code_from(type_values)
+        if None not in serial_values:
+            self.serial = _serial_from(serial_values)
+        self.firmware = values.get(int(firmware_registers[-1], 16))
+
+    def load_objects(self, objects):
+        # From Read Device Identification - object 1 is the product code, 2 the major / minor revision.
+        if 1 in objects:
+            self.product_code = objects[1].decode()
+        if 2 in objects:
+            self.firmware = objects[2].decode()
+
+    def as_dict(self):
+        return {"RCU Type": self.product_code, "RCU Serial": self.serial, "RCU Firmware": self.firmware}
+
+
+# Identify the RCU at slave_addr. The identity block is read in as few block reads as the RCU allows. If the RCU has
+# no type registers, Read Device Identification (0x2B) is tried for the product code and firmware. A valid result
+# is cached and returned again until refresh is asked for.
+def identify(slave_addr=int(1), refresh=False):
 
-    # Using the python dir to collect all variables in the class. Except built in namespaces ('__').
-    param_list = [a for a in dir(param) if not a.startswith('__')]
+    identity = identities.get(slave_addr)
+    if identity is not None and not refresh:
+        return identity
+
+    identity = RcuIdentity(slave_addr)
+    tries = retry_policy.tries
+    errors = {}
+    try:
+        identity.load_registers(planner.read_planned(s, slave_addr, identity_addresses, signed=False,
+                                                     max_gap=identity_gap, errors=errors, retry=retry_policy))
+        if not identity.is_valid() and slave_addr not in no_device_id:
+            identity.load_objects(retry_policy.call(s.read_device_identification, slave_addr))
+    except IllegalFunction:
+        no_device_id.add(slave_addr)        # Not supported by this model. Do not ask again.
+    except (ModbusError, ValueError) as e:
+        print('Error Identifying RCU.')
+        print(e)
+    _report_errors(errors)
+
+    identity.reads = retry_policy.tries - tries
+    if identity.is_valid():
+        identities[slave_addr] = identity
+    return identity
 
-    rcu_param_list = []     # Set up list for holding parameters from param.py (param_list).
-    rcu_query_list = []     # Set up list for holding the query to be sent to RCU.
 
-    for i in param_list:                        # cycle through the parameters from dir(param).
-        rcu_param_list.append('param.' + i)     # append each parameter into a list.
+# identify() for uasyncio tasks. Queued as a bulk job.
+async def identify_async(slave_addr=int(1), refresh=False):
+
+    identity = identities.get(slave_addr)
+    if identity is not None and not refresh:
+        return identity
+
+    client = bus_scheduler().client(bus.PRIORITY_BULK)
+    identity = RcuIdentity(slave_addr)
+    tries = retry_policy.tries
+    errors = {}
+    try:
+        identity.load_registers(await planner.read_planned_async(client, slave_addr, identity_addresses,
+                                                                 signed=False, max_gap=identity_gap, errors=errors,
+                                                                 retry=retry_policy))
+        if not identity.is_valid() and slave_addr not in no_device_id:
+            identity.load_objects(await retry_policy.call_async(client.read_device_identification, slave_addr))
+    except IllegalFunction:
+        no_device_id.add(slave_addr)
+    except (ModbusError, ValueError) as e:
+        print('Error Identifying RCU.')
+        print(e)
+    _report_errors(errors)
 
-    for i in rcu_param_list:                    # Make the string into a variable using eval().
-        rcu_query_list.append(eval(i))          # append the variable to the list to be sen to RCU.
+    identity.reads = retry_policy.tries - tries
+    if identity.is_valid():
+        identities[slave_addr] = identity
+    return identity
 
-    rcu_param_results = query_rcu(rcu_query_list)       # Query the RCU.
 
-    rcu_dictionary = {}                                 # Empty dictionary to hold the response from RCU.
-    x = 0
-    for i in param_list:
-        rcu_dictionary[i] = rcu_param_results[x]        # combine the name and the value again for dictionary.
-        x = x + 1
+# Single identity values, from the cached RcuIdentity.
+def get_rcu_serial(slave_addr=int(1)):
+    return identify(slave_addr).serial
 
-    return rcu_dictionary
+
+async def get_rcu_serial_async(slave_addr=int(1)):
+    return (await identify_async(slave_addr)).serial
+
+
+def get_rcu_fw(slave_addr=int(1)):
+    return identify(slave_addr).firmware
+
+
+async def get_rcu_fw_async(slave_addr=int(1)):
+    return (await identify_async(slave_addr)).firmware
+
+
+# RCU name
+def get_rcu_type(slave_addr=int(1)):
+    return identify(slave_addr).product_code
+
+
+async def get_rcu_type_async(slave_addr=int(1)):
+    return (await identify_async(slave_addr)).product_code
+
+
+# Register map for a product code, from param.py or a model file. None if no model prefix matches.
+def model_for(product_code):
+    if not product_code:
+        return None
+    return models.lookup(product_code)
+
+
+# Find every RCU on the RS-485 line. Reads the type registers from each slave ID as one block, scan_timeout_ms each.
+# Returns a Unit with the detected register map for each RCU that answered with a known product code.
+def scan_bus(addresses=scan_addresses, timeout_ms=scan_timeout_ms):
+
+    units = []
+    start = int(type_registers[0], 16)      # Type registers are contiguous - one read per slave ID.
+    for slave_addr in addresses:
+        try:
+            values = s.read_holding_register_block(slave_addr, start, len(type_registers), True, timeout_ms)
+        except NoResponseError:
+            continue        # Nothing at this slave ID.
+        except Exception as e:
+            print('Error scanning slave ID ' + str(slave_addr) + ' on the RCU bus.')
+            print(e)
+            continue
+        _scanned(units, slave_addr, values)
+
+    return units
+
+
+# scan_bus() for uasyncio tasks.
+async def scan_bus_async(addresses=scan_addresses, timeout_ms=scan_timeout_ms):
+
+    units = []
+    client = bus_scheduler().client(bus.PRIORITY_BULK)
+    start = int(type_registers[0], 16)
+    for slave_addr in addresses:
+        try:
+            values = await client.read_holding_register_block(slave_addr, start, len(type_registers), True,
+                                                              timeout_ms)
+        except NoResponseError:
+            continue
+        except Exception as e:
+            print('Error scanning slave ID ' + str(slave_addr) + ' on the RCU bus.')
+            print(e)
+            continue
+        _scanned(units, slave_addr, values)
+
+    return units
+
+
+# A Unit for the RCU that answered the scan at slave_addr with the type register values, if the model is known.
+def _scanned(units, slave_addr, values):
+
+    product_code = _product_code_from(values)
+    param_map = model_for(product_code)
+    if param_map is None:
+        print('Slave ID ' + str(slave_addr) + ' RCU Type Not recognized: ' + product_code)
+        return
+
+    unit = default_unit if slave_addr == default_unit.slave_addr else Unit(slave_addr)
+    unit.param = param_map
+    unit.product_code = product_code
+    units.append(unit)
+    print(product_code + ' Controller Detected at slave ID ' + str(slave_addr) + '!')
+
+
+# Keep the identities of the detected RCUs on flash - one 'slave ID,product code,serial,firmware' line each - so the
+# next boot can skip detection. Only written when something changed, to spare the flash.
+def save_identities(path=None):
+
+    lines = ''
+    for slave_addr in sorted(identities):
+        identity = identities[slave_addr]
+        lines = lines + '%d,%s,%s,%s\n' % (slave_addr, identity.product_code, identity.serial, identity.firmware)
+    path = path or identity_file
+    if path is None:
+        return
+    try:
+        with open(path) as f:
+            if f.read() == lines:
+                return
+    except OSError:
+        pass
+    try:
+        with open(path, 'w') as f:
+            f.write(lines)
+    except OSError as e:
+        print('Could not save the RCU identities.')
+        print(e)
+
+
+# Identities saved by save_identities(). {} if there are none.
+def load_identities(path=None):
+
+    saved = {}
+    if (path or identity_file) is None:
+        return saved
+    try:
+        with open(path or identity_file) as f:
+            for line in f:
+                fields = line.strip().split(',')
+                if len(fields) != 4:
+                    continue
+                identity = RcuIdentity(int(fields[0]))
+                identity.product_code = fields[1]
+                identity.serial = None if fields[2] == 'None' else fields[2]
+                identity.firmware = int(fields[3]) if fields[3].isdigit() else fields[3]
+                saved[identity.slave_addr] = identity
+    except (OSError, ValueError):
+        pass
+    return saved
+
+
+# Registers read to check a saved identity still is the RCU on the bus - the serial number, or the type registers if
+# the RCU has no serial registers. One block read.
+def _check_addresses(identity):
+    return [int(register, 16) for register in (serial_registers if identity.serial is not None else type_registers)]
+
+
+def _still_there(identity, addresses, values):
+    values = [values.get(address) for address in addresses]
+    if None in values or model_for(identity.product_code) is None:
+        return False
+    if identity.serial is not None:
+        return _serial_from(values) == identity.serial
+    return _product_code_from(values) == identity.product_code
+
+
+def _restored(saved):
+    units = []
+    for slave_addr in sorted(saved):
+        identity = identities[slave_addr] = saved[slave_addr]
+        unit = default_unit if slave_addr == default_unit.slave_addr else Unit(slave_addr)
+        unit.param = model_for(identity.product_code)
+        unit.product_code = identity.product_code
+        units.append(unit)
+        print(unit.product_code + ' Controller at slave ID ' + str(slave_addr) + ' as saved.')
+    return units
+
+
+# Units from the identities saved on flash, each confirmed with one read instead of the full detection. [] if
+# nothing was saved or any RCU does not match any more (swapped, readdressed, gone) - detect them all again then.
+# RCUs added to the bus are found by the next full detection.
+def restore_units(path=None):
+
+    saved = load_identities(path)
+    for identity in saved.values():
+        addresses = _check_addresses(identity)
+        try:
+            values = planner.read_planned(s, identity.slave_addr, addresses, signed=False, retry=retry_policy)
+        except Exception:
+            values = {}
+        if not _still_there(identity, addresses, values):
+            print('Saved RCU identity for slave ID ' + str(identity.slave_addr) + ' does not match. Detecting again.')
+            return []
+    return _restored(saved)
+
+
+# restore_units() for uasyncio tasks.
+async def restore_units_async(path=None):
+
+    saved = load_identities(path)
+    for identity in saved.values():
+        addresses = _check_addresses(identity)
+        try:
+            values = await planner.read_planned_async(bus_scheduler().client(bus.PRIORITY_BULK), identity.slave_addr,
+                                                      addresses, signed=False, retry=retry_policy)
+        except Exception:
+            values = {}
+        if not _still_there(identity, addresses, values):
+            print('Saved RCU identity for slave ID ' + str(identity.slave_addr) + ' does not match. Detecting again.')
+            return []
+    return _restored(saved)
+
+
+# Param Pull. Every register in the map of the unit, read unsigned and sign converted by the compiled map into a
+# snapshot - array of values in map order, regmap.MISSING for registers that could not be read.
+def param_snapshot(unit=None):
+
+    unit = unit or default_unit
+    regmap = register_map(unit.param)
+    results = _read(regmap.addresses, False, unit.slave_addr)      # Query the RCU.
+    return regmap.fill(regmap.snapshot(), results)
+
+
+# Param Pull for uasyncio tasks. Queued as a bulk job so door polls can still get in between blocks.
+async def param_snapshot_async(unit=None):
+
+    unit = unit or default_unit
+    regmap = register_map(unit.param)
+    results = await _read_async(regmap.addresses, False, bus.PRIORITY_BULK, unit.slave_addr)
+    return regmap.fill(regmap.snapshot(), results)
+
+
+# Parameters as {name: value}, None for registers that could not be read.
+def get_rcu_param(unit=None):
+    unit = unit or default_unit
+    return register_map(unit.param).as_dict(param_snapshot(unit))
+
+
+async def get_rcu_param_async(unit=None):
+    unit = unit or default_unit
+    return register_map(unit.param).as_dict(await param_snapshot_async(unit))
+
+
+# Reporter keeping the last parameter snapshot the backend acknowledged for a unit. A new one (and so a full
+# snapshot) if the unit got another register map.
+def reporter_for(unit):
+    regmap = register_map(unit.param)
+    if unit.reporter is None or unit.reporter.regmap is not regmap:
+        unit.reporter = SnapshotReporter(regmap, full_snapshot_every)
+    return unit.reporter
+
+
+# Parameter report - the registers changed since the last acknowledged one, or a full snapshot when one is due or
+# full is set. Call unit.reporter.acknowledge() once it was delivered.
+async def param_report_async(unit=None, full=False):
+    unit = unit or default_unit
+    reporter = reporter_for(unit)
+    return reporter.encode(await param_snapshot_async(unit), full)
 
 
 # Smart lock 2 check.
 def is_smart_lock_2():
-    if query_rcu([2853]) == 4:
-        if query_rcu([2855]) == 4:
-            return True
-        else:
-            return False
-    else:
-        return False
+    lock = query_rcu(['2853', '2855'])      # Both in one planned read.
+    return lock[0] == 4 and lock[1] == 4
 
 
 # Celsius or Fahrenheit
 def is_celsius():
-    if query_rcu(param.temp_units) is 0:
-        return True
-    else:
-        return False
+    return query_rcu([param.temp_units])[0] == 0
 
 
 # Convert to ascii from hex.                    #TODO Split into 'tools' module
@@ -333,25 +1235,3 @@ def convert_to_ascii(dec_to_ascii):
 #  Fill the 0's for bitmask for alert return    #TODO Split into 'tools' module
 def zfill(s, width):
     return '{:0>{w}}'.format(s, w=width)
-
-
-# Load the Correct Constants for Ascon modbus Registers from param.py
-attempts = 0
-while attempts < 3:
-    try:
-        if get_rcu_type()[0] is 'T':
-            from param import Y39 as param
-            print('Y39 Controller Detected!')
-        elif get_rcu_type()[0] is 'Y':
-            from param import Y39 as param
-            print('Y39 Controller Detected!')
-        elif get_rcu_type()[0] is 'X':
-            from param import X34 as param
-            print('X34 Controller Detected!')
-        else:
-            print('RCU Type Not recognized. It is neither X34 / Y39 type RCU, OR, can not communicate.')
-    except Exception as e:
-        print('Can Not Determine RCU Type. Waiting 10 Seconds and Trying Again.')
-        print(e)
-        attempts = attempts +1
-        utime.sleep(10)
@@ -0,0 +1,128 @@
+############################################################################
+#####   Benchmark - Alert mask decoding, bit strings vs lookup table   #####
+############################################################################
+
+"""
+Decodes the alert mask and memory error of every 3s frequent poll the old way (bin() and zfill into a 16 character
+string, a chain of character tests filling 'yes' / 'no' strings, then main.py comparing them one alert at a time)
+and through ascon's per model lookup table (two byte lookups into an alert state bitfield, one XOR with the last state
+for the changes). Checks both agree on every mask value, then times a poll and its heap peak (tracemalloc, CPython,
+rough guide only - see bench_alloc.py).
+Run with: python benchmarks/bench_alerts.py
+"""
+
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+ROUNDS = 20000
+NAMES = (('high_temp_alert', ascon.ALERT_HIGH_TEMP), ('low_temp_alert', ascon.ALERT_LOW_TEMP),
+         ('door_open_alert', ascon.ALERT_DOOR_OPEN), ('malfunctioning_alert', ascon.ALERT_MALFUNCTION))
+
+
+def legacy_alerts(alert_mask, mem_err, poll_data):
+    # ascon.get_alert_status before the lookup tables.
+    if type(alert_mask) is int and alert_mask > 0:
+        alert_mask = ascon.zfill(bin(alert_mask)[2:], 16)
+        if alert_mask[6] == '1':
+            poll_data['high_temp_alert'] = 'yes'
+        if alert_mask[6] == '0':
+            poll_data['high_temp_alert'] = 'no'
+        if alert_mask[5] == '1':
+            poll_data['low_temp_alert'] = 'yes'
+        if alert_mask[5] == '0':
+            poll_data['low_temp_alert'] = 'no'
+        if alert_mask[4] == '1':
+            poll_data['door_open_alert'] = 'yes'
+        if alert_mask[4] == '0':
+            poll_data['door_open_alert'] = 'no'
+    else:
+        poll_data['high_temp_alert'] = 'no'
+        poll_data['low_temp_alert'] = 'no'
+        poll_data['door_open_alert'] = 'no'
+    if mem_err == 1:
+        poll_data['malfunctioning_alert'] = 'yes'
+    if mem_err == 0:
+        poll_data['malfunctioning_alert'] = 'no'
+    return poll_data
+
+
+def legacy_poll(previous, alert_mask, mem_err):
+    # Decode, then main.py's per alert comparisons (with the assignments it meant to make).
+    poll_data = legacy_alerts(alert_mask, mem_err, {'door_status': 0})
+    changed = []
+    for name, bit in NAMES:
+        if previous[name] != poll_data[name]:
+            changed.append(name)
+            previous[name] = poll_data[name]
+    return changed
+
+
+def table_poll(unit, table, alert_mask, mem_err):
+    state = ascon.decode_alerts(table, alert_mask, mem_err)
+    changed = state ^ unit.alert_state
+    unit.alert_state = state
+    return changed
+
+
+def measure(label, function):
+    function()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        function()
+    elapsed_us = (time.perf_counter() - start) * 1e6 / ROUNDS
+    peak = ''
+    if tracemalloc is not None:
+        tracemalloc.start()
+        function()
+        peak = '%5d bytes peak' % tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print('  %-26s %6.2f us per poll  %s' % (label, elapsed_us, peak))
+    return elapsed_us
+
+
+def main():
+    for param_map in (ascon.Y39, ascon.X34):
+        table = ascon.alert_table(param_map)
+        for mem_err in (0, 1):
+            for alert_mask in range(0x10000):
+                legacy = legacy_alerts(alert_mask, mem_err, {})
+                state = ascon.decode_alerts(table, alert_mask, mem_err)
+                assert all((legacy[name] == 'yes') == bool(state & bit) for name, bit in NAMES), (alert_mask, mem_err)
+    print('lookup table agrees with the bit string decoder on all 65536 masks, both models')
+
+    table = ascon.alert_table(ascon.param)
+    unit = ascon.Unit(1, ascon.param)
+    previous = dict((name, 'no') for name, bit in NAMES)
+    masks = [0x0000, 0x0200, 0x0200, 0x0A00, 0x0800, 0x0000]       # High temp on, door open on, both clear.
+    i = [0]
+
+    def legacy():
+        i[0] += 1
+        return legacy_poll(previous, masks[i[0] % len(masks)], 0)
+
+    def tabled():
+        i[0] += 1
+        return table_poll(unit, table, masks[i[0] % len(masks)], 0)
+
+    old = measure('bit strings + yes/no', legacy)
+    new = measure('lookup table + XOR', tabled)
+    print('  %.1fx faster' % (old / new))
+    unit.alert_state = 0
+    print('  events: %s' % [ascon.alert_event(table_poll(unit, table, mask, 0), unit.alert_state) for mask in masks])
+
+
+if __name__ == '__main__':
+    main()
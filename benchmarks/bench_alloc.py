@@ -0,0 +1,149 @@
+##########################################################################
+#####   Benchmark - Heap allocation per Modbus register transaction   #####
+##########################################################################
+
+"""
+Counts the heap used by one holding register transaction, with the old allocate-per-call path (fresh bytearray
+request, struct.pack CRC, s.read() bytes, _to_short format string and tuple) and with the preallocated buffer paths
+(read_holding_register_block and the allocation free read_registers_into), the last also with the Metrics that
+ascon.open_bus attaches on the gateway. Then one Metrics window: reset() and 24 new start registers.
+
+The RCU is a canned reply behind a little noise, handed out by a stand-in UART that allocates next to nothing itself
+- the simulated RCU and fake bus of host.py allocate far more per request than the client and would drown it out.
+Under Micropython (unix port) the garbage collector is disabled and gc.mem_alloc() growth per transaction is the
+real churn. CPython has no cumulative counter, so tracemalloc's peak above the starting point is reported instead;
+it is only a rough guide, as CPython boxes the tick counts and counters above 256 that Micropython keeps as small
+ints.
+Run with: python benchmarks/bench_alloc.py   or   micropython benchmarks/bench_alloc.py
+"""
+
+import gc
+import struct
+import time
+
+import host
+from umodbus import functions
+from umodbus.metrics import Metrics
+from umodbus.modbus import Modbus
+from umodbus.parser import FrameParser
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    from array import array
+except ImportError:
+    from uarray import array
+
+
+class ReplyUart:
+    # Answers every request with the same reply. Enough of machine.UART for Modbus and LegacyModbus.
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.left = 0
+
+    def init(self, baudrate=None):
+        pass
+
+    def write(self, data):
+        self.left = len(self.reply)
+        return len(data)
+
+    def any(self):
+        return self.left
+
+    def readinto(self, buf):
+        count = self.left
+        buf[:count] = self.reply
+        self.left = 0
+        return count
+
+    def read(self):
+        self.left = 0
+        return self.reply[:]        # A UART read() returns new bytes.
+
+
+class LegacyModbus(Modbus):
+    # Allocate-per-call transaction as umodbus did it before the preallocated buffers.
+
+    def read_holding_register_block(self, slave_addr, starting_addr, register_qty, signed=True):
+        modbus_pdu = functions.read_holding_registers(starting_addr, register_qty)
+        serial_pdu = bytearray()
+        serial_pdu.append(slave_addr)
+        serial_pdu.extend(modbus_pdu)
+        serial_pdu.extend(self._calculate_crc16(serial_pdu))
+        self.transport.write(serial_pdu)
+
+        parser = FrameParser(slave_addr, modbus_pdu[0])
+        length = 0
+        while not length:
+            data = self.transport.read()
+            if data:
+                length = parser.feed(data)
+            else:
+                time.sleep_us(50)
+        frame = bytes(parser.buffer[parser.start:parser.start + length])
+        return self._to_short(frame[3:3 + frame[2]], signed)
+
+
+def per_transaction(function, rounds):
+    function()      # Warm up format caches etc.
+    if tracemalloc is None:
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        for _ in range(rounds):
+            function()
+        used = gc.mem_alloc() - before
+        gc.enable()
+        return used / rounds, 'bytes allocated'
+
+    tracemalloc.start()
+    peak_total = 0
+    for _ in range(rounds):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return peak_total / rounds, 'bytes peak'
+
+
+def metrics_window(metrics):
+    metrics.reset()
+    for address in range(0x200, 0x218):
+        metrics.record(0x03, address, 45)
+
+
+def main(rounds=200, quantity=12):
+    frame = struct.pack('>BBB' + 'h' * quantity, 1, 0x03, 2 * quantity, *range(-6, quantity - 6))
+    reply = b'\x00\xff' + frame + host.crc16(frame)
+    legacy = LegacyModbus(ReplyUart(reply))
+    client = Modbus(ReplyUart(reply))
+    measured = Modbus(ReplyUart(reply))
+    measured.metrics = Metrics()
+    out = array('h', [0] * quantity)
+
+    paths = (('legacy allocate-per-call', lambda: legacy.read_holding_register_block(1, 0x200, quantity)),
+             ('preallocated, tuple result', lambda: client.read_holding_register_block(1, 0x200, quantity)),
+             ('preallocated, read_registers_into', lambda: client.read_registers_into(1, 0x200, quantity, out)),
+             ('  with Metrics', lambda: measured.read_registers_into(1, 0x200, quantity, out)))
+
+    expected = tuple(legacy.read_holding_register_block(1, 0x200, quantity))
+    assert tuple(client.read_holding_register_block(1, 0x200, quantity)) == expected
+    assert tuple(client.read_registers_into(1, 0x200, quantity, out)) == expected
+    assert tuple(measured.read_registers_into(1, 0x200, quantity, out)) == expected
+
+    print('%d register block, %d transactions per path' % (quantity, rounds))
+    for label, function in paths:
+        used, unit = per_transaction(function, rounds)
+        print('  %-34s %8.1f %s per transaction' % (label, used, unit))
+    used, unit = per_transaction(lambda: metrics_window(measured.metrics), 20)
+    print('  %-34s %8.1f %s per window' % ('Metrics window, 24 registers', used, unit))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+###########################################################################
+#####   Benchmark - Pushing a setpoint / alarm profile to the RCU     #####
+###########################################################################
+
+"""
+Writes an 11 register setpoint and high temperature alarm profile to a simulated Y39, once with one Write Single
+Register per value (one 'w' cloud command each, the old way) and once through ascon.write_registers, which sends each
+run of consecutive addresses as one Write Multiple Registers. A third pass uses an RCU without Write Multiple
+Registers to show the fallback costs one refused request and then behaves like the old way.
+Run with: python benchmarks/bench_batch_writes.py
+"""
+
+import time
+
+import host
+
+registers = host.y39_registers()
+registers.update({address: 0 for address in range(0x282E, 0x2837)})     # The whole high temp alarm block.
+rcu = host.bus.attach(host.SimulatedRcu(registers))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+
+PROFILE = [('2801', -180), ('2809', 0), ('282E', 40), ('282F', 1), ('2830', 0), ('2831', 30), ('2832', 0),
+           ('2833', 0), ('2834', 45), ('2835', 0), ('2836', 120)]
+
+
+def measure(label, function):
+    rcu.requests = 0
+    for address, _ in PROFILE:
+        rcu.registers[int(address, 16)] = 0x7777
+    start = time.monotonic()
+    failed = function()
+    elapsed = time.monotonic() - start
+    assert not failed, failed
+    assert all(rcu.registers[int(a, 16)] == v & 0xFFFF for a, v in PROFILE), 'profile not written'
+    print('  %-34s %3d transactions  %6.3f s' % (label, rcu.requests, elapsed))
+
+
+def one_by_one():
+    return [a for a, v in PROFILE if ascon.write_register(a, v) != v]
+
+
+def main():
+    print('%d register profile:' % len(PROFILE))
+    measure('write single register each', one_by_one)
+    measure('write_registers (multiple)', lambda: ascon.write_registers(PROFILE))
+
+    rcu.write_multiple = False
+    measure('write_registers, no fc 0x10, first', lambda: ascon.write_registers(PROFILE))
+    measure('write_registers, no fc 0x10, next', lambda: ascon.write_registers(PROFILE))
+
+    rcu.registers[0x290] = 0x00F0
+    assert ascon.s.mask_write_register(1, 0x290, 0xFF0F, 0x0050)
+    print('  mask write 0x00F0 AND 0xFF0F OR 0x0050 -> 0x%04X' % rcu.registers[0x290])
+
+
+if __name__ == '__main__':
+    main()
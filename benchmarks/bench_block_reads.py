@@ -0,0 +1,59 @@
+###########################################################################
+#####   Benchmark - Parameter snapshot cost with the read planner     #####
+###########################################################################
+
+"""
+Runs ascon.get_rcu_param, get_temperatures and frequent_polling against a simulated Y39 and counts the bus
+transactions and wall time, once with one register per request (max gap -1, the old behaviour) and once with the
+planner's default block coalescing. The planner runs twice per RCU behaviour: an RCU that rejects reads spanning
+unmapped registers costs extra on the first pass only, the refused blocks are remembered after that. The register
+cache is off - every value comes from the bus - so the counts are what coalescing saves, not what the cache does
+(bench_cache.py).
+Run with: python benchmarks/bench_block_reads.py
+"""
+
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+ascon.register_ttl.clear()      # Every read goes to the bus, nothing from the register cache.
+
+
+def measure(label, function):
+    rcu.requests = 0
+    start = time.monotonic()
+    result = function()
+    elapsed = time.monotonic() - start
+    print('  %-18s %3d transactions  %6.3f s' % (label, rcu.requests, elapsed))
+    return result
+
+
+def snapshot():
+    return (measure('get_rcu_param', ascon.get_rcu_param),
+            measure('get_temperatures', ascon.get_temperatures),
+            measure('frequent_polling', ascon.frequent_polling))
+
+
+def main():
+    ascon.max_register_gap = -1
+    print('one register per request:')
+    before = snapshot()
+
+    ascon.max_register_gap = ascon.planner.MAX_GAP
+    for holes_read_zero in (True, False):
+        rcu.holes_read_zero = holes_read_zero
+        ascon.planner.refused.clear()
+        for attempt in ('first', 'second'):
+            print('planned block reads, RCU %s holes, %s pass:' % ('zero-fills' if holes_read_zero else 'rejects',
+                                                                   attempt))
+            assert snapshot() == before, 'planned reads returned different values'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+###########################################################################
+#####   Benchmark - Boot, RCU detection beside the modem bring-up     #####
+###########################################################################
+
+"""
+Linux / CPython only. A simulated boot up to the first publish: the Simcom modem bring-up from main.py as a timeline
+(AT exchanges block, the modem boot, signal check and IP address waits can be awaited), scaled down by SCALE, and
+RCU detection against simulated RCUs on a pty at real 9600 baud timing.
+
+    sequential      detection at import as before (type read, bus scan, identity, the parameter dump main.py
+                    printed), then the modem
+    overlapped      ascon.init() as a task beside the modem bring-up, as main.py's boot() does now
+    saved identity  the same, with the identities saved on flash by the boot before
+
+Reports the time to 'ready to publish' for each.
+Run with: python benchmarks/bench_boot.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+import host
+import ptybus
+from umodbus.asyncmodbus import AsyncModbus
+from umodbus.transport import PtyTransport
+
+import ascon        # noqa: E402 - importing no longer touches the bus.
+
+SCALE = 0.1         # Modem seconds per benchmark second.
+RCUS = [host.SimulatedRcu(host.y39_registers(), slave_addr=1),
+        host.SimulatedRcu(host.rcu_registers(product_code='X34'), slave_addr=3)]
+
+# main.py's modem bring-up: (seconds, awaitable). Blocking ones are AT exchanges and simcom's own sleeps.
+MODEM = [(2.0, False),      # power_off
+         (0.2, False),      # power_on_start
+         (7.0, True),       # modem boot
+         (1.5, False),      # power_on_check, setup
+         (4.0, True),       # before the signal check
+         (0.3, False),      # csq
+         (5.2, False),      # ppp_connect
+         (6.0, True)]       # IP address
+
+
+async def modem_up(overlap):
+    for seconds, awaitable in MODEM:
+        if overlap and awaitable:
+            await asyncio.sleep(seconds * SCALE)
+        else:
+            time.sleep(seconds * SCALE)
+
+
+def forget():
+    # What a watchdog reset forgets.
+    ascon.identities.clear()
+    ascon.cache.invalidate()
+    ascon.default_unit.param = None
+
+
+async def sequential():
+    units = ascon.init_sync()
+    for unit in units:
+        ascon.get_rcu_param(unit)
+    await modem_up(overlap=False)
+    return units
+
+
+async def overlapped():
+    detection = asyncio.create_task(ascon.init())
+    await modem_up(overlap=True)
+    return await detection
+
+
+async def measure(label, boot):
+    forget()
+    start = time.monotonic()
+    units = await boot()
+    elapsed = time.monotonic() - start
+    print('  %-16s %5.2f s   %s' % (label, elapsed, ', '.join('%d:%s' % (u.slave_addr, u.product_code) for u in units)))
+    return elapsed
+
+
+async def main():
+    master, stop = ptybus.open_bus(*RCUS)
+    ascon.open_bus(PtyTransport(master))
+    ascon.a = AsyncModbus(*(await ptybus.open_streams(master)))
+    ascon.identity_file = None
+    modem = sum(seconds for seconds, awaitable in MODEM) * SCALE
+
+    print('modem bring-up %.2f s (%.0f s scaled by %s), %d RCUs on the bus:' % (modem, modem / SCALE, SCALE, len(RCUS)))
+    before = await measure('sequential', sequential)
+    await measure('overlapped', overlapped)
+    ascon.identity_file = os.path.join(tempfile.mkdtemp(), 'rcu_identity.txt')
+    ascon.save_identities()
+    after = await measure('saved identity', overlapped)
+    print('  %.2f s saved per boot' % (before - after))
+    stop.set()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
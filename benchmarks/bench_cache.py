@@ -0,0 +1,50 @@
+###########################################################################
+#####   Benchmark - Repeat parameter queries with the register cache  #####
+###########################################################################
+
+"""
+Counts the bus transactions of a cloud 'p' parameter dump (ascon.get_rcu_param) and a temperature units read, the
+first time, again straight away (answered from the cache, no bus traffic) and after a forced refresh. Then shows
+temperatures are still read every time, and that a write updates the cached set point without reading it back.
+Run with: python benchmarks/bench_cache.py
+"""
+
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+
+
+def measure(label, function):
+    rcu.requests = 0
+    start = time.monotonic()
+    result = function()
+    elapsed = time.monotonic() - start
+    print('  %-28s %2d transactions  %6.3f s' % (label, rcu.requests, elapsed))
+    return result
+
+
+def main():
+    ascon.refresh()
+    first = measure('get_rcu_param, first', ascon.get_rcu_param)
+    assert measure('get_rcu_param, repeat', ascon.get_rcu_param) == first
+    measure('temperature units', lambda: ascon.query_rcu([ascon.param.temp_units]))
+    ascon.refresh()
+    assert measure('get_rcu_param, after refresh', ascon.get_rcu_param) == first
+    measure('get_temperatures', ascon.get_temperatures)
+    measure('get_temperatures, repeat', ascon.get_temperatures)
+
+    set_point = ascon.param.set_point
+    measure('write set point', lambda: ascon.write_register(set_point, 40))
+    assert measure('read set point', lambda: ascon.query_rcu([set_point])) == [40]
+    print('  %s' % ascon.cache.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#############################################################################
+#####   Benchmark - Compressor and defrost, transitions vs duty cycles  #####
+#############################################################################
+
+"""
+A day of compressor and defrost status as the 9 s poll (param.py) sees it, on a virtual clock: the compressor on 8
+min, off 12 min, short cycling (45 s on, 45 s off) for an hour in the afternoon, and four 20 min defrosts. First
+probe.py's compressor string (a decascii.time_delta pair per transition, appended until the 10 min payload goes out)
+and a main.py style event message per transition, then umodbus/dutycycle.py windows of 10 min as main.py appends
+them to the temperature payload. Counts bytes and messages, checks the on time the windows add up to against the
+truth and that the short cycling shows in the shortest cycle. Then the heap taken per poll (tracemalloc, CPython,
+rough guide only - see bench_alloc.py).
+Run with: python benchmarks/bench_duty_cycle.py
+"""
+
+import host         # noqa: F401 - time.ticks_* on CPython.
+import decascii
+from umodbus import dutycycle
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+POLL_MS = 9000
+WINDOW_MS = 600000
+DAY_MS = 24 * 3600000
+SHORT_CYCLING = (14 * 3600000, 15 * 3600000)
+DEFROSTS = [hour * 3600000 for hour in (3, 9, 15, 21)]
+
+
+def compressor_at(ms):
+    if SHORT_CYCLING[0] <= ms < SHORT_CYCLING[1]:
+        return 1 if (ms - SHORT_CYCLING[0]) % 90000 < 45000 else 0
+    return 1 if ms % 1200000 < 480000 else 0
+
+
+def defrost_at(ms):
+    return 1 if any(start <= ms < start + 1200000 for start in DEFROSTS) else 0
+
+
+def transitions():
+    # probe.py: two characters per compressor transition, the string going out with each 10 min payload. main.py's
+    # door events: one message per transition.
+    string_bytes = messages = 0
+    string = ''
+    previous = [None, None]
+    window_start = 0
+    for ms in range(0, DAY_MS, POLL_MS):
+        if ms - window_start >= WINDOW_MS:
+            string_bytes += len(string)
+            string = ''
+            window_start = ms
+        for channel, value in enumerate((compressor_at(ms), defrost_at(ms))):
+            if previous[channel] is not None and value != previous[channel]:
+                messages += 1
+                if channel == 0:
+                    string += decascii.time_delta(window_start // 1000, ms // 1000, value)
+            previous[channel] = value
+    return string_bytes + len(string), messages
+
+
+def windows():
+    duty = dutycycle.DutyCycle(2)
+    duty.reset(0)
+    payloads = []
+    for ms in range(0, DAY_MS + POLL_MS, POLL_MS):
+        if ms - duty.started >= WINDOW_MS:
+            payloads.append(duty.encode(ms))
+            duty.reset(ms)
+        duty.update(0, compressor_at(ms), ms)
+        duty.update(1, defrost_at(ms), ms)
+    return payloads
+
+
+def heap_per_poll():
+    duty = dutycycle.DutyCycle(2)
+    duty.reset(0)
+    for ms in range(0, 300000, POLL_MS):
+        duty.update(0, compressor_at(ms), ms)
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    polls = 0
+    for ms in range(SHORT_CYCLING[0], SHORT_CYCLING[0] + 3000000, POLL_MS):
+        duty.update(0, compressor_at(ms), ms)
+        duty.update(1, defrost_at(ms), ms)
+        polls += 1
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / float(polls)
+
+
+def main():
+    string_bytes, messages = transitions()
+    payloads = windows()
+    reports = [dutycycle.decode(payload) for payload in payloads]
+    on_s = [sum(report['channels'][channel]['on_s'] for report in reports) for channel in (0, 1)]
+    truth = [sum(POLL_MS for ms in range(0, DAY_MS, POLL_MS) if at(ms)) // 1000 for at in (compressor_at, defrost_at)]
+    shortest = min(report['channels'][0]['shortest_s'] for report in reports if report['channels'][0]['cycles'])
+
+    print('24 h, compressor and defrost polled every %d s:' % (POLL_MS // 1000))
+    print('  %-36s %5d bytes  (compressor only, as payload text)' % ('probe.py compressor string', string_bytes))
+    print('  %-36s %5d messages' % ('event per transition', messages))
+    print('  %-36s %5d bytes  %d payloads, no extra messages' % ('duty cycle windows', sum(map(len, payloads)),
+                                                                len(payloads)))
+    print('  on time: compressor %d s (true %d), defrost %d s (true %d)' % (on_s[0], truth[0], on_s[1], truth[1]))
+    print('  shortest compressor cycle %d s, longest %d s, cycles %d' %
+          (shortest, max(report['channels'][0]['longest_s'] for report in reports),
+           sum(report['channels'][0]['cycles'] for report in reports)))
+    print('  short cycling window: %s' % reports[SHORT_CYCLING[0] // WINDOW_MS + 1]['channels'][0])
+    heap = heap_per_poll()
+    if heap is not None:
+        print('  heap per poll: %.2f bytes' % heap)
+
+
+if __name__ == '__main__':
+    main()
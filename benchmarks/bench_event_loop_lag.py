@@ -0,0 +1,75 @@
+#########################################################################################
+#####   Benchmark - Event loop lag while polling the RCU, blocking vs AsyncModbus   #####
+#########################################################################################
+
+"""
+Runs a simulated Ascon RCU on the slave end of a Linux pty (a thread answering at 9600 baud timing) and polls it the
+way main.py's frequent_polling task does, while a ticker task measures how late its 5 ms sleeps wake up.
+'blocking' drives the sync Modbus client from inside a coroutine (what main.py did), 'async' uses AsyncModbus on
+asyncio streams over the pty master. Linux / CPython only. Run with: python benchmarks/bench_event_loop_lag.py
+"""
+
+import asyncio
+import time
+
+import host
+import ptybus
+from umodbus import planner
+from umodbus.modbus import Modbus
+from umodbus.asyncmodbus import AsyncModbus
+from umodbus.transport import PtyTransport
+
+FREQUENT = [0x20E, 0x207, 0x299]        # Y39 door status, alert mask, memory error.
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.monotonic()
+        await asyncio.sleep(0.005)
+        lags.append(time.monotonic() - start - 0.005)
+
+
+async def poll_blocking(client, rounds):
+    for _ in range(rounds):
+        values = planner.read_planned(client, 1, FREQUENT, signed=False)
+        await asyncio.sleep(0.02)
+    return values
+
+
+async def poll_async(client, rounds):
+    for _ in range(rounds):
+        values = await planner.read_planned_async(client, 1, FREQUENT, signed=False)
+        await asyncio.sleep(0.02)
+    return values
+
+
+async def measure(poller):
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.ensure_future(ticker(lags, stop))
+    start = time.monotonic()
+    values = await poller
+    elapsed = time.monotonic() - start
+    stop.set()
+    await tick
+    return max(lags) * 1000, sum(lags) / len(lags) * 1000, elapsed, values
+
+
+async def main(rounds=20):
+    master, stop = ptybus.open_bus(host.SimulatedRcu(host.y39_registers(), turnaround_ms=15, holes_read_zero=True))
+
+    client = Modbus(PtyTransport(master))
+    async_client = AsyncModbus(*(await ptybus.open_streams(master)))
+
+    print('%d frequent polls (door, alert mask, memory error) over a pty' % rounds)
+    results = []
+    for label, poller in (('blocking', poll_blocking(client, rounds)), ('async', poll_async(async_client, rounds))):
+        worst, mean, elapsed, values = await measure(poller)
+        results.append(values)
+        print('  %-9s loop lag max %6.1f ms  mean %5.1f ms  (%.2f s)' % (label, worst, mean, elapsed))
+    assert results[0] == results[1] and None not in results[0].values(), 'clients disagree'
+    stop.set()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
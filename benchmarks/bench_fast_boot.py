@@ -0,0 +1,75 @@
+###########################################################################
+#####   Benchmark - Boot time RCU detection, full vs saved identity   #####
+###########################################################################
+
+"""
+The RCU work main.py does before MQTT connects, against a simulated Y39 on the fake 9600 baud UART: the full
+detection (type read, bus scan of slave IDs 1-8, identity block, and the parameter dump main.py used to print) and a
+boot from the identities saved on flash (one serial number read). Then the RCU is swapped for another serial number:
+the saved identity must be rejected and the full detection run again.
+Run with: python benchmarks/bench_fast_boot.py
+"""
+
+import os
+import tempfile
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+
+
+def forget():
+    # What a watchdog reset forgets.
+    ascon.identities.clear()
+    ascon.cache.invalidate()
+
+
+def full_detection(params=True):
+    ascon.model_for(ascon.get_rcu_type())
+    units = ascon.scan_bus()
+    for unit in units:
+        ascon.identify(unit.slave_addr)
+        if params:
+            ascon.get_rcu_param(unit)
+    return units
+
+
+def saved_boot(path):
+    units = ascon.restore_units(path) or full_detection(params=False)
+    for unit in units:
+        ascon.identify(unit.slave_addr)
+    return units
+
+
+def measure(label, function):
+    forget()
+    rcu.requests = 0
+    start = time.monotonic()
+    units = function()
+    print('  %-36s %3d transactions  %6.2f s  %s' % (label, rcu.requests, time.monotonic() - start,
+                                                     [unit.product_code for unit in units]))
+    return units
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'rcu_identity.txt')
+    measure('full detection + parameter dump', full_detection)
+    measure('full detection', lambda: full_detection(params=False))
+    ascon.save_identities(path)
+    print('  saved: %r' % open(path).read())
+
+    measure('saved identity', lambda: saved_boot(path))
+    rcu.registers[0xCF44] = 0x99       # Another RCU, same model.
+    measure('saved identity, RCU swapped', lambda: saved_boot(path))
+    ascon.save_identities(path)
+    print('  saved: %r' % open(path).read())
+
+
+if __name__ == '__main__':
+    main()
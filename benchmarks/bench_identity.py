@@ -0,0 +1,65 @@
+###########################################################################
+#####   Benchmark - Identifying the RCU (type, serial, firmware)      #####
+###########################################################################
+
+"""
+Counts the bus transactions and time to get the RCU type, serial number and firmware: one register per read as
+get_rcu_type / get_rcu_serial / get_rcu_fw used to do (9 reads), then ascon.identify() against an RCU that zero-fills
+unmapped registers, one that refuses them (first call and after the refused block is remembered), and one without
+the type registers that answers Read Device Identification. A second identify() is served from the cache.
+Run with: python benchmarks/bench_identity.py
+"""
+
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+
+
+def measure(label, function):
+    rcu.requests = 0
+    start = time.monotonic()
+    result = function()
+    elapsed = time.monotonic() - start
+    print('  %-36s %2d transactions  %6.3f s' % (label, rcu.requests, elapsed))
+    return result
+
+
+def one_by_one():
+    read = ascon.s.read_holding_registers
+    product = ascon._product_code_from([read(1, r, 1) for r in ascon.type_registers])
+    serial = ascon._serial_from([read(1, r, 1) for r in ascon.serial_registers])
+    firmware = [read(1, r, 1) for r in ascon.firmware_registers][-1]
+    return product, serial, firmware
+
+
+def identify():
+    identity = ascon.identify(refresh=True)
+    return identity.product_code, identity.serial, identity.firmware
+
+
+def main():
+    before = measure('one register per read', one_by_one)
+
+    for holes_read_zero, label in ((True, 'RCU zero-fills holes'), (False, 'RCU refuses holes, first'),
+                                   (False, 'RCU refuses holes, next')):
+        rcu.holes_read_zero = holes_read_zero
+        if holes_read_zero:
+            ascon.planner.refused.clear()       # Import-time detection already met the refusing RCU.
+        assert measure('identify, ' + label, identify) == before
+    measure('identify, cached', lambda: ascon.identify())
+
+    for register in ascon.type_registers:
+        del rcu.registers[int(register, 16)]
+    rcu.device_id = {0: b'Ascon', 1: b'Y39', 2: b'104'}
+    print('  -> %s' % (measure('identify, 0x2B for type', identify),))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+###########################################################################
+#####   Benchmark - Bus metrics summary and its cost                  #####
+###########################################################################
+
+"""
+Polls a simulated Y39 that is busy every 6th request the way main.py does (frequent poll, temperatures, a parameter
+dump) with ascon's Metrics attached, then prints the decoded diagnostics summary, its size on the wire, and what
+recording one transaction costs.
+Run with: python benchmarks/bench_metrics.py
+"""
+
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+from umodbus import metrics as bus_metrics      # noqa: E402
+from umodbus.exceptions import NoResponseError      # noqa: E402
+
+CYCLES = 10
+RECORDS = 20000
+
+
+def main():
+    ascon.metrics_summary()         # Drop what the import-time detection recorded.
+    ascon.register_ttl.clear()      # Everything over the bus, nothing from the register cache.
+    rcu.busy_every = 6
+    for cycle in range(CYCLES):
+        tik = time.monotonic()
+        ascon.frequent_polling()
+        ascon.get_temperatures()
+        ascon.metrics.record_task(0, int((time.monotonic() - tik) * 1000))
+    ascon.get_rcu_param()
+    rcu.busy_every = 0
+
+    payload = ascon.metrics_summary()
+    summary = bus_metrics.decode(payload)
+    print('summary: %d bytes  timeouts %d  CRC %d  retries %d  exceptions %s  tasks %s'
+          % (len(payload), summary['timeouts'], summary['crc_errors'], summary['retries'], summary['exceptions'],
+             summary['tasks']))
+    print('  bucket ms    %s' % ' '.join('%5s' % b for b in bus_metrics.BUCKETS_MS + ('more',)))
+    for function_code, row in sorted(summary['functions'].items()):
+        print('  fc 0x%02X      %s' % (function_code, ' '.join('%5d' % n for n in row)))
+    for address, row in sorted(summary['registers'].items()):
+        print('  reg 0x%04X   %s' % (address, ' '.join('%5d' % n for n in row)))
+
+    metrics = bus_metrics.Metrics()
+    error = NoResponseError('no reply')
+    start = time.perf_counter()
+    for i in range(RECORDS):
+        metrics.record(0x03, 0x200 + (i & 15), i % 400, error if i % 50 == 0 else None)
+    print('record(): %.2f us per transaction' % ((time.perf_counter() - start) * 1e6 / RECORDS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+##########################################################################
+#####   Benchmark - RCU models from register map files on flash      #####
+##########################################################################
+
+"""
+Writes register map files (umodbus/regmap.py format) made from the param.py maps under new product code prefixes,
+then times ascon.load_models() over 1, 10 and 50 of them - the boot cost as the registry grows, per file and in total,
+with each map compiled as it is read. Then the product code lookup at 50 models: the old if / elif chain on the
+first letter, extended to the new models, against the registry's prefix lookup. Last, a simulated RCU of one of the
+new models on the fake UART must be found by the bus scan and read with its own map, and files with a bad :alert line
+must not load.
+Run with: python benchmarks/bench_model_registry.py
+"""
+
+import os
+import tempfile
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.model_dir = None          # No model files until the benchmark writes them.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+from umodbus.regmap import ModelRegistry      # noqa: E402
+
+ROUNDS = 20000
+FILE_CODES = ['Q%02d' % i for i in range(50)]
+
+
+def write_models(directory, count):
+    # count model files, 'Q00', 'Q01'..., alternately the Y39 and X34 registers.
+    for i in range(count):
+        param_map = (ascon.Y39, ascon.X34)[i % 2]
+        lines = ['# Test model %d, registers of %s.' % (i, param_map.__name__), ':model Q%02d' % i,
+                 ':prefix Q%02d' % i]
+        lines += [':alert %s %d' % alert for alert in ascon.alert_bits[param_map]]
+        lines += ['%s %s' % (name, getattr(param_map, name)) for name in dir(param_map) if not name.startswith('__')]
+        with open(os.path.join(directory, 'q%02d.map' % i), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def fresh_registry():
+    ascon.models = ModelRegistry()
+    ascon.models.add(('T', 'Y'), ascon.Y39)
+    ascon.models.add(('X',), ascon.X34)
+
+
+def chained(product_code):
+    # ascon.py's detection before the models table, with a branch per file model.
+    if product_code[0] == 'T' or product_code[0] == 'Y':
+        return ascon.Y39
+    elif product_code[0] == 'X':
+        return ascon.X34
+    for i in range(len(FILE_CODES)):
+        if product_code[:3] == FILE_CODES[i]:
+            return i
+    return None
+
+
+def per_lookup_us(function, codes):
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        function(codes[i % len(codes)])
+    return (time.perf_counter() - start) * 1e6 / ROUNDS
+
+
+def main():
+    print('load_models(), each map compiled as it is read:')
+    for count in (1, 10, 50):
+        directory = tempfile.mkdtemp()
+        write_models(directory, count)
+        fresh_registry()
+        start = time.perf_counter()
+        loaded = ascon.load_models(directory)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        size = sum(os.path.getsize(os.path.join(directory, file)) for file in os.listdir(directory))
+        print('  %2d files  %6d bytes  %7.2f ms  %5.3f ms per model' % (loaded, size, elapsed_ms, elapsed_ms / loaded))
+
+    codes = ['Y39A', 'T39A', 'X34A', 'Q07X', 'Q49X', 'ZZZZ']
+    old = per_lookup_us(chained, codes)
+    new = per_lookup_us(ascon.model_for, codes)
+    print('product code lookup, 52 models:')
+    print('  %-28s %6.2f us' % ('if / elif chain', old))
+    print('  %-28s %6.2f us   %.1fx faster' % ('prefix registry', new, old / new))
+
+    # A data drop at work: an RCU of a file model on the bus.
+    q07 = ascon.model_for('Q07')
+    rcu.registers = host.rcu_registers(q07, product_code='Q07')
+    rcu.registers[int(q07.cabinet_temp, 16)] = -55
+    ascon.identities.clear()
+    ascon.cache.invalidate()
+    units = ascon.scan_bus(range(1, 2))
+    assert units and units[0].param is q07, units
+    print('  scanned: %s as %s, cabinet %s, alert bits %s' %
+          (units[0].product_code, units[0].param.__name__, ascon.get_temperatures(units[0])[0],
+           'from file' if q07 in ascon.alert_bits else 'missing'))
+
+    # A typo in an :alert line is reported when the file is loaded, not as a KeyError at the first poll.
+    directory = tempfile.mkdtemp()
+    for i, alert in enumerate((':alert hgh_temp 9', ':alert high_temp 16')):
+        with open(os.path.join(directory, 'bad%d.map' % i), 'w') as f:
+            f.write(':model BAD%d\n:prefix BAD%d\n%s\ncabinet_temp 200\n' % (i, i, alert))
+    assert ascon.load_models(directory) == 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#################################################################################
+#####   Benchmark - Multi-drop bus scan and round robin polling             #####
+#################################################################################
+
+"""
+Several simulated RCUs (Y39 and X34, different slave IDs) share one bus. ascon.scan_bus finds them and detects each
+model - one of them slow to answer - then main.py's round robin polling (ascon.poll_due_async, with door, alert mask
+and memory error due on every pass) runs against them over a Linux pty through the bus scheduler. Reports scan time,
+polls per second for 1, 2 and 4 units and how evenly the bus was shared - the spread between the units' mean
+poll-to-poll intervals.
+Linux / CPython only. Run with: python benchmarks/bench_multidrop.py
+"""
+
+import asyncio
+import time
+
+import host
+import ptybus
+from param import X34, Y39
+
+RCUS = [host.SimulatedRcu(host.rcu_registers(Y39, 'Y39', (0, 0x1111, 0x0001)), slave_addr=1),
+        host.SimulatedRcu(host.rcu_registers(X34, 'X34', (0, 0x2222, 0x0002)), slave_addr=3),
+        host.SimulatedRcu(host.rcu_registers(Y39, 'T39', (0, 0x3333, 0x0003)), slave_addr=4),
+        host.SimulatedRcu(host.rcu_registers(X34, 'X34', (0, 0x4444, 0x0004)), slave_addr=7)]
+
+for rcu in RCUS:
+    host.bus.attach(rcu)
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+from umodbus.asyncmodbus import AsyncModbus      # noqa: E402
+from umodbus import scheduler as bus                # noqa: E402
+
+CYCLES = 12
+
+
+def alarms_due(unit):
+    # Door, alert mask and memory error due now instead of in 3 s, so every pass reads them.
+    poller = unit.poller
+    if poller is not None:
+        now = time.ticks_ms()
+        for i in range(len(poller.priorities)):
+            if poller.priorities[i] == bus.PRIORITY_ALARM:
+                poller.next_due[i] = now
+
+
+async def round_robin(units, polled):
+    # Same order as main.polling - a different unit goes first each cycle.
+    for turn in range(CYCLES):
+        for i in range(len(units)):
+            unit = units[(turn + i) % len(units)]
+            alarms_due(unit)
+            values, changes = await ascon.poll_due_async(unit)
+            assert 'door_status' in values
+            polled[unit.slave_addr].append(time.monotonic())
+
+
+async def run(units):
+    polled = {unit.slave_addr: [] for unit in units}
+    start = time.monotonic()
+    await round_robin(units, polled)
+    elapsed = time.monotonic() - start
+
+    intervals = []
+    for times in polled.values():
+        intervals.append((times[-1] - times[0]) * 1000 / (len(times) - 1))
+    print('  %d unit(s)  %5.1f polls/s   mean interval per unit %s ms   spread %.1f ms'
+          % (len(units), len(units) * CYCLES / elapsed, ' '.join('%.0f' % i for i in intervals),
+             max(intervals) - min(intervals)))
+
+
+async def main():
+    ascon.register_ttl.clear()      # Status registers would come from the cache when polled this fast.
+    start = time.monotonic()
+    units = ascon.scan_bus()
+    print('scan of slave IDs 1-8: %d units in %.2f s (%s)' % (len(units), time.monotonic() - start,
+                                                            ', '.join('%d:%s' % (u.slave_addr, u.product_code)
+                                                                      for u in units)))
+    assert [u.slave_addr for u in units] == [rcu.slave_addr for rcu in RCUS]
+    assert [u.param for u in units] == [Y39, X34, Y39, X34]
+
+    slow = RCUS[-1]
+    slow.turnaround_ms = 150        # An RCU slow to answer must not be taken for an empty slave ID.
+    assert [u.slave_addr for u in ascon.scan_bus(range(slow.slave_addr, slow.slave_addr + 1))] == [slow.slave_addr]
+    slow.turnaround_ms = 15
+
+    master, stop = ptybus.open_bus(*RCUS)
+    ascon.a = AsyncModbus(*(await ptybus.open_streams(master)))
+
+    print('round robin polling, %d cycles:' % CYCLES)
+    for count in (1, 2, 4):
+        await run(units[:count])
+    print('  scheduler counters: %s' % ascon.bus_scheduler().stats())
+    stop.set()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+##########################################################################
+#####   Benchmark - Streaming frame parser on noisy RCU byte streams  #####
+##########################################################################
+
+"""
+Builds a reproducible set of noisy receive buffers like the ones the Ascon bus produces: read replies behind
+0x00/0xFF noise of varying shape, replies arriving in several UART chunks, replies with a flipped bit, and pure noise.
+Each buffer goes through FrameParser the way Modbus._uart_read feeds it. Reports parser throughput and compares the
+values it returns with the old 'unpack the whole buffer and take index 3' approach. Last, a late one register reply
+in front of the two register reply asked for must be skipped for its byte count.
+Run with: python benchmarks/bench_parser.py
+"""
+
+import random
+import struct
+import time
+
+import host
+from umodbus.exceptions import ModbusError
+from umodbus.parser import FrameParser, check_exception
+
+SLAVE = 1
+FC = 3
+
+
+def reply(values):
+    frame = struct.pack('>BBB' + 'h' * len(values), SLAVE, FC, len(values) * 2, *values)
+    return frame + host.crc16(frame)
+
+
+def noisy_streams(count, seed=1):
+    # (chunks, expected value or None) tuples. Expected None means the parser should raise.
+    rng = random.Random(seed)
+    streams = []
+    for _ in range(count):
+        value = rng.randint(-999, 999)
+        noise = bytes(rng.choice((0x00, 0xFF)) for _ in range(rng.randint(0, 6)))
+        data = noise + reply([value])
+        expected = value
+        kind = rng.random()
+        if kind < 0.1:
+            corrupt = bytearray(data)
+            corrupt[len(noise) + 3 + rng.randint(0, 1)] ^= 1 << rng.randint(0, 7)
+            data, expected = bytes(corrupt), None
+        elif kind < 0.15:
+            data, expected = bytes(rng.randint(0, 255) for _ in range(rng.randint(1, 12))), None
+        cuts = sorted(rng.sample(range(1, len(data)), min(2, len(data) - 1))) if len(data) > 2 else []
+        chunks = [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)])]
+        streams.append((chunks, expected))
+    return streams
+
+
+def parse(parser, chunks):
+    parser.reset(SLAVE, FC)
+    length = 0
+    for chunk in chunks:
+        length = parser.feed(chunk)
+        if length:
+            break
+    if not length:
+        length = parser.finish()
+    check_exception(parser.buffer, parser.start)
+    return struct.unpack_from('>h', parser.buffer, parser.start + 3)[0]
+
+
+def legacy(chunks):
+    data = b''.join(chunks)
+    return struct.unpack('>' + 'h' * (len(data) // 2), data)[3]
+
+
+def stale_reply():
+    # The reply to a one register read still on the line, then the reply to the two register read just sent.
+    request = struct.pack('>BBHH', SLAVE, FC, 0x200, 2)
+    data = reply([7]) + b'\xff' + reply([1, 2])
+    parser = FrameParser(SLAVE, FC)
+    parser.reset(SLAVE, FC, request)
+    length = parser.find(data, len(data))
+    return struct.unpack_from('>hh', data, parser.start + 3) if length else None, parser.mismatched
+
+
+def main(count=20000):
+    streams = noisy_streams(count)
+    total_bytes = sum(len(c) for chunks, _ in streams for c in chunks)
+    parser = FrameParser(SLAVE, FC)
+
+    correct = rejected = wrong = 0
+    start = time.monotonic()
+    for chunks, expected in streams:
+        try:
+            value = parse(parser, chunks)
+        except ModbusError:
+            rejected += 1
+            continue
+        if value == expected:
+            correct += 1
+        else:
+            wrong += 1
+    elapsed = time.monotonic() - start
+
+    legacy_wrong = 0
+    for chunks, expected in streams:
+        try:
+            if legacy(chunks) != expected:
+                legacy_wrong += 1
+        except Exception:
+            pass
+
+    print('streams: %d  bytes: %d' % (count, total_bytes))
+    print('parser:  %.0f frames/s  %.0f bytes/s' % (count / elapsed, total_bytes / elapsed))
+    print('parser:  %d correct, %d rejected, %d wrong values' % (correct, rejected, wrong))
+    print('legacy index 3: %d wrong values' % legacy_wrong)
+
+    values, skipped = stale_reply()
+    assert values == (1, 2) and skipped == 1, (values, skipped)
+    print('stale reply:    skipped %d, read %s' % (skipped, values))
+
+
+if __name__ == '__main__':
+    main()
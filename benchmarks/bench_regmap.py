@@ -0,0 +1,93 @@
+##################################################################################
+#####   Benchmark - Parameter dump bookkeeping, dir() walk vs compiled map   #####
+##################################################################################
+
+"""
+Times the work a cloud 'p' parameter dump does around the bus reads, with the register values already in hand:
+the old path (dir() over the param.py class, getattr and int(hex, 16) for every register, a list of values in query
+order and a dict zipped back together) against the compiled RegisterMap (fill a snapshot from the planner's
+{address: value}, apply the signed flags, make the dict). Both must give the same dict. Heap is CPython's tracemalloc
+peak per dump, a rough guide only - see bench_alloc.py.
+Run with: python benchmarks/bench_regmap.py
+"""
+
+import time
+
+import host
+from param import X34, Y39
+from umodbus.regmap import RegisterMap
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+ROUNDS = 2000
+UNSIGNED = ('door_status', 'alert_mask', 'rcu_memory_error')
+
+
+def legacy_dump(param_map, raw):
+    # get_rcu_param before the compiled maps: _param_query, _to_addresses, query_rcu's result list, _param_dictionary.
+    param_list = [a for a in dir(param_map) if not a.startswith('__')]
+    rcu_query_list = []
+    for i in param_list:
+        rcu_query_list.append(getattr(param_map, i))
+    addresses = [int(str(register), 16) for register in rcu_query_list]
+    results = []
+    for address, name in zip(addresses, param_list):
+        value = raw.get(address)
+        if value is not None and name not in UNSIGNED and value & 0x8000:
+            value -= 0x10000
+        results.append(value)
+    rcu_dictionary = {}
+    x = 0
+    for i in param_list:
+        rcu_dictionary[i] = results[x]
+        x = x + 1
+    return rcu_dictionary
+
+
+def compiled_dump(regmap, raw):
+    return regmap.as_dict(regmap.fill(regmap.snapshot(), raw))
+
+
+def heap_peak(function):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def measure(label, function):
+    function()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        function()
+    elapsed_us = (time.perf_counter() - start) * 1e6 / ROUNDS
+    peak = heap_peak(function)
+    print('  %-22s %7.1f us per dump  %s' % (label, elapsed_us, '%6d bytes peak' % peak if peak is not None else ''))
+    return elapsed_us
+
+
+def main():
+    registers = host.rcu_registers()
+    for param_map in (Y39, X34):
+        # Every register answers, some with the top bit set so the sign handling is exercised.
+        regmap = RegisterMap(param_map, UNSIGNED)
+        raw = {address: registers.get(address, 0xFF00 + i) for i, address in enumerate(regmap.addresses)}
+        assert compiled_dump(regmap, raw) == legacy_dump(param_map, raw)
+
+        start = time.perf_counter()
+        RegisterMap(param_map, UNSIGNED)
+        print('%s - %d registers, compiled once in %.1f us' % (param_map.__name__, len(regmap),
+                                                                 (time.perf_counter() - start) * 1e6))
+        legacy = measure('dir() / getattr / int', lambda: legacy_dump(param_map, raw))
+        compiled = measure('RegisterMap', lambda: compiled_dump(regmap, raw))
+        print('  %.1fx faster' % (legacy / compiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+###########################################################################
+#####   Benchmark - Lost samples from a busy RCU, with and without retry #####
+###########################################################################
+
+"""
+A simulated Y39 answers every 4th request with SERVER_DEVICE_BUSY. 50 temperature samples (ascon.get_temperatures)
+are taken once with a single try per transaction and once with ascon's RetryPolicy, counting samples that came back
+with a missing value and the extra transactions the retries cost. Then a read of a register the RCU does not have
+shows ILLEGAL_DATA_ADDRESS failing after one try instead of being retried.
+Run with: python benchmarks/bench_retry.py
+"""
+
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+from umodbus import planner     # noqa: E402
+from umodbus.exceptions import IllegalDataAddress     # noqa: E402
+from umodbus.retry import RetryPolicy    # noqa: E402
+
+SAMPLES = 50
+
+
+def measure(label, policy):
+    ascon.retry_policy = policy
+    rcu.requests = 0
+    start = time.monotonic()
+    lost = sum(1 for _ in range(SAMPLES) if None in ascon.get_temperatures())
+    elapsed = time.monotonic() - start
+    print('  %-10s lost %2d/%d samples  %3d transactions  %5.2f s  %s'
+          % (label, lost, SAMPLES, rcu.requests, elapsed, policy.stats()))
+
+
+def main():
+    rcu.busy_every = 4
+    print('RCU busy on every 4th request:')
+    measure('no retry', RetryPolicy(attempts=1))
+    measure('retry', RetryPolicy())
+
+    rcu.busy_every = 0
+    policy = RetryPolicy()
+    errors = {}
+    planner.read_planned(ascon.s, 1, [0x1234], errors=errors, retry=policy)
+    assert isinstance(errors[0x1234], IllegalDataAddress)
+    print('missing register: %s after %d try' % (type(errors[0x1234]).__name__, policy.tries))
+
+
+if __name__ == '__main__':
+    main()
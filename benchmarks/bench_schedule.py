@@ -0,0 +1,78 @@
+###########################################################################
+#####   Benchmark - Polling schedule from param.py vs fixed loops     #####
+###########################################################################
+
+"""
+Ten minutes of polling a simulated Y39, on a virtual clock so it runs in seconds: first the two fixed loops main.py
+had (frequent poll every 3s, temperatures every 60s), then the param.py poll_schedule through ascon.poll_due(),
+sleeping until the next register is due. Counts RTU transactions and register reads, and the events
+ascon.change_events() made from the schedule's changes while the simulated door opened and closed.
+Run with: python benchmarks/bench_schedule.py
+"""
+
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+
+MINUTES = 10
+DOOR = int(ascon.param.door_status, 16)
+clock = [0]
+
+
+def door_at(ms):
+    # The door is open from 2:00 to 2:30 and from 7:00 to 7:09.
+    rcu.registers[DOOR] = 1 if 120000 <= ms < 150000 or 420000 <= ms < 429000 else 0
+
+
+def fixed_loops():
+    for ms in range(0, MINUTES * 60000, 3000):
+        door_at(ms)
+        ascon.frequent_polling()
+        if ms % 60000 == 0:
+            ascon.get_temperatures()
+
+
+def scheduled():
+    events = []
+    unit = ascon.Unit(1, ascon.param)
+    while clock[0] < MINUTES * 60000:
+        door_at(clock[0])
+        values, changes = ascon.poll_due(unit)
+        events.extend((clock[0] // 1000, msg) for msg in ascon.change_events(unit, changes))
+        clock[0] += max(1, unit.poller.ms_until_due())
+    return events
+
+
+def measure(label, function):
+    rcu.requests = 0
+    result = function()
+    print('  %-30s %4d transactions' % (label, rcu.requests))
+    return result
+
+
+def main():
+    ascon.register_ttl.clear()      # Everything over the bus, nothing from the register cache.
+    ticks_ms = time.ticks_ms
+    for holes_read_zero in (False, True):
+        print('RCU %s unmapped registers:' % ('zero-fills' if holes_read_zero else 'refuses'))
+        rcu.holes_read_zero = holes_read_zero
+        ascon.planner.refused.clear()
+        time.ticks_ms = ticks_ms
+        measure('fixed loops (3s + 60s)', fixed_loops)
+        clock[0] = 0
+        time.ticks_ms = lambda: clock[0]        # Virtual clock for the schedule. Replies still take bus time.
+        events = measure('param.py poll_schedule', scheduled)
+    time.ticks_ms = ticks_ms
+    assert [msg for s, msg in events] == ['C', 'c', 'C', 'c'], events
+    print('change events (s, event): %s' % events)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#################################################################################
+#####   Benchmark - Door poll latency during a full parameter dump           #####
+#################################################################################
+
+"""
+A bulk parameter dump (one register per request, the worst case) runs against a simulated RCU behind a Linux pty
+while a door poll is due every 100 ms. With a plain lock around the whole dump, as main.py used to do, the door poll
+waits for the entire dump. With BusScheduler the dump is queued one transaction at a time at bulk priority, so a
+door poll waits for at most one transaction plus the inter-request gap. Last, transactions cancelled while queued
+and while resting out the gap (as asyncio.wait_for does on a timeout) must leave the bus free for the next one.
+Linux / CPython only. Run with: python benchmarks/bench_scheduler.py
+"""
+
+import asyncio
+import time
+
+import host
+import ptybus
+from umodbus import planner
+from umodbus import scheduler as bus
+from umodbus.asyncmodbus import AsyncModbus
+from param import Y39
+
+DOOR = [int(Y39.door_status, 16)]
+DUMP = [int(getattr(Y39, name), 16) for name in dir(Y39) if not name.startswith('__')]
+
+
+async def door_polls(read, count, latencies):
+    for _ in range(count):
+        start = time.monotonic()
+        await read(DOOR)
+        latencies.append((time.monotonic() - start) * 1000)
+        await asyncio.sleep(0.1)
+
+
+async def with_lock(client, lock):
+    async def dump(addresses):
+        async with lock:
+            return await planner.read_planned_async(client, 1, addresses, max_gap=-1)
+
+    async def door(addresses):
+        async with lock:
+            return await planner.read_planned_async(client, 1, addresses)
+
+    return dump, door
+
+
+async def with_scheduler(scheduler):
+    async def dump(addresses):
+        return await planner.read_planned_async(scheduler.client(bus.PRIORITY_BULK), 1, addresses, max_gap=-1)
+
+    async def door(addresses):
+        return await planner.read_planned_async(scheduler.client(bus.PRIORITY_ALARM), 1, addresses)
+
+    return dump, door
+
+
+async def run(label, dump, door):
+    latencies = []
+    start = time.monotonic()
+    await asyncio.gather(dump(DUMP), door_polls(door, 8, latencies))
+    print('  %-10s door latency max %6.1f ms  mean %6.1f ms   total %.2f s'
+          % (label, max(latencies), sum(latencies) / len(latencies), time.monotonic() - start))
+
+
+async def cancelled(scheduler):
+    # Cancels a door poll while it waits for the bus, then one in the min_gap_ms rest before its transaction.
+    # Returns the time the next poll takes, which must not hang.
+    door = scheduler.client(bus.PRIORITY_ALARM)
+    for delay_ms in (0, 10):
+        await door.read_holding_register_block(1, DOOR[0], 1)
+        blocker = asyncio.ensure_future(door.read_holding_register_block(1, DOOR[0], 1)) if not delay_ms else None
+        task = asyncio.ensure_future(door.read_holding_register_block(1, DOOR[0], 1))
+        await asyncio.sleep(delay_ms / 1000)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        if blocker is not None:
+            await blocker
+    start = time.monotonic()
+    await asyncio.wait_for(door.read_holding_register_block(1, DOOR[0], 1), 2)
+    return (time.monotonic() - start) * 1000
+
+
+async def main():
+    master, stop = ptybus.open_bus(host.SimulatedRcu(host.y39_registers(), turnaround_ms=15))
+    client = AsyncModbus(*(await ptybus.open_streams(master)))
+    scheduler = bus.BusScheduler(client)
+
+    print('%d register dump, door poll every 100 ms' % len(DUMP))
+    await run('lock', *(await with_lock(client, asyncio.Lock())))
+    await run('scheduler', *(await with_scheduler(scheduler)))
+    print('  scheduler counters: %s' % scheduler.stats())
+    next_ms = await cancelled(scheduler)
+    assert not scheduler._busy and not scheduler.queue_depth(), scheduler.stats()
+    print('  after cancelled polls: next poll %.1f ms, bus free' % next_ms)
+    stop.set()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
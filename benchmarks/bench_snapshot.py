@@ -0,0 +1,94 @@
+##############################################################################
+#####   Benchmark - Parameter reports as snapshot changes vs full text   #####
+##############################################################################
+
+"""
+Two days of hourly parameter reports from a simulated Y39, with a technician changing the set point twice and the
+high temperature threshold once. Compares the bytes sent by the old 'p' reply (identity and every parameter by name,
+as text) with umodbus/snapshot.py reports: changes since the last acknowledged snapshot, nothing when nothing changed, and a
+full snapshot every ascon.full_snapshot_every reports. A backend rebuilds the parameters from the reports and must
+end with what the RCU has; one lost report must show up as a sequence gap.
+Run with: python benchmarks/bench_snapshot.py
+"""
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+from umodbus import snapshot      # noqa: E402
+
+HOURS = 48
+CHANGES = {5: ('set_point', 38), 20: ('set_point', 40), 31: ('high_temp_thresh', 12)}
+
+
+class Backend:
+    # What the receiving end keeps: the parameters of the last full snapshot plus the changes after it.
+
+    def __init__(self):
+        self.values = {}
+        self.version = None
+        self.sequence = 0
+        self.gaps = 0
+
+    def receive(self, payload):
+        report = snapshot.decode(payload)
+        if report['full']:
+            self.values = dict(report['values'])
+        elif report['version'] != self.version or \
+                report['sequence'] != (self.sequence + 1 if report['values'] else self.sequence) & 0xFFFF:
+            self.gaps += 1      # Would ask for 'p,f'.
+        else:
+            self.values.update(report['values'])
+        self.version = report['version']
+        self.sequence = report['sequence']
+
+
+def main():
+    ascon.register_ttl.clear()      # Every report reads the RCU, nothing from the register cache.
+    unit = ascon.Unit(1, ascon.param)
+    unit.serial = '108147793'
+    regmap = ascon.register_map(unit.param)
+    backend = Backend()
+    text_bytes = report_bytes = reports = 0
+
+    for hour in range(HOURS):
+        if hour in CHANGES:
+            name, value = CHANGES[hour]
+            rcu.registers[regmap.address(name)] = value
+
+        rcu_info = ascon.identify(unit.slave_addr).as_dict()
+        rcu_info['RCU Parameters'] = ascon.get_rcu_param(unit)
+        text_bytes += len(str(rcu_info))
+
+        reporter = ascon.reporter_for(unit)
+        report = reporter.encode(ascon.param_snapshot(unit))
+        if not snapshot.empty(report):
+            report_bytes += len(report)
+            reports += 1
+            backend.receive(report)
+        reporter.acknowledge()
+
+    current = {address: value & 0xFFFF for address, value in
+               zip(regmap.addresses, ascon.param_snapshot(unit))}
+    assert backend.values == current and backend.gaps == 0
+
+    print('%d hourly parameter reports, %d registers, %d changes:' % (HOURS, len(regmap), len(CHANGES)))
+    print('  %-34s %6d bytes  %4d messages' % ("text 'p' reply", text_bytes, HOURS))
+    print('  %-34s %6d bytes  %4d messages' % ('snapshot changes + full every %d' % ascon.full_snapshot_every,
+                                              report_bytes, reports))
+
+    # A change report lost on the way: the next one is out of sequence.
+    rcu.registers[regmap.address('set_point')] = 41
+    reporter.encode(ascon.param_snapshot(unit))
+    reporter.acknowledge()      # Broker had it, backend never got it.
+    rcu.registers[regmap.address('set_point')] = 42
+    backend.receive(reporter.encode(ascon.param_snapshot(unit)))
+    print('  lost report detected: %s' % (backend.gaps == 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+###########################################################################
+#####   Benchmark - Modbus TCP gateway in front of the RCU bus        #####
+###########################################################################
+
+"""
+Serves a simulated Y39 (behind a pty, AsyncModbus and the BusScheduler, as on the gateway) with umodbus.tcpgateway on
+a local port and reads the Y39 parameter registers over Modbus TCP:
+
+  per register    one request per register, the way the 'r,<hex>' MQTT command has to do it
+  per block       one request per block of the register map
+  repeat          the same blocks again within the cache time to live
+  4 masters       four masters asking for overlapping ranges at the same time - merged into one set of block reads
+
+then checks that a register cache shared with ascon is never read from, only cleared by writes over TCP.
+
+Reports the RTU transactions each took on the bus and the wall time. Linux / CPython only.
+Run with: python benchmarks/bench_tcp_gateway.py
+"""
+
+import asyncio
+import struct
+import time
+
+import host
+import ptybus
+from param import Y39
+from umodbus import scheduler as bus
+from umodbus.asyncmodbus import AsyncModbus
+from umodbus.cache import RegisterCache
+from umodbus.tcpgateway import TcpGateway
+
+BLOCKS = [(0x200, 0x36), (0x290, 0x0A), (0x2801, 0x45)]        # The Y39 map in three reads.
+OVERLAPPING = [(0x200, 0x12), (0x207, 0x2F), (0x230, 0x06), (0x290, 0x0A)]
+
+
+class Master:
+    # Minimal Modbus TCP master.
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.transaction = 0
+
+    async def read(self, start, quantity, unit=1):
+        self.transaction += 1
+        self.writer.write(struct.pack('>HHHBBHH', self.transaction, 0, 6, unit, 3, start, quantity))
+        transaction, protocol, length, unit = struct.unpack('>HHHB', await self.reader.readexactly(7))
+        pdu = await self.reader.readexactly(length - 1)
+        assert transaction == self.transaction and pdu[0] == 3, pdu
+        return struct.unpack('>%dH' % quantity, pdu[2:])
+
+
+async def measure(label, rcu, coroutines):
+    rcu.requests = 0
+    start = time.monotonic()
+    results = await asyncio.gather(*coroutines)
+    print('  %-14s %3d TCP requests  %3d RTU transactions  %6.3f s'
+          % (label, sum(len(r) for r in results), rcu.requests, time.monotonic() - start))
+    return results
+
+
+async def main():
+    rcu = host.SimulatedRcu(host.y39_registers(), holes_read_zero=True)
+    master_fd, stop = ptybus.open_bus(rcu)
+    scheduler = bus.BusScheduler(AsyncModbus(*(await ptybus.open_streams(master_fd))))
+    shared = RegisterCache()        # ascon's, with set points kept for minutes.
+    gateway = TcpGateway(scheduler.client(bus.PRIORITY_COMMAND), ttl_ms=1000, shared_cache=shared)
+    server = await gateway.start(0, '127.0.0.1')
+    port = server.sockets[0].getsockname()[1]
+    masters = [Master(*(await asyncio.open_connection('127.0.0.1', port))) for _ in range(4)]
+
+    async def read_all(master, ranges):
+        return [await master.read(start, quantity) for start, quantity in ranges]
+
+    registers = sorted(set(int(getattr(Y39, n), 16) for n in dir(Y39) if not n.startswith('__')))
+    single = await measure('per register', rcu, [read_all(masters[0], [(r, 1) for r in registers])])
+    gateway.cache.invalidate()
+    blocks = await measure('per block', rcu, [read_all(masters[0], BLOCKS)])
+    await measure('repeat', rcu, [read_all(masters[0], BLOCKS)])
+    gateway.cache.invalidate()
+    await measure('4 masters', rcu, [read_all(m, [r]) for m, r in zip(masters, OVERLAPPING)])
+
+    values = {}
+    for (start, quantity), block in zip(BLOCKS, blocks[0]):
+        values.update(zip(range(start, start + quantity), block))
+    assert [values[r] for r in registers] == [v[0] for v in single[0]], 'per register and per block disagree'
+
+    # A value ascon cached long ago is not served over TCP, and a write over TCP drops it from ascon's cache.
+    gateway.cache.invalidate()
+    shared.store(1, 0x2801, values[0x2801] + 1, None)
+    assert (await masters[0].read(0x2801, 1))[0] == values[0x2801], 'served from the shared cache'
+    await gateway.write(1, {0x2801: values[0x2801]})
+    assert shared.lookup(1, 0x2801) is None, 'write left the shared cache stale'
+    print('  %s' % gateway.stats())
+
+    for master in masters:
+        master.writer.close()
+    await asyncio.sleep(0.05)       # Let the gateway see the masters hang up.
+    gateway.stop()
+    stop.set()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+###########################################################################
+#####   Benchmark - Temperature payloads, samples vs window stats     #####
+###########################################################################
+
+"""
+Half an hour of polling a simulated Y39 on a virtual clock, with the door left open for 40 s three times between two
+samples (cabinet temperature up 6 degrees) and a defrost (evaporator up 30 degrees for 2 min). First the one sample
+per minute main.py sent as 'T' + two decascii characters per temperature, then samples every 9 s with the door poll
+(param.py) into ascon's min / max / mean / last window, sent as umodbus/windowstats.py payloads. Counts RTU
+transactions and payload bytes, with an RCU that refuses reads over unmapped registers and one that zero-fills them,
+and the highest temperatures the payloads show against the true peaks. Then the heap taken per sample (tracemalloc,
+CPython, rough guide only - see bench_alloc.py).
+
+Only the Poller and WindowStats run on the virtual clock. Modbus keeps the real one, so a missing reply still times
+out, on a bus fast enough for the run to take seconds - bus time is not what is measured here.
+Run with: python benchmarks/bench_temperature_window.py
+"""
+
+import time
+
+import host
+
+host.bus.baudrate = 1000000
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers(), turnaround_ms=0))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+import decascii     # noqa: E402
+from umodbus import poller, windowstats     # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+MINUTES = 30
+CABINET = int(ascon.param.cabinet_temp, 16)
+EVAP = int(ascon.param.evap_temp, 16)
+DOORS = ((4 * 60000 + 10000), (12 * 60000 + 12000), (24 * 60000 + 5000))      # Door opened at, open for 40 s.
+DEFROST = (17 * 60000, 19 * 60000)
+clock = [0]
+
+
+class VirtualTime:
+    # The time module as the Poller and WindowStats see it: ticks_ms is the virtual clock.
+    ticks_diff = staticmethod(time.ticks_diff)
+    ticks_add = staticmethod(time.ticks_add)
+
+    @staticmethod
+    def ticks_ms():
+        return clock[0]
+
+
+def temperatures_at(ms):
+    cabinet, evap = 40, -180
+    if any(start <= ms < start + 40000 for start in DOORS):
+        cabinet += 60
+    if DEFROST[0] <= ms < DEFROST[1]:
+        evap += 300
+    rcu.registers[CABINET] = cabinet
+    rcu.registers[EVAP] = evap
+
+
+def run(sample_ms, payload_for):
+    # Polls on the param.py schedule with the temperatures every sample_ms. payload_for(unit, values) gets the values
+    # of each poll and returns a payload when one is due.
+    ascon.poll_schedule['cabinet_temp'] = (sample_ms, 1, True)
+    ascon.poll_schedule['evap_temp'] = (sample_ms, 1, True)
+    unit = ascon.Unit(1, ascon.param)
+    clock[0] = 0
+    rcu.requests = 0
+    payloads = []
+    while clock[0] <= MINUTES * 60000:
+        temperatures_at(clock[0])
+        values, changes = ascon.poll_due(unit)
+        payload = payload_for(unit, values)
+        if payload is not None:
+            payloads.append(payload)
+        clock[0] += max(1, unit.poller.ms_until_due())
+    return payloads, rcu.requests
+
+
+def samples(unit, values):
+    # main.py before: a sample per minute, 10 of them make a payload.
+    if 'cabinet_temp' in values:
+        unit.frequent_poll_data['T'] = unit.frequent_poll_data.get('T', '') + decascii.d2a(values['cabinet_temp']) + \
+            decascii.d2a(values['evap_temp'])
+        if len(unit.frequent_poll_data['T']) >= 40:
+            return 'T' + unit.frequent_poll_data.pop('T')
+
+
+def window(unit, values):
+    # main.py now: every sample into the window, a payload when the last slot is over.
+    if 'cabinet_temp' in values:
+        ascon.add_temperatures(unit, values)
+    stats = ascon.temperature_stats_for(unit)
+    if stats.roll():
+        payload = stats.encode()
+        stats.reset(stats.next_start())
+        return payload
+
+
+def peaks_of_samples(payloads):
+    cabinet = evap = -999
+    for payload in payloads:
+        for i in range(1, len(payload), 4):
+            cabinet = max(cabinet, decascii.a2d(payload[i:i + 2]))
+            evap = max(evap, decascii.a2d(payload[i + 2:i + 4]))
+    return cabinet, evap
+
+
+def peaks_of_windows(payloads):
+    cabinet = evap = -999
+    for payload in payloads:
+        for row in windowstats.decode(payload)['slots']:
+            if row[0] is not None:
+                cabinet = max(cabinet, row[0][2])
+            if row[1] is not None:
+                evap = max(evap, row[1][2])
+    return cabinet, evap
+
+
+def report(label, payloads, requests, peaks):
+    size = sum(len(payload) for payload in payloads)
+    print('  %-30s %4d transactions  %3d payloads  %5d bytes   peak cabinet %4d  evap %4d' %
+          (label, requests, len(payloads), size, peaks[0], peaks[1]))
+
+
+def heap_per_sample():
+    stats = windowstats.WindowStats(2, ascon.temperature_slots, ascon.temperature_slot_ms)
+    for i in range(100):
+        stats.add(i & 1, i)
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(1000):
+        stats.add(i & 1, i - 500)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / 1000.0
+
+
+def main():
+    ascon.register_ttl.clear()      # Everything over the bus, nothing from the register cache.
+    schedule = dict(ascon.poll_schedule)
+    poller.time = windowstats.time = VirtualTime
+
+    print('%d minutes, true peaks: cabinet %d  evap %d' % (MINUTES, 100, 120))
+    for holes_read_zero in (False, True):
+        print('RCU %s unmapped registers:' % ('zero-fills' if holes_read_zero else 'refuses'))
+        rcu.holes_read_zero = holes_read_zero
+        ascon.planner.refused.clear()
+        payloads, requests = run(60000, samples)
+        report('sample per minute (T)', payloads, requests, peaks_of_samples(payloads))
+        payloads, requests = run(schedule['cabinet_temp'][0], window)
+        report('window stats every %d s (S)' % (schedule['cabinet_temp'][0] // 1000), payloads, requests,
+               peaks_of_windows(payloads))
+
+    poller.time = windowstats.time = time
+    ascon.poll_schedule.update(schedule)
+    print('  first window: %s' % windowstats.decode(payloads[0]))
+    heap = heap_per_sample()
+    if heap is not None:
+        print('  heap per sample added: %.2f bytes' % heap)
+
+
+if __name__ == '__main__':
+    main()
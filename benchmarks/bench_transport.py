@@ -0,0 +1,56 @@
+###########################################################################
+#####   Benchmark - One Modbus client over every transport           #####
+###########################################################################
+
+"""
+Runs the same umodbus.modbus.Modbus, unchanged, against a simulated Y39 over each transport a Linux host has: the
+fake machine.UART from host.py (what transport.uart() gives on the gateway), a pty (PtyTransport) and RTU over a
+local TCP socket (TcpTransport). Each does the frequent poll block reads ascon does and reports transactions per
+second and the CPU time umodbus spent per transaction. SerialTransport is left out, it needs pyserial and a port.
+Linux / CPython only. Run with: python benchmarks/bench_transport.py
+"""
+
+import time
+
+import host
+import ptybus
+from umodbus import planner, transport
+from umodbus.modbus import Modbus
+
+FREQUENT = [0x20E, 0x207, 0x299]        # Y39 door status, alert mask, memory error.
+ROUNDS = 20
+
+
+def measure(label, client):
+    values = planner.read_planned(client, 1, FREQUENT, signed=False)      # Warm up, and the values to compare.
+    transactions = len(planner.plan_reads(FREQUENT))
+    start = time.monotonic()
+    cpu = time.process_time()
+    for _ in range(ROUNDS):
+        assert planner.read_planned(client, 1, FREQUENT, signed=False) == values
+    cpu = time.process_time() - cpu
+    elapsed = time.monotonic() - start
+    print('  %-16s %5.1f transactions/s  %5.2f ms CPU per transaction  %s'
+          % (label, ROUNDS * transactions / elapsed, cpu * 1000 / (ROUNDS * transactions), values))
+    return values
+
+
+def main():
+    host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+    results = [measure('machine.UART', Modbus())]
+
+    master, stop = ptybus.open_bus(host.SimulatedRcu(host.y39_registers()))
+    results.append(measure('PtyTransport', Modbus(transport.PtyTransport(master))))
+    stop.set()
+
+    port, stop = ptybus.open_tcp_bus(host.SimulatedRcu(host.y39_registers()))
+    client = Modbus(transport.TcpTransport('127.0.0.1', port))
+    results.append(measure('TcpTransport', client))
+    stop.set()
+    client.deinit()
+
+    assert results.count(results[0]) == len(results), 'transports disagree'
+
+
+if __name__ == '__main__':
+    main()
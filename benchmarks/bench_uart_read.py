@@ -0,0 +1,129 @@
+#########################################################################################
+#####   Benchmark - Modbus receive path. Fixed 100ms sleep vs frame-length aware    #####
+#########################################################################################
+
+"""
+Reads the ~25 registers of a Y39 parameter dump (ascon.get_rcu_param) one at a time through umodbus against a
+simulated RCU on a fake 9600 baud UART. 'before' is the old receive path (sleep 100ms then read whatever is there),
+'after' is the current Modbus._uart_read. Then two checks, for the sync and the async client: 'noise, gap, reply' -
+an RCU whose FF noise comes 20 ms before its reply must still be read - and 'late reply' - an RCU answering after
+250 ms, past response_timeout_ms: its reply to 0x200 must not be taken for the reply to 0x300.
+Run with: python benchmarks/bench_uart_read.py
+"""
+
+import time
+
+import host
+import ptybus
+from umodbus import functions
+from umodbus.asyncmodbus import AsyncModbus, asyncio
+from umodbus.exceptions import NoResponseError
+from umodbus.modbus import Modbus
+from param import Y39
+
+GAP_SLAVE = 2
+LATE_SLAVE = 3
+LATE_REGISTERS = {0x200: 512, 0x201: 513, 0x300: 768, 0x301: 769}
+LATE_READS = ((0x200, None), (0x300, None), (0x300, 400))      # (address, timeout_ms), two registers each.
+LATE_EXPECTED = [None, None, (768, 769)]
+
+
+class LegacyModbus(Modbus):
+    # The read path as it was - sleep a fixed 100ms, take whatever the UART has and pick index 3.
+
+    def read_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True):
+        try:
+            modbus_pdu = functions.read_holding_registers(int(str(starting_addr), 16), register_qty)
+            self.transport.write(bytes([slave_addr]) + modbus_pdu + self._calculate_crc16(bytes([slave_addr]) + modbus_pdu))
+            time.sleep_ms(100)
+            return self._to_short(self.transport.read(), signed)[3]
+        except Exception:
+            return None
+
+
+def run(client, addresses, rounds):
+    values = []
+    start = time.monotonic()
+    for _ in range(rounds):
+        values = [client.read_holding_registers(slave_addr=1, starting_addr=a, register_qty=1) for a in addresses]
+    elapsed = time.monotonic() - start
+    return (rounds * len(addresses)) / elapsed, elapsed / rounds, values
+
+
+def noise_gap_reply(client):
+    # The slave at GAP_SLAVE sends FF FF, goes quiet for 20 ms - far longer than 3.5 characters - then replies.
+    start = time.monotonic()
+    value = client.read_holding_register_block(GAP_SLAVE, int(Y39.cabinet_temp, 16), 1)[0]
+    return value, (time.monotonic() - start) * 1000
+
+
+async def noise_gap_reply_async():
+    # The same RCU behind a pty for AsyncModbus.
+    master, stop = ptybus.open_bus(host.SimulatedRcu(host.y39_registers(), slave_addr=GAP_SLAVE, noise=b'\xff\xff',
+                                                     noise_gap_ms=20))
+    client = AsyncModbus(*(await ptybus.open_streams(master)))
+    start = time.monotonic()
+    value = (await client.read_holding_register_block(GAP_SLAVE, int(Y39.cabinet_temp, 16), 1))[0]
+    elapsed_ms = (time.monotonic() - start) * 1000
+    stop.set()
+    return value, elapsed_ms
+
+
+def late_reply(client):
+    # The reads of LATE_READS from LATE_SLAVE, None for NoResponseError. The third gives the RCU time to answer.
+    results = []
+    for address, timeout_ms in LATE_READS:
+        try:
+            results.append(client.read_holding_register_block(LATE_SLAVE, address, 2, True, timeout_ms))
+        except NoResponseError:
+            results.append(None)
+    return results
+
+
+async def late_reply_async():
+    master, stop = ptybus.open_bus(host.SimulatedRcu(LATE_REGISTERS, slave_addr=LATE_SLAVE, turnaround_ms=250))
+    client = AsyncModbus(*(await ptybus.open_streams(master)))
+    results = []
+    for address, timeout_ms in LATE_READS:
+        try:
+            results.append(await client.read_holding_register_block(LATE_SLAVE, address, 2, True, timeout_ms))
+        except NoResponseError:
+            results.append(None)
+    stop.set()
+    return results
+
+
+def main(rounds=2):
+    host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+    host.bus.attach(host.SimulatedRcu(host.y39_registers(), slave_addr=GAP_SLAVE, noise=b'\xff\xff',
+                                      noise_gap_ms=20))
+    host.bus.attach(host.SimulatedRcu(LATE_REGISTERS, slave_addr=LATE_SLAVE, turnaround_ms=250))
+    addresses = [getattr(Y39, name) for name in dir(Y39) if not name.startswith('__')]
+
+    before_rate, before_dump, before_values = run(LegacyModbus(), addresses, rounds)
+    after_rate, after_dump, after_values = run(Modbus(), addresses, rounds)
+
+    assert before_values == after_values, 'receive paths disagree'
+    print('registers per dump:   %d' % len(addresses))
+    print('before: %7.1f reg/s  %6.3f s per dump' % (before_rate, before_dump))
+    print('after:  %7.1f reg/s  %6.3f s per dump' % (after_rate, after_dump))
+    print('speedup: %.1fx' % (after_rate / before_rate))
+
+    sync_client = Modbus()
+    value, elapsed_ms = noise_gap_reply(sync_client)
+    assert value == -201, value
+    print('noise, gap, reply:  sync %d in %.1f ms' % (value, elapsed_ms), end='')
+    value, elapsed_ms = asyncio.run(noise_gap_reply_async())
+    assert value == -201, value
+    print(',  async %d in %.1f ms' % (value, elapsed_ms))
+
+    results = late_reply(sync_client)
+    assert results == LATE_EXPECTED, results
+    print('late reply:         sync %s' % results, end='')
+    results = asyncio.run(late_reply_async())
+    assert results == LATE_EXPECTED, results
+    print(',  async %s' % results)
+
+
+if __name__ == '__main__':
+    main()
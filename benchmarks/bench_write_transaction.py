@@ -0,0 +1,111 @@
+###########################################################################
+#####   Benchmark - Setpoint profile as a verified write transaction  #####
+###########################################################################
+
+"""
+Writes the 11 register setpoint / alarm profile of bench_batch_writes.py to a simulated Y39 that does not always take
+all of it: a register it refuses, one it quietly clamps (echoes the write, keeps its own limit), and the RCU going
+silent halfway. Each time through ascon.write_registers (the 'W' command before - written in blocks, then an 'r'
+per register for the backend to learn what the RCU holds) and through ascon.write_transaction (snapshot, write,
+read back, roll back - one status line). Counts RTU transactions and the registers left changed on the RCU, the count
+the transaction's status must report.
+Run with: python benchmarks/bench_write_transaction.py
+"""
+
+import host
+
+registers = host.y39_registers()
+registers.update({address: 0 for address in range(0x282E, 0x2837)})     # The whole high temp alarm block.
+
+
+class FussyRcu(host.SimulatedRcu):
+    # refuse: addresses answered ILLEGAL_DATA_VALUE on write. clamp: {address: highest value kept}, the write echoed
+    # as sent. silent_after: requests answered before going quiet, None for ever.
+
+    refuse = ()
+    clamp = {}
+    silent_after = None
+
+    def respond(self, frame):
+        if self.silent_after is not None and self.requests >= self.silent_after:
+            return None
+        if len(frame) > 5 and frame[0] == self.slave_addr and frame[1] == host.Const.WRITE_SINGLE_REGISTER:
+            address = (frame[2] << 8) | frame[3]
+            if address in self.refuse:
+                self.requests += 1
+                reply = self._exception(frame[1], host.Const.ILLEGAL_DATA_VALUE)
+                return reply + host.crc16(reply)
+        old = dict(self.registers)
+        reply = host.SimulatedRcu.respond(self, frame)
+        if reply is not None and frame[1] == host.Const.WRITE_MULTIPLE_REGISTERS and self.refuse and \
+                any(address in self.refuse for address in self.registers if self.registers[address] != old[address]):
+            self.registers = old        # The whole block refused.
+            reply = self._exception(frame[1], host.Const.ILLEGAL_DATA_VALUE)
+            reply = reply + host.crc16(reply)
+        if frame[1] in (host.Const.WRITE_SINGLE_REGISTER, host.Const.WRITE_MULTIPLE_REGISTERS):
+            for address, highest in self.clamp.items():
+                if self.registers[address] & 0xFFFF > highest:
+                    self.registers[address] = highest
+        return reply
+
+
+rcu = host.bus.attach(FussyRcu(registers))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+ascon.retry_policy.attempts = 1       # Nothing to gain from asking a refusing RCU again.
+
+PROFILE = [('2801', -180), ('2809', 0), ('282E', 40), ('282F', 1), ('2830', 0), ('2831', 30), ('2832', 0),
+           ('2833', 0), ('2834', 45), ('2835', 0), ('2836', 120)]
+BEFORE = 99
+
+
+def reset():
+    for address, _ in PROFILE:
+        rcu.registers[int(address, 16)] = BEFORE
+    rcu.refuse, rcu.clamp, rcu.silent_after = (), {}, None
+    ascon.cache.invalidate()
+    rcu.requests = 0
+
+
+def changed():
+    return sum(1 for address, _ in PROFILE if rcu.registers[int(address, 16)] != BEFORE)
+
+
+def old_way():
+    failed = ascon.write_registers(PROFILE)
+    reply = 'W: %d/%d%s' % (len(PROFILE) - len(failed), len(PROFILE), ' e: ' + ','.join(failed) if failed else '')
+    for address, _ in PROFILE:
+        ascon.query_rcu([address])      # The backend's 'r' for each register, to know what the RCU holds.
+    return reply
+
+
+def new_way():
+    result = ascon.write_transaction(PROFILE)
+    assert result.changed() == changed(), (result.status(), changed())    # The count the cloud gets is the truth.
+    return 'W: ' + result.status()
+
+
+def main():
+    ascon.register_ttl.clear()      # Every 'r' goes to the bus, nothing from the register cache.
+    cases = [('all taken', {}),
+             ('282F refused', {'refuse': (0x282F,)}),
+             ('2836 clamped to 110', {'clamp': {0x2836: 110}}),
+             ('silent after 4 requests', {'silent_after': 4})]
+    print('%d register profile:' % len(PROFILE))
+    for label, rcu_setup in cases:
+        print('  %s:' % label)
+        for way, function in (('write_registers + r each', old_way), ('write_transaction', new_way)):
+            reset()
+            for name, value in rcu_setup.items():
+                setattr(rcu, name, value)
+            reply = function()
+            rcu.silent_after = None
+            print('    %-26s %3d transactions  %2d/%d changed on the RCU   %s' %
+                  (way, rcu.requests, changed(), len(PROFILE), reply))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#########################################################################################
+#####   Host (CPython) shims so the gateway modules can be benchmarked off-device   #####
+#########################################################################################
+
+"""
+The gateway code is written for Micropython on the ESP32. These shims give CPython the few pieces of the Micropython
+'machine' and 'time' modules that umodbus needs, plus a simulated Ascon RCU sitting on a fake 9600 baud UART. Nothing
+in here is ever copied to the ESP32. Import this module BEFORE importing umodbus or ascon.
+Kept to what the unix port of Micropython also has, so the same benchmarks can run there.
+"""
+
+import struct
+import sys
+import time
+
+# Make the repository root importable when running 'python benchmarks/bench_xxx.py' from the repository root.
+_here = __file__.replace('\\', '/')
+sys.path.insert(0, (_here.rsplit('/', 1)[0] if '/' in _here else '.') + '/..')
+
+from umodbus import const as Const      # noqa: E402
+
+
+#########################################
+#####   Micropython time functions  #####
+#########################################
+
+def now():
+    # Seconds as a float on either CPython or Micropython.
+    if hasattr(time, 'monotonic'):
+        return time.monotonic()
+    return time.ticks_us() / 1000000
+
+
+def _ticks_ms():
+    return int(now() * 1000)
+
+
+def _ticks_us():
+    return int(now() * 1000000)
+
+
+if not hasattr(time, 'ticks_ms'):
+    time.ticks_ms = _ticks_ms
+    time.ticks_us = _ticks_us
+    time.ticks_diff = lambda new, old: new - old
+    time.ticks_add = lambda ticks, delta: ticks + delta
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+sys.modules.setdefault('utime', time)
+
+
+#####################################
+#####   Simulated Ascon RCU     #####
+#####################################
+
+def crc16(data):
+    crc = 0xFFFF
+    for char in data:
+        crc = (crc >> 8) ^ Const.CRC16_TABLE[(crc ^ char) & 0xFF]
+    return struct.pack('<H', crc)
+
+
+class SimulatedRcu:
+    # Answers Modbus RTU requests from a register dictionary. 'noise' is prepended to every reply (our FF problem).
+    # With holes_read_zero False, reading an address missing from the dictionary is an ILLEGAL_DATA_ADDRESS.
+    # With write_multiple False, Write Multiple Registers is an ILLEGAL_FUNCTION like on older firmware.
+    # With busy_every N, every Nth request is answered SERVER_DEVICE_BUSY, like an RCU saving its parameters.
+    # device_id ({object id: bytes}) turns on Read Device Identification. noise_gap_ms puts a silence between the
+    # noise and the reply, like a driver enabled early.
+
+    def __init__(self, registers=None, slave_addr=1, turnaround_ms=15, noise=b'\x00\xff\xff', holes_read_zero=False,
+                 write_multiple=True, noise_gap_ms=0):
+        self.registers = dict(registers or {})
+        self.holes_read_zero = holes_read_zero
+        self.write_multiple = write_multiple
+        self.busy_every = 0
+        self.device_id = None
+        self.slave_addr = slave_addr
+        self.turnaround_ms = turnaround_ms
+        self.noise = noise
+        self.noise_gap_ms = noise_gap_ms
+        self.requests = 0
+
+    def _exception(self, function_code, code):
+        return struct.pack('>BBB', self.slave_addr, function_code | Const.ERROR_BIAS, code)
+
+    def respond(self, frame):
+        # Returns the reply bytes (without noise) or None if the request was not for us.
+        if len(frame) < 4 or frame[0] != self.slave_addr or crc16(frame[:-2]) != frame[-2:]:
+            return None
+        self.requests += 1
+        function_code = frame[1]
+        if self.busy_every and self.requests % self.busy_every == 0:
+            reply = self._exception(function_code, Const.SERVER_DEVICE_BUSY)
+            return reply + crc16(reply)
+
+        if function_code == Const.READ_HOLDING_REGISTERS:
+            address, quantity = struct.unpack('>HH', frame[2:6])
+            span = range(address, address + quantity)
+            if not self.holes_read_zero and any(a not in self.registers for a in span):
+                reply = self._exception(function_code, Const.ILLEGAL_DATA_ADDRESS)
+            else:
+                values = [self.registers.get(a, 0) & 0xFFFF for a in span]
+                reply = struct.pack('>BBB' + 'H' * quantity, self.slave_addr, function_code, quantity * 2, *values)
+
+        elif function_code == Const.WRITE_SINGLE_REGISTER:
+            address, value = struct.unpack('>HH', frame[2:6])
+            if address not in self.registers:
+                reply = self._exception(function_code, Const.ILLEGAL_DATA_ADDRESS)
+            else:
+                self.registers[address] = value
+                reply = bytes(frame[:6])
+
+        elif function_code == Const.WRITE_MULTIPLE_REGISTERS and self.write_multiple:
+            address, quantity = struct.unpack('>HH', frame[2:6])
+            if any(a not in self.registers for a in range(address, address + quantity)):
+                reply = self._exception(function_code, Const.ILLEGAL_DATA_ADDRESS)
+            else:
+                for offset, value in enumerate(struct.unpack('>' + 'H' * quantity, frame[7:7 + quantity * 2])):
+                    self.registers[address + offset] = value
+                reply = bytes(frame[:6])
+
+        elif function_code == Const.READ_DEVICE_IDENTIFICATION and self.device_id:
+            objects = b''.join(bytes((i, len(v))) + v for i, v in sorted(self.device_id.items()))
+            reply = bytes((self.slave_addr, function_code, Const.MEI_READ_DEVICE_ID, frame[3], 0x01, 0, 0,
+                           len(self.device_id))) + objects
+
+        elif function_code == Const.MASK_WRITE_REGISTER:
+            address, and_mask, or_mask = struct.unpack('>HHH', frame[2:8])
+            if address not in self.registers:
+                reply = self._exception(function_code, Const.ILLEGAL_DATA_ADDRESS)
+            else:
+                value = self.registers[address] & 0xFFFF
+                self.registers[address] = (value & and_mask) | (or_mask & ~and_mask & 0xFFFF)
+                reply = bytes(frame[:8])
+
+        else:
+            reply = self._exception(function_code, Const.ILLEGAL_FUNCTION)
+
+        return reply + crc16(reply)
+
+
+class Bus:
+    # Stands in for the RS-485 line. Bytes of a reply trickle in at the configured baud rate. Like the real line,
+    # what we have not read stays there - a reply arriving after we gave up on it is read with the next one.
+
+    def __init__(self, baudrate=9600):
+        self.baudrate = baudrate
+        self.slaves = []
+        self._chunks = []       # [time the first byte arrives, bytes] in line order.
+
+    def attach(self, rcu):
+        self.slaves.append(rcu)
+        return rcu
+
+    def transmit(self, frame):
+        char_time = 11 / self.baudrate
+        sent = now() + len(frame) * char_time     # Our own request has to leave the wire first.
+        for rcu in self.slaves:
+            reply = rcu.respond(bytes(frame))
+            if reply is not None:
+                ready_at = sent + rcu.turnaround_ms / 1000
+                if rcu.noise_gap_ms:
+                    self._chunks.append([ready_at, rcu.noise])
+                    self._chunks.append([ready_at + len(rcu.noise) * char_time + rcu.noise_gap_ms / 1000, reply])
+                else:
+                    self._chunks.append([ready_at, rcu.noise + reply])
+                return
+
+    def available(self):
+        char_time = 11 / self.baudrate
+        count = 0
+        line_free = 0.0
+        for ready_at, data in self._chunks:
+            start = max(ready_at, line_free)
+            elapsed = now() - start
+            if elapsed < 0:
+                break
+            arrived = min(len(data), int(elapsed / char_time) + 1)
+            count += arrived
+            if arrived < len(data):
+                break
+            line_free = start + len(data) * char_time
+        return count
+
+    def take(self, count):
+        out = b''
+        while count and self._chunks:
+            chunk = self._chunks[0]
+            data = chunk[1][:count]
+            out += data
+            count -= len(data)
+            if len(data) == len(chunk[1]):
+                self._chunks.pop(0)
+            else:
+                chunk[1] = chunk[1][len(data):]
+                chunk[0] += len(data) * 11 / self.baudrate
+        return out
+
+
+bus = Bus()
+
+
+###################################
+#####   Fake machine module   #####
+###################################
+
+class UART:
+    # Just enough of machine.UART for umodbus.
+
+    INV_TX = 2
+
+    def __init__(self, uart_id, baudrate=9600, **kwargs):
+        self.bus = bus
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def deinit(self):
+        pass
+
+    def any(self):
+        return self.bus.available()
+
+    def read(self, nbytes=None):
+        count = self.bus.available()
+        if nbytes is not None:
+            count = min(count, nbytes)
+        return self.bus.take(count) if count else None
+
+    def readinto(self, buf, nbytes=None):
+        count = min(self.bus.available(), len(buf) if nbytes is None else nbytes)
+        if not count:
+            return None
+        buf[:count] = self.bus.take(count)
+        return count
+
+    def write(self, data):
+        self.bus.transmit(data)
+        return len(data)
+
+
+class machine:
+    # Stands in for the machine module. Replaces the unix Micropython one too, which has no UART.
+    UART = UART
+
+
+sys.modules['machine'] = machine
+
+
+def rcu_registers(model=None, product_code='Y39', serial=(0x0001, 0x2345, 0x0067)):
+    # A plausible register image built from param.py so benchmarks poll realistic addresses.
+    if model is None:
+        from param import Y39 as model
+    registers = {}
+    for name in dir(model):
+        if not name.startswith('__'):
+            registers[int(getattr(model, name), 16)] = 0
+    registers[int(model.cabinet_temp, 16)] = -201
+    registers[int(model.evap_temp, 16)] = 500
+    for offset in range(4):
+        registers[0xCF38 + offset] = ord(product_code[offset]) if offset < len(product_code) else 0
+    registers.update({0xCF42: serial[0], 0xCF43: serial[1], 0xCF44: serial[2], 0xCF12: 104, 0xCF13: 7})
+    return registers
+
+
+def y39_registers():
+    return rcu_registers()
@@ -0,0 +1,95 @@
+#################################################################################
+#####   Simulated RCU behind a Linux pty, for async / transport benchmarks   #####
+#################################################################################
+
+"""
+Linux / CPython only. open_bus() starts a thread answering Modbus requests on the slave end of a pty with the timing
+of a 9600 baud line and returns the master fd, for umodbus.transport.PtyTransport, plus a helper to wrap that fd as
+asyncio streams for AsyncModbus. open_tcp_bus() serves the same RCUs on a local port for TcpTransport.
+"""
+
+import asyncio
+import os
+import pty
+import socket
+import threading
+import time
+import tty
+
+import host
+
+
+def request_length(pending):
+    # Length of the request at the front of pending, 0 if more bytes are needed. Most of ours are 8 bytes long.
+    if len(pending) < 7:
+        return 0
+    if pending[1] == 0x10:
+        return 9 + pending[6]       # Write Multiple Registers - header, byte count, values, CRC.
+    if pending[1] == 0x16:
+        return 10                   # Mask Write Register.
+    if pending[1] == 0x2B:
+        return 7                    # Read Device Identification.
+    return 8
+
+
+def serve(fd, slaves, stop):
+    # Simulated RCUs on the pty slave.
+    pending = b''
+    while not stop.is_set():
+        try:
+            pending += os.read(fd, 512)
+        except OSError:
+            return
+        length = request_length(pending)
+        while length and len(pending) >= length:
+            request, pending = pending[:length], pending[length:]
+            length = request_length(pending)
+            for rcu in slaves:
+                reply = rcu.respond(request)
+                if reply:
+                    time.sleep(rcu.turnaround_ms / 1000 + len(reply) * 11 / 9600)
+                    if rcu.noise_gap_ms:
+                        os.write(fd, rcu.noise)
+                        time.sleep(rcu.noise_gap_ms / 1000)
+                        os.write(fd, reply)
+                    else:
+                        os.write(fd, rcu.noise + reply)
+                    break
+
+
+def open_bus(*slaves):
+    # Returns (master fd, stop event). Set the event to let the RCU thread end.
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    stop = threading.Event()
+    threading.Thread(target=serve, args=(slave, slaves or [host.SimulatedRcu(host.y39_registers())], stop),
+                     daemon=True).start()
+    return master, stop
+
+
+def open_tcp_bus(*slaves):
+    # The same simulated RCUs behind a local TCP port, RTU frames on the socket. Returns (port, stop event).
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    stop = threading.Event()
+
+    def accept():
+        connection, peer = server.accept()
+        server.close()
+        serve(connection.fileno(), slaves or [host.SimulatedRcu(host.y39_registers())], stop)
+        connection.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server.getsockname()[1], stop
+
+
+async def open_streams(fd):
+    # asyncio (reader, writer) over the pty master.
+    loop = asyncio.get_event_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(os.dup(fd), 'rb', 0))
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin,
+                                                        os.fdopen(os.dup(fd), 'wb', 0))
+    return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
@@ -0,0 +1,153 @@
+#################################################################################
+#####   Replay recorded RCU bus traffic through the parser and ascon polling #####
+#################################################################################
+
+"""
+Plays a session recorded by umodbus.recorder (ascon.start_recording() on the gateway, then copy /modbus.rec and
+/modbus.rec.1 off the flash) back at full speed, with no bus timing:
+
+  parser   every recorded reply, noise and all, goes through FrameParser for the request it answered. Reports
+           frames per second and how many replies were valid, failed their CRC or never came.
+  polling  ascon.frequent_polling and get_temperatures run against a UART that answers each request with the
+           replies recorded for it, in recorded order. Reports the CPU cost per poll of umodbus plus ascon.
+
+Without a session argument a short one is first recorded from a simulated Y39 with line noise and an RCU that is
+busy every 7th request, so the script also works as a regression benchmark.
+Run with: python benchmarks/replay.py [path/to/modbus.rec]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import host
+
+rcu = host.bus.attach(host.SimulatedRcu(host.y39_registers()))
+
+import ascon        # noqa: E402
+
+ascon.identity_file = None      # Nothing saved to or restored from flash.
+ascon.init_sync()               # Detects the simulated RCU(s), as ascon.init() does on the gateway.
+from umodbus.exceptions import CRCError, NoResponseError      # noqa: E402
+from umodbus.parser import FrameParser      # noqa: E402
+from umodbus.recorder import REPLY, REQUEST, read_records       # noqa: E402
+
+POLLS = 2000
+
+
+def transactions(path):
+    # (request, raw reply) pairs in recorded order.
+    pairs = []
+    request = None
+    for ticks, direction, data in read_records(path):
+        if direction == REQUEST:
+            request = data
+        elif direction == REPLY and request is not None:
+            pairs.append((request, data))
+            request = None
+    return pairs
+
+
+class ReplayUART:
+    # machine.UART look-alike that answers a request with the next reply recorded for the same request bytes.
+
+    def __init__(self, pairs):
+        self.replies = {}
+        for request, reply in pairs:
+            self.replies.setdefault(request, []).append(reply)
+        self.next = {}
+        self.pending = b''
+        self.unknown = 0
+
+    def write(self, data):
+        request = bytes(data)
+        replies = self.replies.get(request)
+        if not replies:
+            self.unknown += 1
+            self.pending = b''
+            return len(data)
+        index = self.next.get(request, 0)
+        self.pending = replies[index]
+        self.next[request] = (index + 1) % len(replies)
+        return len(data)
+
+    def any(self):
+        return len(self.pending)
+
+    def readinto(self, buf, nbytes=None):
+        count = min(len(self.pending), len(buf))
+        buf[:count] = self.pending[:count]
+        self.pending = self.pending[count:]
+        return count
+
+
+def record_session(path, cycles=40):
+    rcu.busy_every = 7
+    recorder = ascon.start_recording(path, max_bytes=1 << 20)
+    for _ in range(cycles):
+        ascon.frequent_polling()
+        ascon.get_temperatures()
+    ascon.get_rcu_param()
+    ascon.stop_recording()
+    rcu.busy_every = 0
+    print('recorded %d records to %s' % (recorder.records, path))
+
+
+def replay_parser(pairs):
+    parser = FrameParser(0, 0)
+    valid = crc = silent = 0
+    rx = bytearray(256)
+    start = time.perf_counter()
+    for request, reply in pairs:
+        parser.reset(request[0], request[1], request)
+        rx[:len(reply)] = reply
+        try:
+            if not parser.find(rx, len(reply)):
+                parser.finish(rx, len(reply))
+            valid += 1
+        except CRCError:
+            crc += 1
+        except NoResponseError:
+            silent += 1
+    elapsed = time.perf_counter() - start
+    print('parser:  %d replies  %d valid  %d bad CRC  %d no reply   %.0f replies/s'
+          % (len(pairs), valid, crc, silent, len(pairs) / elapsed))
+
+
+def replay_polling(pairs):
+    uart = ReplayUART(pairs)
+    client = ascon.s
+    client.transport = uart
+    client._silence_us = 0
+    client.poll_us = 0
+    client.response_timeout_ms = 0
+    ascon.retry_policy.backoff_ms = 0
+
+    for label, poll in (('frequent_polling', ascon.frequent_polling), ('get_temperatures', ascon.get_temperatures)):
+        tries = ascon.retry_policy.tries
+        start = time.perf_counter()
+        for _ in range(POLLS):
+            poll()
+        elapsed = time.perf_counter() - start
+        print('polling: %-17s %7.1f us per poll  %.2f transactions per poll'
+              % (label, elapsed * 1e6 / POLLS, (ascon.retry_policy.tries - tries) / POLLS))
+    if uart.unknown:
+        print('         %d requests were not in the recording' % uart.unknown)
+
+
+def main():
+    ascon.register_ttl.clear()      # Every poll on the bus and through the parser, none from the register cache.
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'modbus.rec')
+        record_session(path)
+
+    pairs = transactions(path)
+    replay_parser(pairs)
+    replay_polling(pairs)
+
+
+if __name__ == '__main__':
+    main()
@@ -34,15 +34,16 @@ wdt = machine.WDT(timeout=(int(60 * 1000) + 120000))    # Hard code the 'Long_po
 
 import gc                               # Garbage collection for limited resource management.
 import time                             # For sleeping and 'blocking' waiting.
-from umodbus.modbus import Modbus       # Custom modification of modbus protocol.
 import uasyncio                         # uasyncio - using for multiple methods simultaneously.
 import simcom                           # Custom module written for Simcom 7000g chips.
 import network                          # PPP modsocket library. Used for connecting to internet via Simcom.
 import ntptime                          # Setting ESP32 RTC on boot with time From NTP server.
 import utime                            # For Date and Time Stamping.
 from umqtt.simple import MQTTClient     # MQTT Micropython Library
-import decascii                         # Custom data compression for decimal numbers over MQTT.
 import ascon                            # Custom module written for ASCON controller functions. RCU type query here.
+from umodbus import snapshot            # Parameter reports as changes since the last acknowledged one.
+from umodbus import windowstats         # Temperature payloads as min / max / mean / last per slot.
+from umodbus import dutycycle           # Compressor and defrost on time and cycles per window.
 import ujson                            # For sending and receiving json payloads.
 
 
@@ -50,8 +51,7 @@ import ujson                            # For sending and receiving json payload
 #####   Setup and Constants     #####
 #####################################
 
-# Custom SOCK for UART connection with 'FF' filter. 'FF' filter located in the modbus package. Ascon UART bus.
-s = Modbus()
+# The Ascon UART bus is opened by ascon.init() in boot(), with the 'FF' filter located in the modbus package.
 
 # Collect Garbage to keep memory clean.
 gc.collect()
@@ -59,22 +59,19 @@ gc.collect()
 # Event Locking to make sure TEMP payload is exactly 40 Chars long (10min).
 event = uasyncio.Event()
 
-# Global Variables for frequent polling to store. Only sending data every minute.
-temperature_string = ''     # String to hold the temperature while we wait for 10min push.
-
-door_previous = 0         # Set as off as most common value. Do not need to send this on boot if not needed.
-defrost_previous = 0      # Set as off as most common value. Do not need to send this on boot if not needed.
-
-# Alerts All set to no as that's most common.
-high_temp_alert = 'no'
-low_temp_alert = 'no'
-malfunctioning_alert = 'no'
-door_open_alert = 'no'
+# RCUs on the RS-485 bus. Filled by the bus scan on boot. Each ascon.Unit keeps its own door, alert and temperature
+# state between polls and publishes on its own serial number topic.
+units = []
+ppp = None                  # network.PPP over the Simcom UART. Made by modem_up().
+command_topics = {}         # MQTT command topic (serial + '-C') -> unit.
 
 # Frequent Poll Time
-frequent_poll_interval = 3                  # 3 seconds for quick polling actions like door status.
-long_poll_interval = 60                     # 60 Seconds for temperature polling. Hard code to watchdog is changed.
-send_interval = 600                         # Time between pushes to MQTT broker. In seconds. 600 sec is 10 min
+command_check_ms = 3000                     # Longest sleep between MQTT command checks. Poll periods are in param.py.
+modbus_tcp_port = None                      # e.g. 502 to serve the RCU bus as Modbus TCP over PPP from boot.
+diagnostics_interval = 900                  # Seconds between bus metrics summaries on the serial + '-D' topic.
+param_report_interval = 3600                # Seconds between parameter change reports. Full snapshot every 24th.
+
+TASK_POLL, TASK_PAYLOAD, TASK_PARAM = 0, 1, 2     # Task numbers in the metrics summary.
 
 
 # MQTT Setup Values and Constants.
@@ -104,185 +101,106 @@ class bcolors:
 #####   Async Perpetual Functions for main program    #####
 ###########################################################
 
-# Frequent polling used to capture state changes from Ascon Controller. Door Status, Alarms, etc.
-async def frequent_polling(lock):
-    # Globals for holding previous values and alerts from the polling.
-    global door_previous
-    global defrost_previous
-    global high_temp_alert
-    global low_temp_alert
-    global malfunctioning_alert
-    global door_open_alert
+# Polling of every RCU on the schedule in param.py (poll_schedule). Each pass reads only the registers that are due -
+# door, alerts and memory error every 3s, temperatures every 9s with them - as block reads queued by priority on the
+# bus scheduler, then sleeps until the next register falls due.
+async def polling():
+    turn = 0        # Round robin. A different RCU goes first every pass so none is always last on the bus.
 
     while True:     # Keep Running Forever.
         try:        # Usually pass on small errors to keep program running.
 
-            # Timing operation to account for dynamic Ascon response timings. Get the payload to 1min interval.
-            tik = utime.ticks_ms()      # Set the start time for this task.
-
-            # Dictionary returned from Ascon Module. Ascon Module does the polling.
-            await lock.acquire()    # Lock the UART - Preventing Collisions.
-            frequent_results = ascon.frequent_polling()     # Get the dictionary.
-            utime.sleep_ms(100)     # Slow Ascon - Preventing Collisions.
-            lock.release()          # Unlock the UART.
-
-            # print(frequent_results)     # For debugging the frequent polling.
-
-            # Process the Polling object.
-
-            # Door Status Processing
-            if frequent_results['door_status'] != door_previous:    # Make sure status has changed.
-                if frequent_results['door_status'] == 0:            # Is it open or closed?
-                    send_event('c')     # Door is closed.
-                    door_previous = frequent_results['door_status']
-                elif frequent_results['door_status'] == 1:
-                    send_event('C')     # Door is Open.
-                    door_previous = frequent_results['door_status']
-                else:
-                    print('Door Error.')
-                    print(frequent_results['door_status'])
-
-            # Defrost Status Processing
-            # if frequent_results['defrost_status'] != defrost_previous:      # Make sure status has changed.
-            #     if frequent_results['defrost_status'] == 0:                 # Is it on or off?
-            #         send_event('a')     # Defrost is OFF.
-            #         defrost_previous = frequent_results['defrost_status']
-            #     else:
-            #         send_event('A')     # Defrost is ACTIVE.
-            #         defrost_previous = frequent_results['defrost_status']
-
-            # High Temp Alarm
-            if high_temp_alert != frequent_results['high_temp_alert']:      # Make sure status has changed.
-                if frequent_results['high_temp_alert'] == 'yes':
-                    print('high_temp ALERT IS ACTIVE!')
-                    high_temp_alert = frequent_results['high_temp_alert']
-                if frequent_results['high_temp_alert'] == 'no':
-                    print('high_temp ALERT IS CLEARED!')
-                    high_temp_alert = frequent_results['high_temp_alert']
-
-            # Low Temp Alarm
-            if low_temp_alert != frequent_results['low_temp_alert']:        # Make sure status has changed.
-                if frequent_results['low_temp_alert'] == 'yes':
-                    print('low_temp ALERT IS ACTIVE!')
-                    high_temp_alert = frequent_results['high_temp_alert']
-                if frequent_results['low_temp_alert'] == 'no':
-                    print('low_temp ALERT IS CLEARED!')
-                    high_temp_alert = frequent_results['low_temp_alert']
-
-            # Door Open Alarm
-            if door_open_alert != frequent_results['door_open_alert']:      # Make sure status has changed.
-                if frequent_results['door_open_alert'] == 'yes':
-                    print('door_open ALERT IS ACTIVE!')
-                    high_temp_alert = frequent_results['high_temp_alert']
-                if frequent_results['door_open_alert'] == 'no':
-                    print('door_open IS CLEARED!')
-                    high_temp_alert = frequent_results['door_open_alert']
-
-            # Malfunctioning Alarm
-            if malfunctioning_alert != frequent_results['malfunctioning_alert']:        # Make sure status has changed.
-                if frequent_results['malfunctioning_alert'] == 'yes':
-                    print('malfunctioning_alert ALERT IS ACTIVE!')
-                    high_temp_alert = frequent_results['malfunctioning_alert']
-                if frequent_results['malfunctioning_alert'] == 'no':
-                    print('malfunctioning_alert IS CLEARED!')
-                    high_temp_alert = frequent_results['malfunctioning_alert']
+            tik = utime.ticks_ms()      # Set the start time for this pass.
 
-            #  MQTT check for Commands from Cloud via the Broker.
+            for i in range(len(units)):
+                unit = units[(turn + i) % len(units)]
 
-            await lock.acquire()    # Lock to prevent collisions.
-            client.check_msg()      # Must be at end of script as causes problems with polling of RCU. NoneType #TODO
-            lock.release()          # Release the lock.
+                values, changes = await ascon.poll_due_async(unit)     # Loop keeps running while the RCU answers.
 
-            # Second part of time function for accounting for Ascon dynamic response timings.
-            tok = utime.ticks_ms()      # Set the time the task finished
-            time_delta = tok - tik      # Calculate how long the task took. Subtract from ideal time to get real wait.
-            # print('Frequent - Delta : ' + str(time_delta))  # DEBUG.
+                # Door, alerts and whatever else param.py has change_letters for, e.g. 'C' or 'Ho' - high temp on,
+                # door open cleared.
+                for msg in ascon.change_events(unit, changes):
+                    send_event(msg, unit.serial)
 
-            await uasyncio.sleep(frequent_poll_interval - (time_delta / 1000))  # In milliseconds / 1000.
+                if 'cabinet_temp' in values or 'evap_temp' in values:
+                    process_temperatures(unit, values)
 
-        except Exception as e:
-            print('Error in Main program frequent polling async.')
-            print(e)
-            close_restart()
+                ascon.update_duty_cycles(unit, values)      # Compressor and defrost, no message per transition.
 
+            turn = turn + 1
 
-# Long Polling Actions - Cabinet Temp, Evaporator Temp, Compressor Changes.
-async def long_polling(lock):
-    global temperature_string
+            # Every unit's temperature window over (ascon.temperature_slots slots, 10 min)?
+            if all(ascon.temperature_stats_for(unit).roll() for unit in units):
+                event.set()     # Allow the Build payload to proceed. It is waiting for this call.
 
-    while True:
-        try:
-            # Timing operation to account for dynamic Ascon response timings and Simcom Response / Timeouts.
-            tik = utime.ticks_ms()      # Set the start time of this task.
+            #  MQTT check for Commands from Cloud via the Broker.
 
-            await lock.acquire()
-            temps = ascon.get_temperatures()        # Variable (temps) must NOT be temperatures. So temps instead.
-            utime.sleep_ms(100)                     # Needed because ASCON RCU slow.
-            lock.release()
+            client.check_msg()      # Commands are queued on the bus scheduler by mqtt_command, no lock needed.
 
-            # Sending results of Ascon controller through compression ASCII encoding module.
-            temperature_string = temperature_string + decascii.d2a(temps[0]) + decascii.d2a(temps[1])
+            wdt.feed()      # Feed the Watch dog to prevent reboot.
 
-            # Make sure the Payload is exactly 40 Chars long.
-            if len(temperature_string) == 40:
-                event.set()     # Allow the Build payload to proceed. It is waiting for this call.
+            ascon.metrics.record_task(TASK_POLL, utime.ticks_diff(utime.ticks_ms(), tik))
 
-            # Second part of time function for accounting for Ascon dynamic response timings.
-            tok = utime.ticks_ms()  # Set the time the task finished
-            time_delta = tok - tik  # Calculate how long the task took. Subtract from ideal time to get real wait.
-            # print('Long - Delta : ' + str(time_delta))  # DEBUG.
+            # Sleep until the next register is due, but check for cloud commands at least every command_check_ms.
+            wait = ascon.ms_until_due(units)
+            await uasyncio.sleep_ms(command_check_ms if wait is None else min(wait, command_check_ms))
 
-            wdt.feed()      # Feed the Watch dog to prevent reboot.
+        except Exception as e:
+            print('Error in Main program polling async.')
+            print(e)
+            close_restart()
 
-            await uasyncio.sleep(long_poll_interval - (time_delta / 1000))  # In Milliseconds / 1000.
 
-        except Exception as e:
-            # print('Exception in Long Polling!')
-            # print(e)
-            pass
+# Temperatures from a scheduled poll go into the unit's min / max / mean / last window. Nothing is allocated per sample.
+def process_temperatures(unit, values):
+    if not ascon.add_temperatures(unit, values):
+        # Still failing after the retries. Do not take the other units down with it - the slot counts show the gap.
+        print('Temperature sample lost for slave ID ' + str(unit.slave_addr) + '.')
 
 
-# Building the payload for MQTT message. We also Check long poll information like Pr_1 and Pr_2.
+# Building the payload for MQTT message. Every 10 min the temperature window of each unit - min, max, mean and last of
+# cabinet and evaporator temperature per slot, umodbus/windowstats.py - goes out as 41 bytes and the next one starts.
+# Compressor and defrost on time, cycles and last transition of the window (umodbus/dutycycle.py) follow in the same
+# message, 24 bytes more.
 async def build_payload():
     # global door_openings
-    global temperature_string
-    time_delta = 0       # Initial Time delta needed because this task waits then executes.
 
     while True:
         try:
             # First capture the timestamp for the payload.
             # ts = timestamp()
 
-            # Wait for 600 seconds (10min).
-            await uasyncio.sleep(send_interval - 30 - (time_delta / 1000))       # -30 for no more than 40 chars. # TODO
-
-            await event.wait()      # Waiting for Long Pool to have 40 chars Temps string.
+            await event.wait()      # Waiting for polling to close the temperature windows.
 
             tik = utime.ticks_ms()  # Set the start time of this task.
 
-            # Build the payload by adding everything together.
-            # payload = 'T' + ts + temperature_string     # 'T' is for Temperature.
-            payload = 'T' + temperature_string     # 'T' is for Temperature.
-
             event.clear()       # Clear event for Long Poll and Build Payload.
 
-            # Push payload through MQTT
-            client.publish(rcu_serial, payload, qos=1)
+            for unit in units:
+                # Build the payload. 'S' first, for Statistics, then 'U' for the duty cycles.
+                stats = ascon.temperature_stats_for(unit)
+                duty = ascon.duty_cycle_for(unit)
+                temperatures = stats.encode()
+                cycles = duty.encode()
+
+                # Push payload through MQTT. Each RCU on its own serial number topic.
+                client.publish(unit.serial, temperatures + cycles, qos=1)
 
-            # Payload Info - Printed after the MQTT message was published.
-            payload = str(payload)
-            print(utime.localtime())
-            print(bcolors.OKGREEN + "PAYLOAD = " + payload + bcolors.ENDC)
+                # Payload Info - Printed after the MQTT message was published.
+                print(utime.localtime())
+                print(bcolors.OKGREEN + "PAYLOAD = " + str(windowstats.decode(temperatures)) + ' ' +
+                      str(dutycycle.decode(cycles)) + bcolors.ENDC)
+
+                # Next window, on from where this one ended.
+                stats.reset(stats.next_start())
+                duty.reset()
 
             # Collect garbage
             gc.collect()
 
-            # Reset Payload String
-            temperature_string = ''
-
             tok = utime.ticks_ms()  # Set the time the task finished
-            time_delta = tok - tik  # Calculate how long the task took. Subtract from ideal time to get real wait.
-            # print('Build - Time Delta is: ' + str(time_delta))
+            time_delta = tok - tik  # Calculate how long the task took.
+            ascon.metrics.record_task(TASK_PAYLOAD, time_delta)
 
         except Exception as e:
             print('Critical Error in Building or Sending the Payload!')
@@ -291,13 +209,47 @@ async def build_payload():
             pass
 
 
+# Bus metrics - round trip histograms per function code and register, timeouts, CRC failures, exception codes,
+# retries and the task timings above - as one binary summary (umodbus/metrics.py) every diagnostics_interval.
+async def diagnostics():
+
+    while True:
+        await uasyncio.sleep(diagnostics_interval)
+        try:
+            client.publish(units[0].serial + '-D', ascon.metrics_summary())
+        except Exception as e:
+            print('Error publishing the bus metrics.')
+            print(e)
+
+
+# Parameter changes. Every param_report_interval the parameters of each RCU are read and the registers that changed
+# since the last report the broker acknowledged are published (umodbus/snapshot.py). Nothing is sent if nothing
+# changed. Every ascon.full_snapshot_every reports a full snapshot with a new version number goes instead.
+async def param_reports():
+
+    while True:
+        await uasyncio.sleep(param_report_interval)
+        tik = utime.ticks_ms()
+        for unit in units:
+            try:
+                report = await ascon.param_report_async(unit)
+                if not snapshot.empty(report):
+                    client.publish(unit.serial, report, qos=1)
+                unit.reporter.acknowledge()
+            except Exception as e:
+                print('Error publishing the parameter report.')
+                print(e)
+        ascon.metrics.record_task(TASK_PARAM, utime.ticks_diff(utime.ticks_ms(), tik))
+
+
 ##################################
 #####   Close and Restart    #####
 ##################################
 
 def close_restart():
     print('Closing Connections.')
-    ppp.active(False)
+    if ppp is not None:
+        ppp.active(False)
     time.sleep(1)
     simcom.simcom.write('+++')  # Cancel potential existing PPP mode to avoid unicode error.
     time.sleep(1)
@@ -314,9 +266,9 @@ def close_restart():
 #####   Event and Alert Handling - MQTT Publish  #####
 ######################################################
 
-def send_event(msg):
-    # client.publish(rcu_serial, msg + timestamp())
-    client.publish(rcu_serial, msg)
+def send_event(msg, topic=None):
+    # client.publish(topic or rcu_serial, msg + timestamp())
+    client.publish(topic or rcu_serial, msg)
     # print(bcolors.OKGREEN + 'Event Message: ' + msg + timestamp() + bcolors.ENDC)
     print(bcolors.OKGREEN + 'Event Message: ' + msg + bcolors.ENDC)
 
@@ -325,12 +277,17 @@ def send_event(msg):
 #####   Incoming Commands - MQTT Command Processing     #####
 #############################################################
 
+# MQTT callback. Runs inside client.check_msg() so it only hands the command to a task - the task waits its turn
+# on the RCU bus scheduler. The topic picks the RCU the command is for.
 def mqtt_command(topic, msg):
-    # globals for publishing
-    global rcu_serial
+    print((topic, msg))
+    uasyncio.create_task(cloud_command(msg, command_topics.get(topic, units[0])))
+
+
+async def cloud_command(msg, unit):
+    rcu_serial = unit.serial        # Replies go to the unit's own topic.
 
     try:
-        print((topic, msg))
         # print('Decoding values: ')
         decoded = msg.decode("utf-8").split(',')
         # print("Command is: " + decoded[0])
@@ -339,45 +296,76 @@ def mqtt_command(topic, msg):
 
         # Querying a register on the RCU - Returns the Value from the register.
         if decoded[0] == 'r':
-            reply = ascon.query_rcu([str(decoded[1])])
+            reply = await ascon.query_rcu_async([str(decoded[1])], slave_addr=unit.slave_addr)
             client.publish(rcu_serial, str(reply))
 
         # Writting to a register on the RCU.
         elif decoded[0] == 'w':
-            reply = 'e: ' + str(ascon.write_register(register_address=decoded[1], value=decoded[2]))
+            reply = 'e: ' + str(await ascon.write_register_async(register_address=decoded[1], value=decoded[2],
+                                                                 slave_addr=unit.slave_addr))
             client.publish(rcu_serial, str(reply))
 
-        # Diagnostic and full parameters from RCU.
+        # Writting a list of registers - 'W,address,value,address,value,...' - all or nothing. Neighbouring registers
+        # go to the RCU in one transaction, all are read back, and put back as they were if any did not take. One
+        # status line as the reply, e.g. 'W: ok 3/3' or 'W: rb 0/3 e:282E' - see umodbus/transaction.py.
+        elif decoded[0] == 'W':
+            fields = decoded[1:]
+            if len(fields) % 2:
+                fields.append(None)     # An address without its value - refused with the rest, not dropped.
+            writes = list(zip(fields[0::2], fields[1::2]))
+            result = await ascon.write_transaction_async(writes, slave_addr=unit.slave_addr)
+            client.publish(rcu_serial, 'W: ' + result.status())
+
+        # Parameters from RCU as a report of the registers changed since the last acknowledged one. Set points come
+        # from the cache. 'p,f' reads everything again and sends a full snapshot with a new version number.
+        # 'p,j' is the readable dump - identity and every parameter by name.
         elif decoded[0] == 'p':
-            rcu_type = ascon.get_rcu_type()
-            rcu_serial = ascon.get_rcu_serial()
-            rcu_fw = ascon.get_rcu_fw()
-            rcu_params = ascon.get_rcu_param()
-
-            rcu_info = {
-                "RCU Type": rcu_type,
-                "RCU Serial": rcu_serial,
-                "RCU Firmware": rcu_fw,
-                "RCU Parameters": rcu_params,
-                      }
-
-            ujson.dumps(rcu_info)
-
-            client.publish(rcu_serial, str(rcu_info))
+            option = decoded[1] if len(decoded) > 1 else ''
+            if option == 'f':
+                ascon.refresh(unit.slave_addr)
+            if option == 'j':
+                rcu_info = (await ascon.identify_async(unit.slave_addr)).as_dict()     # Cached since boot.
+                rcu_info["RCU Parameters"] = await ascon.get_rcu_param_async(unit)
+                client.publish(rcu_serial, ujson.dumps(rcu_info))
+            else:
+                client.publish(rcu_serial, await ascon.param_report_async(unit, full=option == 'f'), qos=1)
+                unit.reporter.acknowledge()     # qos 1 - publish returned, so the broker has it.
 
         elif decoded[0] == 'ip':
             client.publish(rcu_serial, str(ppp.ifconfig()))
 
+        # RCU bus scheduler counters - jobs, waits and queue depth per priority - retry and register cache counters.
+        elif decoded[0] == 'bus':
+            stats = ascon.bus_scheduler().stats()
+            stats.update(ascon.retry_policy.stats())
+            stats.update(ascon.cache.stats())
+            if ascon.gateway is not None:
+                stats['tcp'] = ascon.gateway.stats()
+            client.publish(rcu_serial, str(stats))
+
+        # Bus traffic recorder - 'rec,1' starts recording to flash, 'rec,0' stops and flushes.
+        elif decoded[0] == 'rec':
+            if decoded[1] == '1':
+                ascon.start_recording()
+            else:
+                ascon.stop_recording()
+            client.publish(rcu_serial, 'rec: ' + decoded[1])
+
+        # Modbus TCP gateway - 'tcp,502' serves the RCU bus on port 502 of the PPP address ('ip'), 'tcp,0' stops it.
+        elif decoded[0] == 'tcp':
+            if int(decoded[1]):
+                await ascon.start_tcp_gateway(int(decoded[1]))
+            else:
+                ascon.stop_tcp_gateway()
+            client.publish(rcu_serial, 'tcp: ' + decoded[1])
+
         # Soft restart
         elif decoded[0] == 'restart':
             close_restart()
 
         else:
-            # await lock.acquire()
             client.publish(rcu_serial, 'Command Not Recognized!')
 
-        utime.sleep_ms(500)     # Needed because ASCON RCU slow.
-
     except Exception as e:
         print('Problem Writting Command!')
         print(e)
@@ -421,35 +409,50 @@ print('Watchdog has been engaged!')
 #####   Initialization of Simcom and ON BOOT functions.     #####
 #################################################################
 
-print('\r\n' + bcolors.OKBLUE + ' - Setting up Simcom Modem - ' + bcolors.ENDC + '\r\n')
-
-# SIMCOM.py Functions for prepping the cellular modem.
-simcom.simcom.read()            # Flush Buffer.
-simcom.simcom.write('+++')      # Cancel potential existing PPP mode to avoid unicode error.
-simcom.power_off()              # Turn Off modem.
-simcom.power_on()               # Turn ON modem.
-simcom.simcom.read()            # Flush Buffer.
-simcom.setup()                  # Setup the modem with APN etc.
-simcom.simcom.read()            # Read the UART to make sure there are no straggling messages.
-print('Waiting for Cellular Signal Check... 4 Seconds.')   # Wait 4 Seconds for CSQ to work correctly (Not return 99)
-time.sleep(4)                   # Wait before asking CSQ.
-simcom.csq()                    # Get Signal Quality.
-
-
-######################################################################################
-#####   Simcom PPP initialization for native micropython sockets over cellular.  #####
-######################################################################################
-
-print('\r\n' + bcolors.OKBLUE + ' - Setting up Cellular PPP Data Connection - ' + bcolors.ENDC + '\r\n')
-print('Connecting to internet via PPP protocol. Wait 10 seconds.')
-
-simcom.ppp_connect()
-ppp = network.PPP(simcom.simcom)                # Attaching Simcom to the PPP network mod.
-ppp.active(True)                                # Activate the ppp attachment.
-ppp.connect()                                   # Connect the ppp attachment.
-print('Waiting For IP address. 6 Seconds.')     # Wait before asking for IP.
-time.sleep(6)                                   # Wait for Connection. 5 sec can work trying 6.
-print(ppp.ifconfig())                           # Print the IP address to confirm connection is successful.
+# Modem and PPP bring-up. The waits for the modem to boot, for the signal check and for the IP address are awaited,
+# so the RCU detection boot() starts beside it runs in them. The AT command exchanges still block.
+async def modem_up():
+    global ppp
+
+    print('\r\n' + bcolors.OKBLUE + ' - Setting up Simcom Modem - ' + bcolors.ENDC + '\r\n')
+
+    # SIMCOM.py Functions for prepping the cellular modem.
+    simcom.simcom.read()            # Flush Buffer.
+    simcom.simcom.write('+++')      # Cancel potential existing PPP mode to avoid unicode error.
+    simcom.power_off()              # Turn Off modem.
+    simcom.power_on_start()         # Turn ON modem.
+    print('Waiting 7 seconds for modem boot procedures.')
+    await uasyncio.sleep(simcom.power_on_wait)
+    simcom.power_on_check()
+    simcom.simcom.read()            # Flush Buffer.
+    simcom.setup()                  # Setup the modem with APN etc.
+    simcom.simcom.read()            # Read the UART to make sure there are no straggling messages.
+    print('Waiting for Cellular Signal Check... 4 Seconds.')   # Wait 4 Seconds for CSQ to work correctly (Not 99)
+    await uasyncio.sleep(4)         # Wait before asking CSQ.
+    simcom.csq()                    # Get Signal Quality.
+
+    # Simcom PPP initialization for native micropython sockets over cellular.
+    print('\r\n' + bcolors.OKBLUE + ' - Setting up Cellular PPP Data Connection - ' + bcolors.ENDC + '\r\n')
+    print('Connecting to internet via PPP protocol. Wait 10 seconds.')
+
+    simcom.ppp_connect()
+    ppp = network.PPP(simcom.simcom)                # Attaching Simcom to the PPP network mod.
+    ppp.active(True)                                # Activate the ppp attachment.
+    ppp.connect()                                   # Connect the ppp attachment.
+    print('Waiting For IP address. 6 Seconds.')     # Wait before asking for IP.
+    await uasyncio.sleep(6)                         # Wait for Connection. 5 sec can work trying 6.
+    print(ppp.ifconfig())                           # Print the IP address to confirm connection is successful.
+
+
+# RCU detection (ascon.init - saved identities checked, or a bus scan) overlapped with the modem bring-up. Returns the
+# RCUs found.
+async def boot():
+    detection = uasyncio.create_task(ascon.init())
+    await modem_up()
+    return await detection
+
+
+units = uasyncio.run(boot())
 
 if ppp.isconnected() is True:
     print('Connected via PPP Data Layer.')
@@ -486,20 +489,31 @@ while ntp_sync_attempts < 3:
 #############################################
 
 print('\r\n' + bcolors.OKBLUE + ' - Ascon RCU Setup - ' + bcolors.ENDC + '\r\n')
-rcu_type = ascon.get_rcu_type()
+# Every RCU on the RS-485 bus (multi-drop), each with its model - found by ascon.init() during boot(). As saved on
+# flash if they still answer to it, otherwise by a full bus scan. Nothing can be polled without one, so keep looking.
+while not units:
+    print('Bus scan found no RCU. Detecting again.')
+    wdt.feed()
+    units = uasyncio.run(ascon.detect())
 
 # if rcu_type == 'RCU Not Recognized':
 # #     client.publish(gps_coordinates, 'RCU ERROR', qos=1)             # TODO Mac address and GPS cordinates.
-rcu_serial = ascon.get_rcu_serial()
-rcu_fw = ascon.get_rcu_fw()
-rcu_params = ascon.get_rcu_param()
-
-print('Getting RCU information. This will take 5 seconds')
-print('RCU Type: ' + rcu_type)
-print('RCU Serial: ' + str(rcu_serial))
-print('RCU Firmware: ' + str(rcu_fw))
+print('Getting RCU information.')
+for unit in units:
+    identity = ascon.identify(unit.slave_addr)      # Type, serial and firmware. Read by ascon.init(), cached for 'p'.
+    unit.serial = identity.serial
+    command_topics[(str(unit.serial) + '-C').encode()] = unit      # umqtt hands the callback the topic as bytes.
+
+    print('RCU Slave ID: ' + str(unit.slave_addr))
+    print('RCU Type: ' + unit.product_code)
+    print('RCU Serial: ' + str(unit.serial))
+    print('RCU Firmware: ' + str(identity.firmware))
+
+# Parameters are read when asked for ('p') or reported by param_reports().
+
 print('RCU is Smart Lock 2? ' + str(ascon.is_smart_lock_2()))
-print('RCU Params: ' + str(rcu_params))
+
+rcu_serial = units[0].serial    # MQTT client ID and the topic for messages not about one RCU.
 
 
 #################################################################################
@@ -515,7 +529,8 @@ def connect_and_subscribe():
     client = MQTTClient(rcu_serial, mqtt_server, ssl=True, user=mqtt_user, password=mqtt_pass, port=mqtt_port)
     client.set_callback(mqtt_command)
     client.connect()
-    client.subscribe(rcu_serial + '-C')      # rcu_serial unique identifier and then C for 'command'.
+    for topic in command_topics:
+        client.subscribe(topic)     # RCU serial unique identifier and then C for 'command'. One per RCU.
     print('Connected to %s MQTT broker.' % mqtt_server)
     return client
 
@@ -544,14 +559,16 @@ print('\r\n' + bcolors.HEADER + ' ##########     Starting Perpetual Tasks    ###
 # Asyncio Loops and Set up - Main loops for the entire program.
 
 if __name__ == '__main__':
-    lock = uasyncio.Lock()
     # Get the event loop
     loop = uasyncio.get_event_loop()
 
     # Create the tasks
     loop.create_task(build_payload())
-    loop.create_task(frequent_polling(lock))
-    loop.create_task(long_polling(lock))
+    loop.create_task(polling())
+    loop.create_task(diagnostics())
+    loop.create_task(param_reports())
+    if modbus_tcp_port:
+        loop.create_task(ascon.start_tcp_gateway(modbus_tcp_port))
 
     # Run Built Tasks Loop Forever.
     loop.run_forever()
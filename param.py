@@ -83,3 +83,45 @@ class X34:
 
     # Alert Mask
     alert_mask = '207'
+
+
+##############################
+#####   Polling Schedule  #####
+##############################
+
+# What main.py polls, how often and how urgently, by register name - the same names for every controller class above.
+# (period in ms, bus priority, signed). Priorities as in umodbus/scheduler.py: 0 alarm, 1 temperature, 3 bulk.
+# Registers due at about the same time are read together as block reads. Registers not listed here are only read on
+# request ('p', 'r'). To monitor another register add a line, e.g. 'lock_status': (10000, 3, False).
+
+poll_schedule = {
+    'door_status': (3000, 0, False),
+    'alert_mask': (3000, 0, False),         # Bitmask, unsigned.
+    'rcu_memory_error': (3000, 0, False),
+    'cabinet_temp': (9000, 1, True),        # Every third door poll, in the same block read. Min / max / mean / last
+    'evap_temp': (9000, 1, True),           # of the samples go out per ascon.temperature_slot_ms.
+    'compressor_status': (9000, 1, False),  # With the temperatures: on time and cycles per payload window, see
+    'defrost_status': (9000, 1, False),     # ascon.update_duty_cycles(). Cycles are minutes long, 9 s is plenty.
+}
+
+# Events sent to the cloud when a polled register changes: one letter per value, e.g. 'C' when door_status turns 1.
+# Listing a register here (and on poll_schedule) is all it takes - main.py sends whatever ascon.change_events() makes.
+# Defrost events would be 'defrost_status': ('a', 'A'). Alerts come from the alert mask instead, see alert_bits.
+
+change_letters = {
+    'door_status': ('c', 'C'),              # Closed, open.
+}
+
+
+##############################
+#####   Alert Mask Bits   #####
+##############################
+
+# Bits of the alert_mask register, per controller class: (alert, bit number, 0 = least significant). The alerts are
+# the ones in ascon.alert_names. Both controllers report in the same positions so far - if a model moves a bit, give it
+# its own rows here. Memory errors come from rcu_memory_error, not the mask.
+
+alert_bits = {
+    Y39: (('high_temp', 9), ('low_temp', 10), ('door_open', 11)),
+    X34: (('high_temp', 9), ('low_temp', 10), ('door_open', 11)),
+}
@@ -109,13 +109,25 @@ def AT(cmd="", timeout=10, success="OK", failure="+CME ERROR"):
 
 
 # Power on function for Simcom Modem
+power_on_wait = 7       # Seconds the modem takes to boot after power on.
+
+
 def power_on():
+    power_on_start()
+    print('Waiting 7 seconds for modem boot procedures.')
+    time.sleep(power_on_wait)
+    power_on_check()
+
+
+# power_on() in two halves, for callers that do something else while the modem boots (power_on_wait seconds).
+def power_on_start():
     print("Powering ON Modem.")
     simcom.read()
     AT('', timeout=0)
     cell_power.on()
-    print('Waiting 7 seconds for modem boot procedures.')
-    time.sleep(7)
+
+
+def power_on_check():
     simcom.read()
     AT('', timeout=10)
     AT('+CPIN?')
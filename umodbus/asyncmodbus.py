@@ -0,0 +1,214 @@
+from umodbus import const as Const
+from umodbus import functions
+from umodbus.exceptions import ModbusError
+from umodbus.parser import FrameParser, check_exception, crc16
+from umodbus.modbus import Modbus
+from umodbus.recorder import REPLY, REQUEST
+import struct
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio      # CPython, for running against a pty on a Linux host.
+
+
+class AsyncModbus:
+
+    # Same RTU timing as Modbus. Waiting is done with awaits, so other tasks run while the RCU answers.
+    baudrate = Modbus.baudrate
+    char_bits = Modbus.char_bits
+    response_timeout_ms = Modbus.response_timeout_ms
+    late_reply_ms = Modbus.late_reply_ms
+    frame_size = Modbus.frame_size
+    recorder = None     # umodbus.recorder.Recorder, as for Modbus.
+    metrics = None      # umodbus.metrics.Metrics, as for Modbus.
+
+    def __init__(self, reader, writer, port=None):
+        # reader / writer are uasyncio (or asyncio) streams over the RCU UART. port, the UART or transport under
+        # them, lets bytes left on the line be thrown away before each request without waiting on the streams.
+        self.reader = reader
+        self.writer = writer
+        self.port = port
+        self._silence_s = max(1750, (35 * self.char_bits * 100000) // self.baudrate) / 1000000
+        self._parser = FrameParser(0, 0)
+        self._lock = asyncio.Lock()     # One transaction on the bus at a time.
+
+        self._tx = bytearray(self.frame_size)
+        self._rx = bytearray(self.frame_size)
+        self._tx_view = memoryview(self._tx)
+        self._rx_view = memoryview(self._rx)
+        self._tx_frames = {}
+        self._formats = {}
+        self._rx_end = 0
+        self._late_until = None         # As for Modbus.
+
+    @classmethod
+    def from_uart(cls, uart):
+        # Wrap an already initialised machine.UART (e.g. the one Modbus set up) in uasyncio streams.
+        return cls(asyncio.StreamReader(uart), asyncio.StreamWriter(uart, {}), uart)
+
+    @classmethod
+    def from_transport(cls, transport):
+        # Streams over the port a Modbus client's transport uses - the UART itself, or the TcpTransport socket.
+        stream = getattr(transport, 'stream', transport)
+        return cls(asyncio.StreamReader(stream), asyncio.StreamWriter(stream, {}), transport)
+
+    def _short_format(self, quantity, signed):
+        return Modbus._short_format(self, quantity, signed)
+
+    def _tx_frame(self, length):
+        return Modbus._tx_frame(self, length)
+
+    async def _drain(self):
+        # Modbus._drain: throws away what is waiting on the port, and after a timeout whatever the streams deliver
+        # until _late_until.
+        port = self.port
+        if port is not None:
+            while port.any():
+                port.readinto(self._rx_view)
+        late_until = self._late_until
+        self._late_until = None
+        while late_until is not None:
+            wait = time.ticks_diff(late_until, time.ticks_ms())
+            if wait <= 0:
+                return
+            try:
+                if not await asyncio.wait_for(self.reader.read(self.frame_size), wait / 1000):
+                    return      # Stream closed.
+            except asyncio.TimeoutError:
+                return
+
+    async def _read_reply(self, slave_addr, function_code, timeout_ms):
+        # Awaits the reply to the request in self._tx into self._rx. Returns the frame length at self._parser.start.
+        parser = self._parser
+        parser.reset(slave_addr, function_code, self._tx)
+        rx = self._rx
+        size = len(rx)
+        end = self._rx_end = 0
+        started = time.ticks_ms()
+
+        while True:
+            if parser.locked:
+                wait = self._silence_s      # In a frame - only wait for the next character.
+            else:
+                wait = max(0, timeout_ms - time.ticks_diff(time.ticks_ms(), started)) / 1000    # Noise, or nothing.
+            try:
+                chunk = await asyncio.wait_for(self.reader.read(size - end), wait)
+            except asyncio.TimeoutError:
+                if not parser.locked:
+                    self._late_until = time.ticks_add(time.ticks_ms(), min(self.late_reply_ms, timeout_ms))
+                length = parser.finish(rx, end)     # No reply, or 3.5 character silence after a partial one.
+                break
+            if not chunk:
+                length = parser.finish(rx, end)     # Stream closed.
+                break
+            self._rx_view[end:end + len(chunk)] = chunk
+            end += len(chunk)
+            self._rx_end = end
+            length = parser.find(rx, end)
+            if length:
+                break
+            if end >= size:
+                length = parser.finish(rx, end)
+                break
+
+        check_exception(rx, parser.start)
+        return length
+
+    async def _transaction(self, slave_addr, pdu_length, timeout_ms=None):
+        # The request PDU is already packed into self._tx[1:]. Returns (frame start, frame length) in self._rx.
+        if timeout_ms is None:
+            timeout_ms = self.response_timeout_ms
+        tx = self._tx
+        tx[0] = slave_addr
+        end = 1 + pdu_length
+        crc = crc16(tx, 0, end)
+        tx[end] = crc & 0xFF
+        tx[end + 1] = crc >> 8
+        recorder = self.recorder
+        metrics = self.metrics
+        await self._drain()
+        started = time.ticks_ms()
+        self.writer.write(self._tx_frame(end + Const.CRC_LENGTH))
+        await self.writer.drain()
+        if recorder is None and metrics is None:
+            length = await self._read_reply(slave_addr, tx[1], timeout_ms)
+        else:
+            if recorder is not None:
+                recorder.record(REQUEST, tx, end + Const.CRC_LENGTH)
+            error = None
+            try:
+                length = await self._read_reply(slave_addr, tx[1], timeout_ms)
+            except ModbusError as e:
+                error = e
+                raise
+            finally:
+                if recorder is not None:
+                    recorder.record(REPLY, self._rx, self._rx_end)
+                if metrics is not None:
+                    metrics.record(tx[1], (tx[2] << 8) | tx[3], time.ticks_diff(time.ticks_ms(), started), error)
+        return self._parser.start, length
+
+    async def _send_receive(self, modbus_pdu, slave_addr, timeout_ms=None):
+        # General path for a prebuilt PDU from functions.py. Returns a copy of the reply frame.
+        async with self._lock:
+            self._tx[1:1 + len(modbus_pdu)] = modbus_pdu
+            start, length = await self._transaction(slave_addr, len(modbus_pdu), timeout_ms)
+            return bytes(self._rx[start:start + length])
+
+    async def read_holding_register_block(self, slave_addr, starting_addr, register_qty, signed=True,
+                                          timeout_ms=None):
+        # Reads register_qty registers from an integer address. Returns a tuple with every value.
+        # Raises a ModbusError (NoResponseError, CRCError, ExceptionResponse) if the read fails.
+        if not (1 <= register_qty <= 125):
+            raise ValueError('invalid number of holding registers')
+        async with self._lock:
+            struct.pack_into('>BHH', self._tx, 1, Const.READ_HOLDING_REGISTERS, starting_addr, register_qty)
+            start, length = await self._transaction(slave_addr, 5, timeout_ms)
+            if self._rx[start + 2] != register_qty * 2:
+                raise ValueError('unexpected byte count %d' % self._rx[start + 2])
+            return struct.unpack_from(self._short_format(register_qty, signed), self._rx, start + 3)
+
+    async def read_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True, timeout_ms=None):
+        # starting_addr is the hex string from param.py. Returns the first register value, or None.
+        try:
+            block = await self.read_holding_register_block(slave_addr, int(str(starting_addr), 16), register_qty,
+                                                           signed, timeout_ms)
+            return block[0]
+        except Exception:
+            return None
+
+    async def write_single_register(self, slave_addr, register_address, register_value, signed=True,
+                                    timeout_ms=None):
+        # register_address is the hex string from param.py. Returns the value the RCU echoed.
+        return await self.write_holding_register(slave_addr, int(str(register_address), 16), register_value, signed,
+                                                 timeout_ms)
+
+    async def write_holding_register(self, slave_addr, address, value, signed=True, timeout_ms=None):
+        # Write Single Register at an integer address. Returns the value the RCU echoed.
+        async with self._lock:
+            struct.pack_into('>BHh' if signed else '>BHH', self._tx, 1, Const.WRITE_SINGLE_REGISTER, address, value)
+            start, length = await self._transaction(slave_addr, 5, timeout_ms)
+            return struct.unpack_from('>h' if signed else '>H', self._rx, start + 4)[0]
+
+    async def write_multiple_registers(self, slave_addr, starting_address, register_values, signed=True,
+                                       timeout_ms=None):
+        # Writes register_values to consecutive registers from an integer address in one transaction.
+        # Returns True if the RCU echoed the starting address and quantity back.
+        modbus_pdu = functions.write_multiple_registers(starting_address, register_values, signed)
+        resp_data = await self._send_receive(modbus_pdu, slave_addr, timeout_ms)
+        return functions.validate_resp_data(resp_data[2:6], Const.WRITE_MULTIPLE_REGISTERS, starting_address,
+                                            quantity=len(register_values))
+
+    async def mask_write_register(self, slave_addr, register_address, and_mask, or_mask, timeout_ms=None):
+        # (value AND and_mask) OR (or_mask AND NOT and_mask) on the RCU. Returns True if the RCU echoed the request.
+        modbus_pdu = functions.mask_write_register(register_address, and_mask, or_mask)
+        resp_data = await self._send_receive(modbus_pdu, slave_addr, timeout_ms)
+        return functions.validate_resp_data(resp_data[2:8], Const.MASK_WRITE_REGISTER, register_address,
+                                            value=(and_mask, or_mask))
+
+    async def read_device_identification(self, slave_addr, read_code=0x01, object_id=0x00, timeout_ms=None):
+        # Read Device Identification (0x2B / 0x0E). Returns {object id: bytes}.
+        modbus_pdu = functions.read_device_identification(read_code, object_id)
+        return functions.device_objects(await self._send_receive(modbus_pdu, slave_addr, timeout_ms))
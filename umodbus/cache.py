@@ -0,0 +1,54 @@
+###############################################################################
+#####   Register cache - answer repeat reads of slow changing registers     #####
+###############################################################################
+
+"""
+Set points, thresholds, delays and the RCU identity hardly ever change, but every parameter dump used to read them
+over the 9600 baud bus again. RegisterCache keeps the last value read (or written) per slave and register with an
+expiry time. The caller decides the time to live per register: 0 is never cached (live values such as temperatures),
+None never expires. Values are kept as the unsigned 16 bit register and converted on the way out, so one entry
+serves signed and unsigned reads.
+"""
+
+import time
+
+
+class RegisterCache:
+
+    def __init__(self):
+        self._values = {}       # (slave_addr << 16) | address -> (unsigned value, expiry ticks_ms or None)
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, slave_addr, address, signed=True):
+        # The cached value, or None if there is none or it has expired.
+        entry = self._values.get((slave_addr << 16) | address)
+        if entry is None or (entry[1] is not None and time.ticks_diff(entry[1], time.ticks_ms()) <= 0):
+            self.misses += 1
+            return None
+        self.hits += 1
+        value = entry[0]
+        if signed and value & 0x8000:
+            value -= 0x10000
+        return value
+
+    def store(self, slave_addr, address, value, ttl_ms):
+        # Keep a value read from or written to the RCU for ttl_ms. Failed reads (None) are not cached.
+        key = (slave_addr << 16) | address
+        if value is None or ttl_ms == 0:
+            self._values.pop(key, None)
+            return
+        self._values[key] = (value & 0xFFFF, None if ttl_ms is None else time.ticks_add(time.ticks_ms(), ttl_ms))
+
+    def invalidate(self, slave_addr=None, address=None):
+        # Forget one register, every register of one slave, or everything.
+        if slave_addr is None:
+            self._values.clear()
+        elif address is not None:
+            self._values.pop((slave_addr << 16) | address, None)
+        else:
+            for key in [k for k in self._values if k >> 16 == slave_addr]:
+                del self._values[key]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'cached': len(self._values)}
@@ -22,6 +22,7 @@ GET_COM_EVENT_COUNTER = 0x0B
 GET_COM_EVENT_LOG = 0x0C
 REPORT_SERVER_ID = 0x11
 READ_DEVICE_IDENTIFICATION = 0x2B
+MEI_READ_DEVICE_ID = 0x0E           # MEI type of Read Device Identification.
 
 # exception codes
 ILLEGAL_FUNCTION = 0x01
@@ -40,6 +41,7 @@ ERROR_BIAS = 0x80
 RESPONSE_HDR_LENGTH = 0x02
 ERROR_RESP_LEN = 0x05
 FIXED_RESP_LEN = 0x08
+MASK_WRITE_RESP_LEN = 0x0A
 MBAP_HDR_LENGTH = 0x07
 
 CRC16_TABLE = (
@@ -0,0 +1,126 @@
+###############################################################################
+#####   Duty cycles - on time and on / off cycles per reporting window    #####
+###############################################################################
+
+"""
+A message per compressor or defrost transition, or a string of them growing until the payload goes out, costs bytes
+and heap in proportion to how often the RCU switches. A DutyCycle watches a few on / off channels (compressor status,
+defrost status) from the polls and keeps, per channel and reporting window, only: the time on, the number of on
+cycles that ended, the shortest and longest of them and when the last transition was - in array rows sized once, so
+nothing is allocated per poll whatever the switching rate.
+
+A cycle is an on period, counted in the window it ends in with its full length, so one that started in the window
+before is not cut short. Time on only counts the part inside the window. Transitions are seen when polled - times
+are as good as the poll period. The first value seen is taken as the state, not as a transition.
+
+encode() packs the window, reset() starts the next one. Little endian, seconds throughout:
+
+    kind u8 ('U') | window s u16 | channels u8
+    then for each channel: state u8 (0 off, 1 on, 0xFF not seen) | cycles u8 | on s u16 | shortest s u16 |
+    longest s u16 | last transition u16 (after the window start, 0xFFFF none)
+
+shortest and longest are 0 when no cycle ended. main.py sends it after the temperature window (windowstats.py) in the
+same message. decode() turns a payload back into a dict.
+"""
+
+import struct
+import time
+from array import array
+
+KIND = 0x55         # 'U'
+HEADER = '<BHB'
+RECORD = '<BBHHHH'
+UNKNOWN = -1
+NONE = 0xFFFF
+MAX_COUNT = 0xFF
+
+
+class DutyCycle:
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.states = array('b', [UNKNOWN] * channels)
+        self.on_since = array('l', [0] * channels)       # ticks_ms the channel went on, if it is on.
+        self.on_ms = array('l', [0] * channels)
+        self.cycles = array('H', [0] * channels)
+        self.shortest_ms = array('l', [0] * channels)
+        self.longest_ms = array('l', [0] * channels)
+        self.last_ms = array('l', [0] * channels)        # Last transition after the window start, -1 none.
+        self.reset()
+
+    def reset(self, now=None):
+        # Starts the next window. The states carry over.
+        self.started = time.ticks_ms() if now is None else now
+        for i in range(self.channels):
+            self.on_ms[i] = 0
+            self.cycles[i] = 0
+            self.shortest_ms[i] = 0
+            self.longest_ms[i] = 0
+            self.last_ms[i] = -1
+
+    def _on_in_window(self, i, now):
+        # How long channel i, on since on_since, has been on inside this window.
+        since = self.on_since[i]
+        if time.ticks_diff(since, self.started) < 0:
+            since = self.started
+        return time.ticks_diff(now, since)
+
+    def update(self, channel, value, now=None):
+        # The value polled for channel. Anything but 0 is on.
+        state = 1 if value else 0
+        old = self.states[channel]
+        if state == old:
+            return
+        if now is None:
+            now = time.ticks_ms()
+        self.states[channel] = state
+        if old == UNKNOWN:
+            if state:
+                self.on_since[channel] = now
+            return
+        self.last_ms[channel] = time.ticks_diff(now, self.started)
+        if state:
+            self.on_since[channel] = now
+            return
+        self.on_ms[channel] += self._on_in_window(channel, now)
+        length = time.ticks_diff(now, self.on_since[channel])
+        if self.cycles[channel] == 0 or length < self.shortest_ms[channel]:
+            self.shortest_ms[channel] = length
+        if length > self.longest_ms[channel]:
+            self.longest_ms[channel] = length
+        if self.cycles[channel] < MAX_COUNT:
+            self.cycles[channel] += 1
+
+    def encode(self, now=None):
+        # The window up to now as bytes, layout in the module docstring.
+        if now is None:
+            now = time.ticks_ms()
+        out = bytearray(struct.pack(HEADER, KIND, _seconds(time.ticks_diff(now, self.started)), self.channels))
+        for i in range(self.channels):
+            state = self.states[i]
+            on_ms = self.on_ms[i] + (self._on_in_window(i, now) if state == 1 else 0)
+            last = self.last_ms[i]
+            out += struct.pack(RECORD, 0xFF if state == UNKNOWN else state, self.cycles[i], _seconds(on_ms),
+                               _seconds(self.shortest_ms[i]), _seconds(self.longest_ms[i]),
+                               NONE if last < 0 else _seconds(last))
+        return out
+
+
+def _seconds(ms):
+    return min((ms + 500) // 1000, NONE - 1)
+
+
+def decode(payload, offset=0):
+    # encode() back to a dict, for the backend and the benchmarks. channels is a list of dicts, one per channel. state
+    # is None for a channel never seen, last_s None if it did not switch in the window. offset is where it starts in
+    # payload, after the temperature window in main.py's messages.
+    kind, window_s, channels = struct.unpack_from(HEADER, payload, offset)
+    offset += struct.calcsize(HEADER)
+    size = struct.calcsize(RECORD)
+    result = []
+    for _ in range(channels):
+        state, cycles, on_s, shortest_s, longest_s, last_s = struct.unpack_from(RECORD, payload, offset)
+        result.append({'state': None if state == 0xFF else state, 'cycles': cycles, 'on_s': on_s,
+                       'shortest_s': shortest_s, 'longest_s': longest_s, 'last_s': None if last_s == NONE else last_s})
+        offset += size
+    return {'window_s': window_s, 'channels': result}
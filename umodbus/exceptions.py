@@ -0,0 +1,91 @@
+from umodbus import const as Const
+
+
+class ModbusError(Exception):
+    # Base class for everything that can go wrong in a Modbus transaction.
+    pass
+
+
+class NoResponseError(ModbusError):
+    # Nothing that looks like a reply from the slave came back before the timeout.
+    pass
+
+
+class CRCError(ModbusError):
+    # A reply with the right slave, function and length arrived but its CRC16 did not check out.
+    pass
+
+
+class ExceptionResponse(ModbusError):
+    # The slave answered with an exception response (function code + ERROR_BIAS).
+
+    def __init__(self, function_code, code):
+        super().__init__('function 0x%02X exception code 0x%02X' % (function_code, code))
+        self.function_code = function_code
+        self.code = code
+
+    def is_illegal_address(self):
+        return self.code == Const.ILLEGAL_DATA_ADDRESS
+
+
+# One subclass per Modbus exception code so callers can catch exactly what they can deal with.
+
+class IllegalFunction(ExceptionResponse):
+    # The slave does not support the function code.
+    pass
+
+
+class IllegalDataAddress(ExceptionResponse):
+    # A register in the request is not in the slave's register map. Asking again will not help.
+    pass
+
+
+class IllegalDataValue(ExceptionResponse):
+    # A value or quantity in the request is not allowed.
+    pass
+
+
+class ServerDeviceFailure(ExceptionResponse):
+    # The slave hit an unrecoverable error while handling the request.
+    pass
+
+
+class Acknowledge(ExceptionResponse):
+    # The slave accepted a long running request and is still working on it.
+    pass
+
+
+class ServerDeviceBusy(ExceptionResponse):
+    # The slave is busy with something else. Worth asking again a little later.
+    pass
+
+
+class MemoryParityError(ExceptionResponse):
+    pass
+
+
+class GatewayPathUnavailable(ExceptionResponse):
+    pass
+
+
+class GatewayTargetFailed(ExceptionResponse):
+    # A gateway got no reply from the device behind it.
+    pass
+
+
+_by_code = {
+    Const.ILLEGAL_FUNCTION: IllegalFunction,
+    Const.ILLEGAL_DATA_ADDRESS: IllegalDataAddress,
+    Const.ILLEGAL_DATA_VALUE: IllegalDataValue,
+    Const.SERVER_DEVICE_FAILURE: ServerDeviceFailure,
+    Const.ACKNOWLEDGE: Acknowledge,
+    Const.SERVER_DEVICE_BUSY: ServerDeviceBusy,
+    Const.MEMORY_PARITY_ERROR: MemoryParityError,
+    Const.GATEWAY_PATH_UNAVAILABLE: GatewayPathUnavailable,
+    Const.DEVICE_FAILED_TO_RESPOND: GatewayTargetFailed,
+}
+
+
+def exception_response(function_code, code):
+    # The ExceptionResponse subclass for an exception code. Codes we do not know stay a plain ExceptionResponse.
+    return _by_code.get(code, ExceptionResponse)(function_code, code)
@@ -69,6 +69,25 @@ def write_multiple_registers(starting_address, register_values, signed=True):
                         quantity, quantity * 2, *register_values)
 
 
+def mask_write_register(reference_address, and_mask, or_mask):
+    return struct.pack('>BHHH', Const.MASK_WRITE_REGISTER, reference_address, and_mask, or_mask)
+
+
+def read_device_identification(read_code=0x01, object_id=0x00):
+    return struct.pack('>BBBB', Const.READ_DEVICE_IDENTIFICATION, Const.MEI_READ_DEVICE_ID, read_code, object_id)
+
+
+def device_objects(frame):
+    # {object id: bytes} from a Read Device Identification response frame (slave address first).
+    objects = {}
+    offset = 8
+    for _ in range(frame[7]):
+        length = frame[offset + 1]
+        objects[frame[offset]] = bytes(frame[offset + 2:offset + 2 + length])
+        offset += 2 + length
+    return objects
+
+
 def validate_resp_data(data, function_code, address, value=None, quantity=None, signed = True):
     if function_code in [Const.WRITE_SINGLE_COIL, Const.WRITE_SINGLE_REGISTER]:
         fmt = '>H' + ('h' if signed else 'H')
@@ -82,4 +101,10 @@ def validate_resp_data(data, function_code, address, value=None, quantity=None,
 
         if (address == resp_addr) and (quantity == resp_qty):
             return True
+
+    elif function_code == Const.MASK_WRITE_REGISTER:
+        resp_addr, resp_and, resp_or = struct.unpack('>HHH', data)
+
+        if (address == resp_addr) and (value == (resp_and, resp_or)):
+            return True
     return False
@@ -0,0 +1,192 @@
+###############################################################################
+#####   Bus metrics - where the RCU poll budget goes                        #####
+###############################################################################
+
+"""
+With a Metrics attached to Modbus or AsyncModbus (client.metrics = Metrics()) every transaction's round trip - request
+sent to reply parsed, or given up on - is counted into a latency histogram for its function code and one for the
+register it started at. Histograms have fixed buckets (BUCKETS_MS upper bounds, the last bucket is everything above)
+and live in array('H') rows made once, register rows included, so recording allocates nothing - not per transaction
+and not per window. No response, CRC failures and exception codes are counted as well, and main.py adds how long
+each of its tasks took.
+
+encode() packs one window of it into a few hundred bytes for the diagnostics topic, reset() starts the next window.
+All little endian:
+
+    version u8 | window s u16 | buckets u8 | timeouts u16 | crc errors u16 | retries u16
+    exceptions u8, then (code u8, count u16) each
+    functions u8, then (function code u8, count u16 per bucket) each
+    registers u8, then (address u16, count u16 per bucket) each
+    tasks u8, then (task u8, runs u16, mean ms u16, max ms u16) each
+
+Only rows with something in them are sent. decode() turns a payload back into a dict.
+"""
+
+import struct
+import time
+from array import array
+
+from umodbus.exceptions import CRCError, ExceptionResponse
+
+VERSION = 1
+BUCKETS_MS = (10, 20, 50, 100, 150, 200, 300, 500, 1000)     # Upper bounds. One more bucket for slower than that.
+FUNCTIONS = (0x03, 0x06, 0x10, 0x16, 0x2B)      # Own histogram each. The last row is for every other function.
+REGISTER_FUNCTIONS = (0x03, 0x06, 0x10, 0x16)   # Requests that start at a register address.
+MAX_REGISTERS = 24          # Registers with their own histogram. Requests at more addresses only count per function.
+MAX_TASKS = 8
+MAX_COUNT = 0xFFFF
+TIMEOUTS = 0                # Rows of Metrics.errors.
+CRC_ERRORS = 1
+
+
+class Metrics:
+
+    def __init__(self, max_registers=MAX_REGISTERS):
+        self.max_registers = max_registers
+        self.buckets = len(BUCKETS_MS) + 1
+        self.functions = [array('H', bytes(2 * self.buckets)) for _ in range(len(FUNCTIONS) + 1)]
+        self.register_addresses = array('H', bytes(2 * max_registers))     # Start address of each row in use.
+        self.register_rows = [array('H', bytes(2 * self.buckets)) for _ in range(max_registers)]
+        self.register_count = 0
+        self.exceptions = array('H', bytes(2 * 16))     # Count per exception code, 0x0F for anything above.
+        self.errors = array('H', bytes(2 * 2))          # TIMEOUTS, CRC_ERRORS.
+        self.task_runs = array('H', bytes(2 * MAX_TASKS))
+        self.task_max_ms = array('H', bytes(2 * MAX_TASKS))
+        self.task_total_ms = [0] * MAX_TASKS
+        self.reset()
+
+    def reset(self):
+        for row in self.functions:
+            for i in range(self.buckets):
+                row[i] = 0
+        for row in self.register_rows:
+            for i in range(self.buckets):
+                row[i] = 0
+        self.register_count = 0
+        for i in range(len(self.exceptions)):
+            self.exceptions[i] = 0
+        for i in range(MAX_TASKS):
+            self.task_runs[i] = 0
+            self.task_max_ms[i] = 0
+            self.task_total_ms[i] = 0
+        self.errors[TIMEOUTS] = 0
+        self.errors[CRC_ERRORS] = 0
+        self.started = time.ticks_ms()
+
+    def _bucket(self, ms):
+        i = 0
+        while i < len(BUCKETS_MS):
+            if ms <= BUCKETS_MS[i]:
+                return i
+            i += 1
+        return i
+
+    def _register_row(self, address):
+        # The histogram row for a start address, the next free one the first time it is seen. None once all are
+        # taken. A scan of at most max_registers - cheaper than the wire time of one byte, and nothing allocated.
+        addresses = self.register_addresses
+        count = self.register_count
+        i = 0
+        while i < count:
+            if addresses[i] == address:
+                return self.register_rows[i]
+            i += 1
+        if count == self.max_registers:
+            return None
+        addresses[count] = address
+        self.register_count = count + 1
+        return self.register_rows[count]
+
+    def record(self, function_code, address, elapsed_ms, error=None):
+        # One transaction. address is the start register of the request (ignored for other functions), error the
+        # ModbusError it ended with, if any.
+        bucket = self._bucket(elapsed_ms)
+        if function_code in FUNCTIONS:
+            row = self.functions[FUNCTIONS.index(function_code)]
+        else:
+            row = self.functions[-1]
+        if row[bucket] < MAX_COUNT:
+            row[bucket] += 1
+
+        if function_code in REGISTER_FUNCTIONS:
+            row = self._register_row(address)
+            if row is not None and row[bucket] < MAX_COUNT:
+                row[bucket] += 1
+
+        if error is None:
+            return
+        if isinstance(error, ExceptionResponse):
+            row = self.exceptions
+            i = min(error.code, 0x0F)
+        else:
+            row = self.errors
+            i = CRC_ERRORS if isinstance(error, CRCError) else TIMEOUTS     # Else a NoResponseError.
+        if row[i] < MAX_COUNT:
+            row[i] += 1
+
+    def record_task(self, task, elapsed_ms):
+        # How long one run of a main.py task took. task is a small number, see main.py.
+        if self.task_runs[task] < MAX_COUNT:
+            self.task_runs[task] += 1
+            self.task_total_ms[task] += elapsed_ms
+        if elapsed_ms > self.task_max_ms[task]:
+            self.task_max_ms[task] = min(elapsed_ms, MAX_COUNT)
+
+    def encode(self, retries=0):
+        # The window so far as bytes, layout in the module docstring.
+        window_s = time.ticks_diff(time.ticks_ms(), self.started) // 1000
+        out = bytearray(struct.pack('<BHBHHH', VERSION, min(window_s, MAX_COUNT), self.buckets,
+                                    self.errors[TIMEOUTS], self.errors[CRC_ERRORS],
+                                    min(retries, MAX_COUNT)))
+        codes = [code for code in range(len(self.exceptions)) if self.exceptions[code]]
+        out.append(len(codes))
+        for code in codes:
+            out += struct.pack('<BH', code, self.exceptions[code])
+
+        rows = [(FUNCTIONS[i] if i < len(FUNCTIONS) else 0, row) for i, row in enumerate(self.functions) if any(row)]
+        out.append(len(rows))
+        for function_code, row in rows:
+            out.append(function_code)
+            out += row          # array('H') is little endian on the ESP32 as on any PC we decode on.
+        addresses = self.register_addresses
+        out.append(self.register_count)
+        for i in sorted(range(self.register_count), key=lambda i: addresses[i]):
+            out += struct.pack('<H', addresses[i])
+            out += self.register_rows[i]
+
+        tasks = [task for task in range(MAX_TASKS) if self.task_runs[task]]
+        out.append(len(tasks))
+        for task in tasks:
+            runs = self.task_runs[task]
+            out += struct.pack('<BHHH', task, runs, min(self.task_total_ms[task] // runs, MAX_COUNT),
+                               self.task_max_ms[task])
+        return out
+
+
+def decode(payload):
+    # encode() back to a dict, for the backend and the benchmarks.
+    version, window_s, buckets, timeouts, crc_errors, retries = struct.unpack_from('<BHBHHH', payload, 0)
+    offset = 10
+    result = {'version': version, 'window_s': window_s, 'timeouts': timeouts, 'crc_errors': crc_errors,
+              'retries': retries, 'exceptions': {}, 'functions': {}, 'registers': {}, 'tasks': {}}
+    row = '<%dH' % buckets
+
+    for _ in range(payload[offset]):
+        code, count = struct.unpack_from('<BH', payload, offset + 1)
+        result['exceptions'][code] = count
+        offset += 3
+    offset += 1
+    for _ in range(payload[offset]):
+        result['functions'][payload[offset + 1]] = struct.unpack_from(row, payload, offset + 2)
+        offset += 1 + 2 * buckets
+    offset += 1
+    for _ in range(payload[offset]):
+        address = struct.unpack_from('<H', payload, offset + 1)[0]
+        result['registers'][address] = struct.unpack_from(row, payload, offset + 3)
+        offset += 2 + 2 * buckets
+    offset += 1
+    for _ in range(payload[offset]):
+        task, runs, mean_ms, max_ms = struct.unpack_from('<BHHH', payload, offset + 1)
+        result['tasks'][task] = (runs, mean_ms, max_ms)
+        offset += 7
+    return result
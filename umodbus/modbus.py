@@ -1,27 +1,50 @@
 
 from umodbus import functions
 from umodbus import const as Const
+from umodbus.exceptions import ModbusError
+from umodbus.parser import FrameParser, check_exception, crc16
+from umodbus.recorder import REPLY, REQUEST
+from umodbus import transport as transports
 import struct
-from machine import UART
 import time
 
 
 class Modbus:
 
-    def __init__(self):
+    # Receive timing. A frame is finished once the parser has a CRC valid reply, or the line has been quiet for
+    # 3.5 characters after the start of one. Noise alone does not end the wait - only response_timeout_ms does.
+    baudrate = 9600
+    char_bits = 11                  # Modbus RTU timing assumes 11 bits per character (start, 8 data, parity/stop).
+    response_timeout_ms = 200       # Give up if the RCU has not started answering within this time.
+    late_reply_ms = 100             # After a timeout, how long a late reply is waited for and thrown away.
+    poll_us = 500                   # Sleep between UART checks while waiting for bytes.
+    frame_size = 256                # Largest RTU frame. Request and reply buffers are allocated once at this size.
+    recorder = None                 # umodbus.recorder.Recorder to keep every request and raw reply, or None.
+    metrics = None                  # umodbus.metrics.Metrics to count latency and errors per transaction, or None.
 
+    def __init__(self, transport=None):
+
+        # 3.5 character inter-frame silence. Spec fixes it at 1750us above 19200 baud.
+        self._silence_us = max(1750, (35 * self.char_bits * 100000) // self.baudrate)
+        self._parser = FrameParser(0, 0)
+
+        # Preallocated transaction buffers. Requests are packed and replies read in place - no heap churn per poll.
+        self._tx = bytearray(self.frame_size)
+        self._rx = bytearray(self.frame_size)
+        self._tx_view = memoryview(self._tx)
+        self._rx_view = memoryview(self._rx)
+        self._tx_frames = {}            # Cached views of the first n bytes of self._tx, by n.
+        self._formats = {}              # Cached '>hhh..' unpack formats by (quantity, signed).
+        self._rx_end = 0                # Raw reply bytes in self._rx after the last transaction.
+        self._late_until = None         # ticks_ms until which a late reply may still come in, after a timeout.
+
+        # Anything from umodbus.transport (or a machine.UART). Defaults to the RCU UART on pins 32 / 33.
         global s
-        # UART 1 used for Cellular modem chip.
-        s = UART(2, 9600)  # init with given baudrate
-        # rx=16, tx=17 for non cell ESP32. RX=22, TX=23 for cellular chips. 32 & 33 can also be used.
-        # pins 22 and 23 work for RX - TX pins 12 and 14 work as well.
-        s.init(baudrate=9600, bits=8, parity=None, stop=1, rx=32, tx=33)  # init with given parameters
+        s = self.transport = transport if transport is not None else transports.uart(baudrate=self.baudrate)
+        self._drain()
 
     def _calculate_crc16(self, data):
-        crc = 0xFFFF
-        for char in data:
-            crc = (crc >> 8) ^ Const.CRC16_TABLE[((crc) ^ char) & 0xFF]
-        return struct.pack('<H', crc)
+        return struct.pack('<H', crc16(data))
 
     def _bytes_to_bool(self, byte_list):
         bool_list = []
@@ -34,6 +57,20 @@ class Modbus:
         fmt = '>' + (('h' if signed else 'H') * response_quantity)
         return struct.unpack(fmt, byte_array)
 
+    def _short_format(self, quantity, signed):
+        key = quantity if signed else -quantity
+        fmt = self._formats.get(key)
+        if fmt is None:
+            fmt = self._formats[key] = '>' + (('h' if signed else 'H') * quantity)
+        return fmt
+
+    def _tx_frame(self, length):
+        # self._tx[:length] without slicing a new memoryview for every request.
+        frame = self._tx_frames.get(length)
+        if frame is None:
+            frame = self._tx_frames[length] = self._tx_view[:length]
+        return frame
+
     def _exit_read(self, response):
         if response[1] >= Const.ERROR_BIAS:
             if len(response) < Const.ERROR_RESP_LEN:
@@ -46,39 +83,171 @@ class Modbus:
             return False
         return True
 
-    def _uart_read(self):
-        time.sleep_ms(100)
-        read = s.read()
-        return read
+    def _drain(self):
+        # Throws away whatever is waiting on the line - noise, a reply that came too late - so it is not taken for
+        # the answer to the next request. After a timeout, first gives a late reply until _late_until to turn up.
+        port = self.transport
+        view = self._rx_view
+        late_until = self._late_until
+        self._late_until = None
+        while True:
+            if port.any():
+                port.readinto(view)
+            elif late_until is None or time.ticks_diff(late_until, time.ticks_ms()) <= 0:
+                return
+            else:
+                time.sleep_us(self.poll_us)
+
+    def _uart_read(self, slave_addr, function_code, timeout_ms=None):
+        # Reads the reply to the request in self._tx into self._rx. Returns the length of the CRC valid frame at
+        # self._parser.start, after any 'FF' noise. Raises NoResponseError, CRCError or ExceptionResponse.
+        parser = self._parser
+        parser.reset(slave_addr, function_code, self._tx)
+        port = self.transport
+        rx = self._rx
+        view = self._rx_view
+        size = len(rx)
+        end = self._rx_end = 0
+        if timeout_ms is None:
+            timeout_ms = self.response_timeout_ms
+        started = time.ticks_ms()
+        last_rx = time.ticks_us()
+
+        while True:
+            if port.any():
+                end += port.readinto(view[end:] if end else view) or 0
+                self._rx_end = end              # Raw bytes received so far, noise included. For the recorder.
+                last_rx = time.ticks_us()
+                length = parser.find(rx, end)
+                if length:
+                    break       # Got the whole frame. No need to wait any longer.
+                if end >= size:
+                    length = parser.finish(rx, end)     # Buffer full of noise. Last chance for a frame.
+                    break
+            elif parser.locked:
+                if time.ticks_diff(time.ticks_us(), last_rx) >= self._silence_us:
+                    length = parser.finish(rx, end)     # 3.5 character silence in a frame - the RCU is done talking.
+                    break
+            elif time.ticks_diff(time.ticks_ms(), started) >= timeout_ms:
+                self._late_until = time.ticks_add(time.ticks_ms(), min(self.late_reply_ms, timeout_ms))
+                length = parser.finish(rx, end)         # Nothing, or only noise, came back. Raises NoResponseError.
+                break
+            time.sleep_us(self.poll_us)
+
+        check_exception(rx, parser.start)
+        return length
 
-    def _send_receive(self, modbus_pdu, slave_addr):
-        serial_pdu = bytearray()
-        serial_pdu.append(slave_addr)
-        serial_pdu.extend(modbus_pdu)
-        crc = self._calculate_crc16(serial_pdu)
-        serial_pdu.extend(crc)
-        s.write(serial_pdu)
-        return self._uart_read()
+    def _transaction(self, slave_addr, pdu_length, timeout_ms=None):
+        # The request PDU is already packed into self._tx[1:]. Adds slave address and CRC in place, sends it and
+        # reads the reply. Returns (frame start, frame length) in self._rx.
+        tx = self._tx
+        tx[0] = slave_addr
+        end = 1 + pdu_length
+        crc = crc16(tx, 0, end)
+        tx[end] = crc & 0xFF
+        tx[end + 1] = crc >> 8
+        recorder = self.recorder
+        metrics = self.metrics
+        self._drain()
+        started = time.ticks_ms()
+        self.transport.write(self._tx_frame(end + Const.CRC_LENGTH))
+        if recorder is None and metrics is None:
+            length = self._uart_read(slave_addr, tx[1], timeout_ms)
+        else:
+            if recorder is not None:
+                recorder.record(REQUEST, tx, end + Const.CRC_LENGTH)
+            error = None
+            try:
+                length = self._uart_read(slave_addr, tx[1], timeout_ms)
+            except ModbusError as e:
+                error = e
+                raise
+            finally:
+                if recorder is not None:
+                    recorder.record(REPLY, self._rx, self._rx_end)     # Whatever came back, even if it was unusable.
+                if metrics is not None:
+                    metrics.record(tx[1], (tx[2] << 8) | tx[3], time.ticks_diff(time.ticks_ms(), started), error)
+        return self._parser.start, length
+
+    def _send_receive(self, modbus_pdu, slave_addr, timeout_ms=None):
+        # General path for a prebuilt PDU from functions.py. Returns a copy of the reply frame.
+        self._tx[1:1 + len(modbus_pdu)] = modbus_pdu
+        start, length = self._transaction(slave_addr, len(modbus_pdu), timeout_ms)
+        return bytes(self._rx[start:start + length])
+
+    def _read_block(self, slave_addr, starting_addr, register_qty, timeout_ms=None):
+        # Read Holding Registers through the preallocated buffers. Returns the offset of the first value in self._rx.
+        if not (1 <= register_qty <= 125):
+            raise ValueError('invalid number of holding registers')
+        struct.pack_into('>BHH', self._tx, 1, Const.READ_HOLDING_REGISTERS, starting_addr, register_qty)
+        start, length = self._transaction(slave_addr, 5, timeout_ms)
+        if self._rx[start + 2] != register_qty * 2:
+            raise ValueError('unexpected byte count %d' % self._rx[start + 2])
+        return start + 3
+
+    def read_holding_register_block(self, slave_addr, starting_addr, register_qty, signed=True, timeout_ms=None):
+        # Reads register_qty registers from an integer address. Returns a tuple with every value.
+        # Raises a ModbusError (NoResponseError, CRCError, ExceptionResponse) if the read fails.
+        # timeout_ms overrides response_timeout_ms, e.g. a short one while scanning the bus for slaves.
+        offset = self._read_block(slave_addr, starting_addr, register_qty, timeout_ms)
+        return struct.unpack_from(self._short_format(register_qty, signed), self._rx, offset)
+
+    def read_registers_into(self, slave_addr, starting_addr, register_qty, out, out_offset=0, signed=True):
+        # Allocation free block read. Values are written into out (an array('h') or list) from out_offset.
+        rx = self._rx
+        offset = self._read_block(slave_addr, starting_addr, register_qty)
+        for i in range(register_qty):
+            value = (rx[offset] << 8) | rx[offset + 1]
+            if signed and value & 0x8000:
+                value -= 0x10000
+            out[out_offset + i] = value
+            offset += 2
+        return out
 
     def read_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True):
+        # starting_addr is the hex string from param.py. Returns the first register value, or None.
         try:
             starting_addr = int(str(starting_addr), 16)
-            modbus_pdu = functions.read_holding_registers(starting_addr, register_qty)
-            resp_data = self._send_receive(modbus_pdu, slave_addr)
-            register_value = self._to_short(resp_data, signed)
-            return register_value[3]  # can use / 10 if we need to divide by 10
-        except Exception as ex:
-            # return 'Error Reading: ' + str(ex)        # DEBUG
+            register_value = self.read_holding_register_block(slave_addr, starting_addr, register_qty, signed)
+            return register_value[0]  # can use / 10 if we need to divide by 10
+        except Exception:
             return None
 
     def write_single_register(self, slave_addr, register_address, register_value, signed=True):
-        register_address = int(str(register_address), 16)
-        modbus_pdu = functions.write_single_register(register_address, register_value, signed)
-        resp_data = self._send_receive(modbus_pdu, slave_addr)
-        return resp_data[3]
+        # register_address is the hex string from param.py. Returns the value the RCU echoed.
+        return self.write_holding_register(slave_addr, int(str(register_address), 16), register_value, signed)
+
+    def write_holding_register(self, slave_addr, address, value, signed=True, timeout_ms=None):
+        # Write Single Register at an integer address. Returns the value the RCU echoed.
+        struct.pack_into('>BHh' if signed else '>BHH', self._tx, 1, Const.WRITE_SINGLE_REGISTER, address, value)
+        start, length = self._transaction(slave_addr, 5, timeout_ms)
+        return struct.unpack_from('>h' if signed else '>H', self._rx, start + 4)[0]
+
+    def write_multiple_registers(self, slave_addr, starting_address, register_values, signed=True, timeout_ms=None):
+        # Writes register_values to consecutive registers from an integer address in one transaction.
+        # Returns True if the RCU echoed the starting address and quantity back.
+        modbus_pdu = functions.write_multiple_registers(starting_address, register_values, signed)
+        resp_data = self._send_receive(modbus_pdu, slave_addr, timeout_ms)
+        return functions.validate_resp_data(resp_data[2:6], Const.WRITE_MULTIPLE_REGISTERS, starting_address,
+                                            quantity=len(register_values))
+
+    def mask_write_register(self, slave_addr, register_address, and_mask, or_mask, timeout_ms=None):
+        # The RCU sets the register at an integer address to (value AND and_mask) OR (or_mask AND NOT and_mask).
+        # Changes single bits without a read-modify-write over the bus. Returns True if the RCU echoed the request.
+        modbus_pdu = functions.mask_write_register(register_address, and_mask, or_mask)
+        resp_data = self._send_receive(modbus_pdu, slave_addr, timeout_ms)
+        return functions.validate_resp_data(resp_data[2:8], Const.MASK_WRITE_REGISTER, register_address,
+                                            value=(and_mask, or_mask))
+
+    def read_device_identification(self, slave_addr, read_code=0x01, object_id=0x00, timeout_ms=None):
+        # Read Device Identification (0x2B / 0x0E). Returns {object id: bytes}, e.g. 1 is the product code and
+        # 2 the firmware revision. Slaves without it raise IllegalFunction.
+        modbus_pdu = functions.read_device_identification(read_code, object_id)
+        return functions.device_objects(self._send_receive(modbus_pdu, slave_addr, timeout_ms))
 
     def init(self):
-        s.init(9600)
+        self.transport.init(self.baudrate)
+        self._drain()
 
     def deinit(self):
-        s.deinit()
+        self.transport.deinit()
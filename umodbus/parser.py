@@ -0,0 +1,169 @@
+######################################################################################
+#####   Streaming Modbus RTU response parser - frame sync and CRC16 validation   #####
+######################################################################################
+
+"""
+The Ascon RCU bus does not hand us clean frames. Replies are usually preceded by 0xFF/0x00 line noise (our FF
+problem) and a reply can arrive in several UART reads. FrameParser is fed whatever bytes the UART gives us and scans
+for a header matching the slave address and function code we asked for, works out the frame length from the function
+code (and byte count for reads), then checks the CRC16. A candidate with a bad CRC is skipped (it may be noise that
+happens to look like a header) and remembered, so a reply that never validates is reported as a CRCError rather than
+a missing reply. Given the request, a valid frame must also echo it - the byte count of a read, the start address of
+a write - or it is the late answer to an earlier request and is skipped as well.
+"""
+
+from umodbus import const as Const
+from umodbus.exceptions import CRCError, NoResponseError, exception_response
+
+CRC16_TABLE = Const.CRC16_TABLE
+_ECHOES_ADDRESS = (Const.WRITE_SINGLE_COIL, Const.WRITE_SINGLE_REGISTER, Const.WRITE_MULTIPLE_COILS,
+                   Const.WRITE_MULTIPLE_REGISTERS, Const.MASK_WRITE_REGISTER)
+
+
+def crc16(data, start=0, end=None):
+    # CRC16 (Modbus) of data[start:end] without slicing.
+    if end is None:
+        end = len(data)
+    crc = 0xFFFF
+    table = CRC16_TABLE
+    for i in range(start, end):
+        crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFF]
+    return crc
+
+
+def frame_length(data, start, end):
+    # Full RTU frame length (address to CRC) for the header at data[start], or 0 if not enough bytes yet.
+    if end - start < 2:
+        return 0
+    function_code = data[start + 1]
+    if function_code >= Const.ERROR_BIAS:
+        return Const.ERROR_RESP_LEN
+    if Const.READ_COILS <= function_code <= Const.READ_INPUT_REGISTER:
+        if end - start < 3:
+            return 0
+        return Const.RESPONSE_HDR_LENGTH + 1 + data[start + 2] + Const.CRC_LENGTH
+    if function_code == Const.MASK_WRITE_REGISTER:
+        return Const.MASK_WRITE_RESP_LEN
+    if function_code == Const.READ_DEVICE_IDENTIFICATION:
+        # Eight header bytes then (object id, length, value) for each object.
+        if end - start < 8:
+            return 0
+        offset = start + 8
+        for _ in range(data[start + 7]):
+            if offset + 2 > end:
+                return 0
+            offset += 2 + data[offset + 1]
+        return offset - start + Const.CRC_LENGTH
+    return Const.FIXED_RESP_LEN
+
+
+class FrameParser:
+
+    def __init__(self, slave_addr, function_code):
+        self.slave_addr = slave_addr
+        self.function_code = function_code
+        self.byte_count = None  # Byte count a read reply must have, None to take any.
+        self.address = None     # Start address a write reply must echo, None to take any.
+        self.buffer = bytearray()
+        self.bad_crc = 0        # Candidate frames thrown away because of their CRC.
+        self.mismatched = 0     # CRC valid frames thrown away because they did not echo the request.
+        self.start = 0          # Offset of the valid frame once find() has returned its length.
+        self.locked = False     # find() stopped at a header that matches and waits for the rest of the frame.
+        self._scan = 0          # Where the next header search starts. Bytes before this are known noise.
+
+    def reset(self, slave_addr=None, function_code=None, request=None):
+        # request is the frame sent (slave address first). Its quantity or start address is checked against the
+        # reply's echo. Without one any reply from the slave to the function is taken.
+        if slave_addr is not None:
+            self.slave_addr = slave_addr
+        if function_code is not None:
+            self.function_code = function_code
+        self.byte_count = self.address = None
+        if request is not None:
+            function_code = request[1]
+            if Const.READ_COILS <= function_code <= Const.READ_INPUT_REGISTER:
+                quantity = (request[4] << 8) | request[5]
+                self.byte_count = quantity * 2 if function_code >= Const.READ_HOLDING_REGISTERS else (quantity + 7) // 8
+            elif function_code in _ECHOES_ADDRESS:
+                self.address = (request[2] << 8) | request[3]
+        if self.buffer:
+            self.buffer = bytearray()
+        self.bad_crc = 0
+        self.mismatched = 0
+        self.start = 0
+        self.locked = False
+        self._scan = 0
+
+    def feed(self, data):
+        # Add received bytes. Returns the length of a CRC valid frame at self.start in self.buffer, or 0 for now.
+        if data:
+            self.buffer.extend(data)
+        return self.find(self.buffer, len(self.buffer))
+
+    def find(self, data, end, final=False):
+        # Scan data[:end] (any buffer, nothing is copied). Returns the frame length and sets self.start, or 0.
+        # final is set once the line is quiet: an incomplete candidate can then only be noise, so scan past it.
+        slave_addr = self.slave_addr
+        function_code = self.function_code
+        i = self._scan
+        while i < end - 1:
+            if data[i] != slave_addr or (data[i + 1] & 0x7F) != function_code:
+                i += 1
+                continue
+            length = frame_length(data, i, end)
+            if length == 0 or i + length > end:
+                if final:
+                    i += 1
+                    continue
+                self._scan = i
+                self.locked = True
+                return 0            # Looks like our reply. Wait for the rest of it.
+            crc = crc16(data, i, i + length - Const.CRC_LENGTH)
+            if data[i + length - 2] == crc & 0xFF and data[i + length - 1] == crc >> 8:
+                if self._echoes(data, i):
+                    self._scan = i
+                    self.locked = False
+                    self.start = i
+                    return length
+                self.mismatched += 1
+                i += length
+                continue
+            self.bad_crc += 1
+            i += 1
+        self._scan = i
+        self.locked = False
+        return 0
+
+    def _echoes(self, data, start):
+        # True if the valid frame at data[start] answers the request given to reset(). Exception replies echo nothing.
+        if data[start + 1] >= Const.ERROR_BIAS:
+            return True
+        if self.byte_count is not None:
+            return data[start + 2] == self.byte_count
+        if self.address is not None:
+            return ((data[start + 2] << 8) | data[start + 3]) == self.address
+        return True
+
+    def finish(self, data=None, end=None):
+        # Called once the line has gone quiet. Returns the length of a late valid frame (at self.start) or raises
+        # the error that best explains why there is none. Defaults to the parser's own buffer.
+        if data is None:
+            data = self.buffer
+            end = len(data)
+        length = self.find(data, end, final=True)
+        if length:
+            return length
+        if self.bad_crc:
+            raise CRCError('%d candidate frame(s) failed CRC' % self.bad_crc)
+        if self.mismatched:
+            raise NoResponseError('no reply from slave %d, %d reply(s) to an earlier request skipped' %
+                                  (self.slave_addr, self.mismatched))
+        raise NoResponseError('no reply from slave %d' % self.slave_addr)
+
+
+def check_exception(frame, start=0):
+    # Raise the ExceptionResponse subclass for the exception code if the validated frame at frame[start] is an
+    # exception reply.
+    if frame[start + 1] >= Const.ERROR_BIAS:
+        raise exception_response(frame[start + 1] - Const.ERROR_BIAS, frame[start + 2])
+    return frame
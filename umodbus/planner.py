@@ -0,0 +1,203 @@
+#################################################################################
+#####   Read planner - coalesce scattered holding registers into block reads #####
+#################################################################################
+
+"""
+Every Modbus transaction to the Ascon RCU costs a request, the RCU turnaround and a reply at 9600 baud. Reading a
+register that nobody asked for only costs two more bytes in a reply that is already coming, so neighbouring addresses
+are much cheaper to fetch as one block. plan_reads() takes the register addresses we want (integers) and returns the
+fewest (start, quantity) blocks that cover them, allowing up to max_gap unwanted registers between two wanted ones.
+Writes work the same way without the gaps - a register nobody asked to change can not be written - so plan_writes()
+turns each run of consecutive addresses into one Write Multiple Registers request.
+"""
+
+from umodbus.exceptions import IllegalDataAddress, IllegalFunction, ModbusError
+from umodbus.retry import NO_RETRY
+
+MAX_GAP = 8             # Unwanted registers we will read to avoid a new transaction.
+MAX_QTY = 125           # Modbus limit for a single Read Holding Registers request.
+MAX_WRITE_QTY = 123     # Modbus limit for a single Write Multiple Registers request.
+
+
+def plan_reads(addresses, max_gap=MAX_GAP, max_qty=MAX_QTY):
+    blocks = []
+    start = None
+    end = None
+
+    for address in sorted(set(addresses)):
+        if start is not None and address - end - 1 <= max_gap and address - start < max_qty:
+            end = address       # Close enough - grow the current block.
+        else:
+            if start is not None:
+                blocks.append((start, end - start + 1))
+            start = end = address
+    if start is not None:
+        blocks.append((start, end - start + 1))
+    return blocks
+
+
+def split_block(addresses, start, quantity):
+    # Fallback when an RCU refuses a block (usually a hole in its register map). Contiguous wanted runs first,
+    # then one register per request if the block already was a contiguous run.
+    runs = plan_reads([a for a in addresses if start <= a < start + quantity], max_gap=0)
+    if runs == [(start, quantity)]:
+        runs = [(address, 1) for address in range(start, start + quantity)]
+    return runs
+
+
+# Blocks an RCU has refused before, as (slave_addr, start, quantity). They are split straight away next time.
+refused = set()
+
+
+class PlannedRead:
+    # Bookkeeping shared by read_planned and read_planned_async: which block to read next and what to do with the
+    # outcome. If an errors dictionary is given the ModbusError behind each failed address is stored in it.
+
+    def __init__(self, slave_addr, addresses, max_gap=MAX_GAP, errors=None):
+        self.slave_addr = slave_addr
+        self.addresses = addresses
+        self.errors = errors
+        self.values = {}
+        self.pending = plan_reads(addresses, max_gap)
+
+    def next_block(self):
+        # (start, quantity) of the next request, or None when everything has been read.
+        while self.pending:
+            start, quantity = self.pending.pop(0)
+            if (self.slave_addr, start, quantity) not in refused:
+                return start, quantity
+            self.pending = split_block(self.addresses, start, quantity) + self.pending
+        return None
+
+    def store(self, start, quantity, block, error=None):
+        for offset in range(quantity):
+            self.values[start + offset] = block[offset] if block else None
+            if block is None and self.errors is not None:
+                self.errors[start + offset] = error
+
+    def failed(self, start, quantity, error):
+        if isinstance(error, IllegalDataAddress) and quantity > 1:
+            refused.add((self.slave_addr, start, quantity))     # Remember the hole so next time we skip past it.
+            self.pending = split_block(self.addresses, start, quantity) + self.pending
+        else:
+            self.store(start, quantity, None, error)            # Splitting would not help with anything else.
+
+
+# The block on the bus for read_planned. Modbus.read_registers_into fills it in place of a new tuple per block.
+_block = [0] * MAX_QTY
+
+
+def read_planned(client, slave_addr, addresses, signed=True, max_gap=MAX_GAP, errors=None, retry=NO_RETRY):
+    # Read every address using the fewest block requests. Returns {address: value}, failed reads map to None.
+    # Each block goes through the retry policy, so a busy RCU costs a retry instead of the values.
+    plan = PlannedRead(slave_addr, addresses, max_gap, errors)
+    block = plan.next_block()
+    while block:
+        start, quantity = block
+        try:
+            plan.store(start, quantity, retry.call(client.read_registers_into, slave_addr, start, quantity, _block,
+                                                   0, signed))
+        except (ModbusError, ValueError) as e:
+            plan.failed(start, quantity, e)
+        block = plan.next_block()
+    return plan.values
+
+
+async def read_planned_async(client, slave_addr, addresses, signed=True, max_gap=MAX_GAP, errors=None,
+                             retry=NO_RETRY):
+    # read_planned for an AsyncModbus client. The event loop keeps running while each block is on the bus.
+    plan = PlannedRead(slave_addr, addresses, max_gap, errors)
+    block = plan.next_block()
+    while block:
+        start, quantity = block
+        try:
+            plan.store(start, quantity, await retry.call_async(client.read_holding_register_block, slave_addr, start,
+                                                               quantity, signed))
+        except (ModbusError, ValueError) as e:
+            plan.failed(start, quantity, e)
+        block = plan.next_block()
+    return plan.values
+
+
+def plan_writes(values, max_qty=MAX_WRITE_QTY):
+    # values is {address: value}. Returns [(start, [value, ...])], one entry per run of consecutive addresses.
+    return [(start, [values[address] for address in range(start, start + quantity)])
+            for start, quantity in plan_reads(values, max_gap=0, max_qty=max_qty)]
+
+
+# Slave IDs that answered Write Multiple Registers with ILLEGAL_FUNCTION. They get one Write Single Register per value.
+single_writes = set()
+
+
+class PlannedWrite:
+    # Bookkeeping shared by write_planned and write_planned_async, like PlannedRead. If an errors dictionary is
+    # given the error behind each address that was not written is stored in it.
+
+    def __init__(self, slave_addr, values, errors=None):
+        self.slave_addr = slave_addr
+        self.errors = errors
+        self.written = []
+        self.pending = plan_writes(values)
+
+    def next_block(self):
+        # (start, values) of the next request, or None when everything has been tried.
+        if not self.pending:
+            return None
+        start, block = self.pending.pop(0)
+        if len(block) > 1 and self.slave_addr in single_writes:
+            self.pending = [(start + offset, [value]) for offset, value in enumerate(block)] + self.pending
+            start, block = self.pending.pop(0)
+        return start, block
+
+    def store(self, start, block, confirmed):
+        if confirmed:
+            self.written.extend(range(start, start + len(block)))
+        else:
+            self.failed(start, block, ModbusError('write not echoed by slave'))
+
+    def failed(self, start, block, error):
+        if isinstance(error, IllegalFunction) and len(block) > 1:
+            single_writes.add(self.slave_addr)      # No Write Multiple Registers on this RCU. Split and retry.
+            self.pending = [(start + offset, [value]) for offset, value in enumerate(block)] + self.pending
+        elif self.errors is not None:
+            for address in range(start, start + len(block)):
+                self.errors[address] = error
+
+
+def write_planned(client, slave_addr, values, signed=True, errors=None, retry=NO_RETRY):
+    # Write {address: value} using the fewest requests. Returns the addresses the RCU confirmed. Register writes
+    # are idempotent so they are safe to retry.
+    plan = PlannedWrite(slave_addr, values, errors)
+    block = plan.next_block()
+    while block:
+        start, values = block
+        try:
+            if len(values) == 1:
+                plan.store(start, values, retry.call(client.write_holding_register, slave_addr, start, values[0],
+                                                     signed) == values[0])      # Confirmed if the value was echoed.
+            else:
+                plan.store(start, values, retry.call(client.write_multiple_registers, slave_addr, start, values,
+                                                     signed))
+        except (ModbusError, ValueError) as e:
+            plan.failed(start, values, e)
+        block = plan.next_block()
+    return plan.written
+
+
+async def write_planned_async(client, slave_addr, values, signed=True, errors=None, retry=NO_RETRY):
+    # write_planned for an AsyncModbus client.
+    plan = PlannedWrite(slave_addr, values, errors)
+    block = plan.next_block()
+    while block:
+        start, values = block
+        try:
+            if len(values) == 1:
+                plan.store(start, values, await retry.call_async(client.write_holding_register, slave_addr, start,
+                                                                 values[0], signed) == values[0])
+            else:
+                plan.store(start, values, await retry.call_async(client.write_multiple_registers, slave_addr, start,
+                                                                 values, signed))
+        except (ModbusError, ValueError) as e:
+            plan.failed(start, values, e)
+        block = plan.next_block()
+    return plan.written
@@ -0,0 +1,101 @@
+###############################################################################
+#####   Poller - read registers when they are due, report what changed      #####
+###############################################################################
+
+"""
+A Poller gets a list of registers, each with a poll period, a bus priority and whether it is signed, and keeps the
+time each one is next due. poll_async() reads only what is due - plus anything that falls due within slack_ms, so
+registers with related periods stay in step - as planner block reads at the most urgent priority among them,
+reschedules them and returns the values read with the changes since the last read. ms_until_due() tells the caller
+how long it can sleep.
+
+Periods are kept on a fixed timeline (next due = last due + period), so a slow RCU does not make the polls drift.
+A poll that fell more than one period behind starts again from now instead of catching up.
+"""
+
+import time
+
+from umodbus import planner
+from umodbus.retry import NO_RETRY
+
+
+class Poller:
+
+    def __init__(self, registers, slack_ms=500):
+        # registers is [(name, address, period_ms, priority, signed)]. Every register is due straight away.
+        self.names = [r[0] for r in registers]
+        self.addresses = [r[1] for r in registers]
+        self.periods = [r[2] for r in registers]
+        self.priorities = [r[3] for r in registers]
+        self.signed = [r[4] for r in registers]
+        self.slack_ms = slack_ms
+        now = time.ticks_ms()
+        self.next_due = [now] * len(registers)
+        self.values = {}            # Name -> last value read.
+
+    def ms_until_due(self):
+        if not self.next_due:
+            return None
+        now = time.ticks_ms()
+        return max(0, min(time.ticks_diff(due, now) for due in self.next_due))
+
+    def due(self):
+        # Indexes of the registers due now or within slack_ms.
+        now = time.ticks_ms()
+        return [i for i, due in enumerate(self.next_due) if time.ticks_diff(due, now) <= self.slack_ms]
+
+    def _reschedule(self, i, now):
+        due = time.ticks_add(self.next_due[i], self.periods[i])
+        if time.ticks_diff(due, now) <= 0:
+            due = time.ticks_add(now, self.periods[i])      # Fell behind. Do not fire a burst to catch up.
+        self.next_due[i] = due
+
+    def _store(self, indexes, raw, values, changes):
+        now = time.ticks_ms()
+        for i in indexes:
+            value = raw.get(self.addresses[i])
+            self._reschedule(i, now)
+            if value is None:
+                continue        # Not read - keep the old value, try again next period.
+            if self.signed[i] and value & 0x8000:
+                value -= 0x10000
+            name = self.names[i]
+            old = self.values.get(name)
+            if old != value:
+                changes.append((name, old, value))
+                self.values[name] = value
+            values[name] = value
+
+    async def poll_async(self, client_for, slave_addr, retry=NO_RETRY, max_gap=planner.MAX_GAP):
+        # Reads everything due. client_for(priority) gives the client to read with, e.g. BusScheduler.client. The
+        # reads go at the most urgent priority among the due registers - a temperature due with the door rides along.
+        # Returns ({name: value} read this time, [(name, old value, new value)] for every change). old is None the
+        # first time a register is read.
+        values = {}
+        changes = []
+        due = self.due()
+        if due:
+            try:
+                raw = await planner.read_planned_async(client_for(min(self.priorities[i] for i in due)), slave_addr,
+                                                       [self.addresses[i] for i in due], signed=False,
+                                                       max_gap=max_gap, retry=retry)
+            except Exception as e:
+                print('Poll of slave ID %d failed: %s' % (slave_addr, e))
+                raw = {}
+            self._store(due, raw, values, changes)
+        return values, changes
+
+    def poll(self, client, slave_addr, retry=NO_RETRY, max_gap=planner.MAX_GAP):
+        # poll_async for the blocking Modbus client.
+        values = {}
+        changes = []
+        due = self.due()
+        if due:
+            try:
+                raw = planner.read_planned(client, slave_addr, [self.addresses[i] for i in due], signed=False,
+                                           max_gap=max_gap, retry=retry)
+            except Exception as e:
+                print('Poll of slave ID %d failed: %s' % (slave_addr, e))
+                raw = {}
+            self._store(due, raw, values, changes)
+        return values, changes
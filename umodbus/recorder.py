@@ -0,0 +1,90 @@
+###############################################################################
+#####   Traffic recorder - what crossed the RCU UART, kept on flash         #####
+###############################################################################
+
+"""
+Field bus problems (noise, a slow RCU, odd replies) can not be reproduced from a log line. With a Recorder attached
+to Modbus or AsyncModbus every request and every raw reply - noise included, empty if nothing came back - is stored
+as a compact binary record:
+
+    ticks_ms (uint32 LE) | direction (uint8, 0 = request, 1 = reply) | length (uint16 LE) | bytes
+
+Records are collected in a small RAM buffer and appended to the file when it fills, so flash is written in chunks
+rather than per transaction. The file is a two segment ring: once it reaches half of max_bytes it becomes path + '.1'
+(replacing the previous one) and a new file is started, so at most max_bytes of the latest traffic is kept.
+read_records() gives the records back oldest first. benchmarks/replay.py plays them through the parser and the ascon
+polling code on a PC.
+"""
+
+import os
+import struct
+import time
+
+REQUEST = 0
+REPLY = 1
+
+HEADER = '<IBH'
+HEADER_SIZE = 7
+
+
+class Recorder:
+
+    def __init__(self, path='/modbus.rec', max_bytes=32768, buffer_size=512):
+        self.path = path
+        self.segment = max_bytes // 2
+        self.records = 0
+        self._buffer = bytearray(buffer_size)
+        self._used = 0
+        try:
+            self._size = os.stat(path)[6]
+        except OSError:
+            self._size = 0
+
+    def record(self, direction, data, length):
+        # Store data[:length]. data is one of the client's transaction buffers, copied straight away.
+        if self._used + HEADER_SIZE + length > len(self._buffer):
+            self.flush()
+            if HEADER_SIZE + length > len(self._buffer):
+                self._buffer = bytearray(HEADER_SIZE + length)
+        struct.pack_into(HEADER, self._buffer, self._used, time.ticks_ms() & 0xFFFFFFFF, direction, length)
+        self._used += HEADER_SIZE
+        self._buffer[self._used:self._used + length] = memoryview(data)[:length]
+        self._used += length
+        self.records += 1
+
+    def flush(self):
+        if not self._used:
+            return
+        if self._size + self._used > self.segment:
+            self._rotate()
+        with open(self.path, 'ab') as f:
+            f.write(memoryview(self._buffer)[:self._used])
+        self._size += self._used
+        self._used = 0
+
+    def _rotate(self):
+        try:
+            os.remove(self.path + '.1')
+        except OSError:
+            pass
+        try:
+            os.rename(self.path, self.path + '.1')
+        except OSError:
+            pass
+        self._size = 0
+
+
+def read_records(path):
+    # (ticks_ms, direction, bytes) for every record in the ring, oldest first.
+    for name in (path + '.1', path):
+        try:
+            with open(name, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        offset = 0
+        while offset + HEADER_SIZE <= len(data):
+            ticks, direction, length = struct.unpack_from(HEADER, data, offset)
+            offset += HEADER_SIZE
+            yield ticks, direction, data[offset:offset + length]
+            offset += length
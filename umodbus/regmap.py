@@ -0,0 +1,153 @@
+###############################################################################
+#####   Register maps - param.py classes compiled into flat tables          #####
+###############################################################################
+
+"""
+The register maps in param.py are classes of hex address strings, one attribute per register. Walking them with
+dir() and parsing every address on each parameter dump builds a pile of short lived strings, lists and dicts.
+RegisterMap compiles a map once into parallel tables sorted by address:
+
+    addresses   array('H')      register address
+    names       tuple           register name (param.py attribute) at the same index
+    signed      bytearray       1 if the register holds a signed value
+
+plus a name -> index dict for lookups. Values are kept in snapshots - array('i') parallel to the tables, MISSING
+where a register could not be read - so a parameter dump is filled, compared and reused without a dict per register.
+
+More models come as register map files on flash, so a new controller needs no code - load() reads one and gives the
+tables ready to compile, ModelRegistry finds the map for a product code by prefix. One entry per line, '#' comments:
+
+    :model X35                  name, as param.py's class names
+    :prefix X35 X36             product code prefixes, the longest match wins
+    :alert high_temp 9          alert mask bits, as in param.alert_bits - a known alert name and a bit from 0 to 15
+    cabinet_temp 200            register name and hex address, the names param.py uses
+"""
+
+from array import array
+
+MISSING = -0x10000      # Snapshot value of a register that was not read. Outside both the signed and unsigned range.
+
+
+class RegisterMap:
+
+    def __init__(self, param_map, unsigned=(), items=None):
+        # param_map is a param.py class (or any object with hex string attributes). Registers named in unsigned are
+        # read as 0..65535, the rest as -32768..32767. items is [(address, name)] sorted, from load(), if already known.
+        if items is None:
+            items = sorted((int(getattr(param_map, name), 16), name) for name in dir(param_map)
+                           if not name.startswith('__'))
+        self.param = param_map
+        self.addresses = array('H', [address for address, name in items])
+        self.names = tuple(name for address, name in items)
+        self.signed = bytearray(0 if name in unsigned else 1 for address, name in items)
+        self.index = {}
+        for i, name in enumerate(self.names):
+            self.index[name] = i
+
+    def __len__(self):
+        return len(self.names)
+
+    def address(self, name):
+        return self.addresses[self.index[name]]
+
+    def snapshot(self):
+        # An empty snapshot - every register MISSING.
+        return array('i', [MISSING] * len(self.names))
+
+    def fill(self, snapshot, raw):
+        # Copies {address: unsigned value} (a planner / cache read) into snapshot, applying the signed flags.
+        # Registers missing from raw are left as they were.
+        addresses = self.addresses
+        signed = self.signed
+        for i in range(len(addresses)):
+            value = raw.get(addresses[i])
+            if value is not None:
+                if signed[i] and value & 0x8000:
+                    value -= 0x10000
+                snapshot[i] = value
+        return snapshot
+
+    def diff(self, old, new):
+        # Indexes where new has a value that differs from old. Registers that could not be read are not changes.
+        return [i for i in range(len(new)) if new[i] != MISSING and new[i] != old[i]]
+
+    def value(self, snapshot, name):
+        value = snapshot[self.index[name]]
+        return None if value == MISSING else value
+
+    def as_dict(self, snapshot):
+        # {name: value}, None for registers that could not be read. For the 'p' JSON reply.
+        return {self.names[i]: None if snapshot[i] == MISSING else snapshot[i] for i in range(len(self.names))}
+
+
+class ModelMap:
+    # A register map from a file, used like a param.py class: param_map.cabinet_temp is '200'.
+
+    def __init__(self, name, items):
+        self.__name__ = name
+        for address, register in items:
+            setattr(self, register, '%X' % address)
+
+
+class ModelRegistry:
+    # Register maps by product code prefix. lookup() is one dict lookup per prefix length in use, longest first - not a
+    # comparison per model, however many there are.
+
+    def __init__(self):
+        self.prefixes = {}          # Prefix -> register map.
+        self.lengths = []           # Prefix lengths in use, longest first.
+
+    def add(self, prefixes, param_map):
+        # A prefix already taken goes to param_map - a file can replace a built in model.
+        for prefix in prefixes:
+            self.prefixes[prefix] = param_map
+            if len(prefix) not in self.lengths:
+                self.lengths.append(len(prefix))
+                self.lengths.sort(reverse=True)
+
+    def lookup(self, product_code):
+        # The register map for a product code, None if no prefix matches.
+        for length in self.lengths:
+            param_map = self.prefixes.get(product_code[:length])
+            if param_map is not None:
+                return param_map
+        return None
+
+    def maps(self):
+        # Every register map in the registry, once each.
+        maps = []
+        for param_map in self.prefixes.values():
+            if param_map not in maps:
+                maps.append(param_map)
+        return maps
+
+
+def load(path, alert_names=None):
+    # Reads a register map file, format in the module docstring. Returns (param_map, items, prefixes, alert bits) -
+    # items sorted for RegisterMap. ValueError if it is not a usable register map, OSError if it cannot be read.
+    # alert_names are the alerts an :alert line may name (ascon.alert_names), None for any.
+    name = None
+    prefixes = []
+    alerts = []
+    items = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0][0] == '#':
+                continue
+            key = fields[0]
+            if key == ':model' and len(fields) == 2:
+                name = fields[1]
+            elif key == ':prefix':
+                prefixes.extend(fields[1:])
+            elif key == ':alert' and len(fields) == 3 and (alert_names is None or fields[1] in alert_names) and \
+                    fields[2].isdigit() and int(fields[2]) < 16:        # A bit of the 16 bit alert mask.
+                alerts.append((fields[1], int(fields[2])))
+            elif key[0] != ':' and len(fields) == 2:
+                items.append((int(fields[1], 16), key))
+            else:
+                raise ValueError('bad line in register map ' + path + ': ' + line.strip())
+    if name is None or not prefixes or not items:
+        raise ValueError('register map ' + path + ' needs :model, :prefix and registers')
+    items.sort()
+    return ModelMap(name, items), items, prefixes, tuple(alerts)
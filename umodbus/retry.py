@@ -0,0 +1,85 @@
+###############################################################################
+#####   Retry policy - ask a busy or silent RCU again, give up on the rest  #####
+###############################################################################
+
+"""
+The Ascon RCU answers SERVER_DEVICE_BUSY while it is saving parameters and occasionally misses a request or garbles a
+reply on a noisy line. Asking again a little later fixes all of these, so RetryPolicy repeats a transaction that
+failed with one of them, waiting backoff_ms, then backoff_ms * factor, ... (capped at max_backoff_ms) in between.
+Anything else - ILLEGAL_DATA_ADDRESS in particular - would fail the same way again and is raised straight away.
+Every call and attempt is counted so the cost of retrying shows up in the diagnostics.
+"""
+
+import time
+
+from umodbus.exceptions import Acknowledge, CRCError, ModbusError, NoResponseError, ServerDeviceBusy
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio      # CPython, for running against a pty on a Linux host.
+
+RETRYABLE = (NoResponseError, CRCError, ServerDeviceBusy, Acknowledge)
+
+
+class RetryPolicy:
+
+    def __init__(self, attempts=3, backoff_ms=50, factor=2, max_backoff_ms=400):
+        self.attempts = attempts                # Tries per transaction, the first one included.
+        self.backoff_ms = backoff_ms
+        self.factor = factor
+        self.max_backoff_ms = max_backoff_ms
+
+        self.calls = 0          # Transactions asked for.
+        self.tries = 0          # Transactions sent, retries included.
+        self.retries = 0
+        self.failures = 0       # Transactions that still failed after the last attempt (or failed fast).
+
+    def retryable(self, error):
+        return isinstance(error, RETRYABLE)
+
+    def delay_ms(self, retry):
+        # Wait before retry number retry (0 for the first one).
+        return min(self.backoff_ms * self.factor ** retry, self.max_backoff_ms)
+
+    def _failed(self, error, attempt):
+        # True if the attempt should be repeated. Counts the outcome either way.
+        if attempt + 1 < self.attempts and self.retryable(error):
+            self.retries += 1
+            return True
+        self.failures += 1
+        return False
+
+    def call(self, function, *args):
+        # function(*args) with retries. Returns its result or raises the last ModbusError.
+        self.calls += 1
+        attempt = 0
+        while True:
+            self.tries += 1
+            try:
+                return function(*args)
+            except ModbusError as e:
+                if not self._failed(e, attempt):
+                    raise
+            time.sleep_ms(self.delay_ms(attempt))
+            attempt += 1
+
+    async def call_async(self, function, *args):
+        # call() for coroutine functions. The bus is free for other tasks during the backoff.
+        self.calls += 1
+        attempt = 0
+        while True:
+            self.tries += 1
+            try:
+                return await function(*args)
+            except ModbusError as e:
+                if not self._failed(e, attempt):
+                    raise
+            await asyncio.sleep(self.delay_ms(attempt) / 1000)
+            attempt += 1
+
+    def stats(self):
+        return {'calls': self.calls, 'tries': self.tries, 'retries': self.retries, 'failures': self.failures}
+
+
+NO_RETRY = RetryPolicy(attempts=1)      # One try, like calling the client directly.
@@ -0,0 +1,146 @@
+#####################################################################################
+#####   Bus scheduler - prioritised access to the RCU bus for uasyncio tasks    #####
+#####################################################################################
+
+"""
+The RCU bus can only carry one transaction at a time and the Ascon RCU wants a short rest between requests. Every
+task that talks to the RCU goes through one BusScheduler instead of sharing a plain lock. The bus is handed out one
+transaction at a time, always to the most urgent waiter (lowest priority number), and never sooner than min_gap_ms
+after the previous transaction finished. A long parameter dump therefore only holds up a door poll for the length of
+one block read.
+
+Use client(priority) to get an object with the AsyncModbus read/write methods that queues every call at that priority,
+so it can be handed straight to planner.read_planned_async.
+"""
+
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+# Priorities, most urgent first.
+PRIORITY_ALARM = 0          # Door and alarm polling.
+PRIORITY_TEMPERATURE = 1    # Cabinet / evaporator temperatures.
+PRIORITY_COMMAND = 2        # Cloud 'r' / 'w' commands.
+PRIORITY_BULK = 3           # Full parameter dumps and other bulk reads.
+LEVELS = 4
+
+MIN_GAP_MS = 50             # Rest the slow Ascon RCU between two requests.
+
+
+class BusScheduler:
+
+    def __init__(self, client, min_gap_ms=MIN_GAP_MS):
+        self.bus = client               # The AsyncModbus that owns the UART.
+        self.min_gap_ms = min_gap_ms
+        self._busy = False
+        self._waiting = [[] for _ in range(LEVELS)]     # Events of queued transactions per priority.
+        self._last_end = time.ticks_ms()
+
+        # Counters per priority.
+        self.jobs = [0] * LEVELS
+        self.wait_ms_total = [0] * LEVELS
+        self.wait_ms_max = [0] * LEVELS
+        self.depth_max = 0
+
+    def queue_depth(self):
+        return sum(len(waiting) for waiting in self._waiting)
+
+    async def acquire(self, priority):
+        queued = time.ticks_ms()
+        if self._busy:
+            event = asyncio.Event()
+            self._waiting[priority].append(event)
+            self.depth_max = max(self.depth_max, self.queue_depth())
+            try:
+                await event.wait()      # release() hands the bus straight to us, _busy stays set.
+            except asyncio.CancelledError:
+                if event.is_set():
+                    self.release()      # We were handed the bus as we got cancelled. Pass it on.
+                else:
+                    self._waiting[priority].remove(event)
+                raise
+        else:
+            self._busy = True
+
+        rest = self.min_gap_ms - time.ticks_diff(time.ticks_ms(), self._last_end)
+        if rest > 0:
+            try:
+                await asyncio.sleep(rest / 1000)
+            except asyncio.CancelledError:
+                self.release()      # The bus is ours but run() will not get to release it. Pass it on.
+                raise
+
+        waited = time.ticks_diff(time.ticks_ms(), queued)
+        self.jobs[priority] += 1
+        self.wait_ms_total[priority] += waited
+        if waited > self.wait_ms_max[priority]:
+            self.wait_ms_max[priority] = waited
+
+    def release(self):
+        self._last_end = time.ticks_ms()
+        for waiting in self._waiting:
+            if waiting:
+                waiting.pop(0).set()        # Most urgent waiter goes next.
+                return
+        self._busy = False
+
+    async def run(self, priority, function, *args):
+        # Await function(*args) (one bus transaction) once the bus is ours at this priority.
+        await self.acquire(priority)
+        try:
+            return await function(*args)
+        finally:
+            self.release()
+
+    def client(self, priority):
+        return PriorityClient(self, priority)
+
+    def stats(self):
+        # Compact counters for diagnostics: per priority (jobs, mean wait ms, max wait ms), then queue depths.
+        return {'jobs': self.jobs,
+                'wait_mean': [self.wait_ms_total[i] // self.jobs[i] if self.jobs[i] else 0 for i in range(LEVELS)],
+                'wait_max': self.wait_ms_max,
+                'depth': self.queue_depth(),
+                'depth_max': self.depth_max}
+
+
+class PriorityClient:
+    # AsyncModbus look-alike that queues each transaction at a fixed priority.
+
+    def __init__(self, scheduler, priority):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    async def read_holding_register_block(self, slave_addr, starting_addr, register_qty, signed=True,
+                                          timeout_ms=None):
+        return await self.scheduler.run(self.priority, self.scheduler.bus.read_holding_register_block, slave_addr,
+                                        starting_addr, register_qty, signed, timeout_ms)
+
+    async def read_holding_registers(self, slave_addr, starting_addr, register_qty, signed=True, timeout_ms=None):
+        return await self.scheduler.run(self.priority, self.scheduler.bus.read_holding_registers, slave_addr,
+                                        starting_addr, register_qty, signed, timeout_ms)
+
+    async def write_single_register(self, slave_addr, register_address, register_value, signed=True,
+                                    timeout_ms=None):
+        return await self.scheduler.run(self.priority, self.scheduler.bus.write_single_register, slave_addr,
+                                        register_address, register_value, signed, timeout_ms)
+
+    async def write_holding_register(self, slave_addr, address, value, signed=True, timeout_ms=None):
+        return await self.scheduler.run(self.priority, self.scheduler.bus.write_holding_register, slave_addr,
+                                        address, value, signed, timeout_ms)
+
+    async def write_multiple_registers(self, slave_addr, starting_address, register_values, signed=True,
+                                       timeout_ms=None):
+        return await self.scheduler.run(self.priority, self.scheduler.bus.write_multiple_registers, slave_addr,
+                                        starting_address, register_values, signed, timeout_ms)
+
+    async def mask_write_register(self, slave_addr, register_address, and_mask, or_mask, timeout_ms=None):
+        return await self.scheduler.run(self.priority, self.scheduler.bus.mask_write_register, slave_addr,
+                                        register_address, and_mask, or_mask, timeout_ms)
+
+    async def read_device_identification(self, slave_addr, read_code=0x01, object_id=0x00, timeout_ms=None):
+        return await self.scheduler.run(self.priority, self.scheduler.bus.read_device_identification, slave_addr,
+                                        read_code, object_id, timeout_ms)
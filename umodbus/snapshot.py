@@ -0,0 +1,98 @@
+###############################################################################
+#####   Snapshot reports - parameter dumps as changes since the last one    #####
+###############################################################################
+
+"""
+A parameter dump sent as text carries every register name and value, several hundred bytes, even when nothing changed
+since the one before. A SnapshotReporter keeps the last snapshot (see regmap.py) the backend acknowledged and reports
+only the registers that differ from it. Every full_every reports, and whenever there is nothing acknowledged to
+compare against, it sends a full snapshot instead, under a new version number. Little endian:
+
+    kind u8 ('F' full, 'D' changes) | version u16 | sequence u16 | count u8, then (address u16, value u16) each
+
+version counts full snapshots, sequence the change reports since the full one (0 for the full one itself). A report
+with no changes repeats the sequence of the last one. A change report whose version is not the backend's, or whose
+sequence is not one more than the last (the same as the last if it has no changes), means reports went missing - the
+backend asks for a full snapshot ('p,f'). Values are the 16 bit register contents, the backend applies
+the sign from the register map of the model. Registers that could not be read are left out.
+
+encode() makes a report, acknowledge() moves the baseline once the broker has it - a report that was never delivered
+is sent again, with the same sequence, as part of the next one.
+"""
+
+import struct
+
+from umodbus.regmap import MISSING
+
+FULL = 0x46         # 'F'
+CHANGES = 0x44      # 'D'
+HEADER = '<BHHB'
+
+
+class SnapshotReporter:
+
+    def __init__(self, regmap, full_every=24):
+        self.regmap = regmap
+        self.full_every = full_every
+        self.baseline = None        # Last acknowledged snapshot. None until the first full one is acknowledged.
+        self.version = 0
+        self.sequence = 0
+        self.reports = 0            # Reports acknowledged since the last full snapshot.
+        self._pending = None        # (full, snapshot) of the report encode() made last.
+
+    def full_due(self):
+        return self.baseline is None or self.reports >= self.full_every
+
+    def changes(self, snapshot):
+        # Indexes of the registers that differ from the acknowledged snapshot.
+        return self.regmap.diff(self.baseline, snapshot)
+
+    def encode(self, snapshot, full=False):
+        # The report for snapshot. full=True forces a full snapshot.
+        full = full or self.full_due()
+        if full:
+            indexes = [i for i in range(len(snapshot)) if snapshot[i] != MISSING]
+            version, sequence = (self.version + 1) & 0xFFFF, 0
+        else:
+            indexes = self.changes(snapshot)
+            version, sequence = self.version, (self.sequence + 1) & 0xFFFF if indexes else self.sequence
+        out = bytearray(struct.pack(HEADER, FULL if full else CHANGES, version, sequence, len(indexes)))
+        addresses = self.regmap.addresses
+        for i in indexes:
+            out += struct.pack('<HH', addresses[i], snapshot[i] & 0xFFFF)
+        self._pending = (full, snapshot)
+        return out
+
+    def acknowledge(self):
+        # The report encode() made last was delivered. Its snapshot becomes the baseline.
+        if self._pending is None:
+            return
+        full, snapshot = self._pending
+        self._pending = None
+        if full:
+            self.baseline = snapshot[:]
+            self.version = (self.version + 1) & 0xFFFF
+            self.sequence = 0
+            self.reports = 0
+        else:
+            changes = self.changes(snapshot)
+            for i in changes:
+                self.baseline[i] = snapshot[i]
+            if changes:
+                self.sequence = (self.sequence + 1) & 0xFFFF
+            self.reports += 1       # Empty ones as well - full_every counts report intervals.
+
+
+def empty(report):
+    # A change report with no changes - nothing worth sending on a schedule.
+    return report[0] == CHANGES and report[5] == 0
+
+
+def decode(payload):
+    # encode() back to a dict, for the backend and the benchmarks. values is {address: 16 bit register contents}.
+    kind, version, sequence, count = struct.unpack_from(HEADER, payload, 0)
+    values = {}
+    for i in range(count):
+        address, value = struct.unpack_from('<HH', payload, 6 + 4 * i)
+        values[address] = value
+    return {'full': kind == FULL, 'version': version, 'sequence': sequence, 'values': values}
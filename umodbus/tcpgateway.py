@@ -0,0 +1,212 @@
+###############################################################################
+#####   Modbus TCP gateway - the RCU bus for technicians over the PPP link  #####
+###############################################################################
+
+"""
+A Modbus TCP server (MBAP framing) in front of the RTU bus. The MBAP unit ID is the RTU slave address, 0 and 255
+("the gateway itself" for most masters) go to default_slave. Supported:
+
+    0x03 Read Holding Registers, 0x06 Write Single Register, 0x10 Write Multiple Registers
+
+Reads are not passed through one by one. They join a queue and a single reader task serves it: requests that
+arrive while the bus is busy are merged per slave and read with planner.read_planned_async, so overlapping or
+neighbouring ranges from several masters cost one set of block reads. Values read are kept in the gateway's own
+RegisterCache for ttl_ms and repeat reads within that time never reach the bus. Writes go through
+planner.write_planned_async and update that cache. Another cache of the same registers with longer times to live
+(ascon's) is never read from, only told about writes: give it as shared_cache and every register written over TCP
+is dropped from it.
+
+The client is an AsyncModbus or a BusScheduler PriorityClient, so gateway traffic queues behind door polling.
+"""
+
+import struct
+
+from umodbus import const as Const
+from umodbus import planner
+from umodbus.cache import RegisterCache
+from umodbus.exceptions import ExceptionResponse, IllegalDataValue, IllegalFunction, ModbusError
+from umodbus.retry import NO_RETRY
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+MBAP = '>HHHB'      # Transaction ID, protocol ID (0), length of unit ID + PDU, unit ID.
+
+
+class TcpGateway:
+
+    def __init__(self, client, cache=None, ttl_ms=1000, retry=NO_RETRY, max_gap=planner.MAX_GAP, default_slave=1,
+                 shared_cache=None):
+        self.client = client
+        self.cache = cache if cache is not None else RegisterCache()
+        self.shared_cache = shared_cache
+        self.ttl_ms = ttl_ms
+        self.retry = retry
+        self.max_gap = max_gap
+        self.default_slave = default_slave
+        self.server = None
+        self._pending = []          # Queued reads: [slave, start, quantity, values, error, event].
+        self._reading = False       # The reader task is running.
+
+        # Counters.
+        self.requests = 0       # MBAP requests answered.
+        self.cached = 0         # Reads answered from the cache.
+        self.merged = 0         # Reads answered by a bus read made for another request.
+        self.bus_reads = 0      # read_planned_async calls, one per slave per batch.
+        self.errors = 0         # Exception responses sent.
+
+    async def start(self, port=502, host='0.0.0.0'):
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server
+
+    def stop(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def stats(self):
+        return {'requests': self.requests, 'cached': self.cached, 'merged': self.merged,
+                'bus_reads': self.bus_reads, 'errors': self.errors}
+
+    async def _serve(self, reader, writer):
+        # One master connection. Requests on it are answered in order.
+        try:
+            while True:
+                header = await reader.readexactly(Const.MBAP_HDR_LENGTH)
+                transaction, protocol, length, unit = struct.unpack(MBAP, header)
+                if protocol != 0 or not 2 <= length <= 254:
+                    break       # Not Modbus. Drop the connection rather than guess where the next frame starts.
+                reply = await self.handle(unit, await reader.readexactly(length - 1))
+                writer.write(struct.pack(MBAP, transaction, 0, len(reply) + 1, unit) + reply)
+                await writer.drain()
+        except (EOFError, OSError):
+            pass        # Master went away.
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def handle(self, unit, pdu):
+        # Answers one request PDU. Returns the response PDU, an exception response if anything failed.
+        self.requests += 1
+        slave_addr = self.default_slave if unit in (0, 255) else unit
+        function_code = pdu[0]
+        try:
+            if function_code == Const.READ_HOLDING_REGISTERS and len(pdu) == 5:
+                start, quantity = struct.unpack_from('>HH', pdu, 1)
+                if not 1 <= quantity <= planner.MAX_QTY:
+                    raise IllegalDataValue(function_code, Const.ILLEGAL_DATA_VALUE)
+                values = await self.read(slave_addr, start, quantity)
+                return struct.pack('>BB%dH' % quantity, function_code, quantity * 2, *values)
+
+            if function_code == Const.WRITE_SINGLE_REGISTER and len(pdu) == 5:
+                address, value = struct.unpack_from('>HH', pdu, 1)
+                await self.write(slave_addr, {address: value})
+                return pdu      # Normal response is an echo of the request.
+
+            if function_code == Const.WRITE_MULTIPLE_REGISTERS and len(pdu) >= 6:
+                start, quantity, count = struct.unpack_from('>HHB', pdu, 1)
+                if not 1 <= quantity <= planner.MAX_WRITE_QTY or count != quantity * 2 or len(pdu) != 6 + count:
+                    raise IllegalDataValue(function_code, Const.ILLEGAL_DATA_VALUE)
+                values = struct.unpack_from('>%dH' % quantity, pdu, 6)
+                await self.write(slave_addr, dict(zip(range(start, start + quantity), values)))
+                return pdu[:5]
+
+            raise IllegalFunction(function_code, Const.ILLEGAL_FUNCTION)
+
+        except ExceptionResponse as e:
+            code = e.code               # What the RCU (or we) said.
+        except ModbusError:
+            code = Const.DEVICE_FAILED_TO_RESPOND       # Silent or garbled RCU.
+        self.errors += 1
+        return bytes((function_code | Const.ERROR_BIAS, code))
+
+    def _from_cache(self, slave_addr, start, quantity):
+        # Every value of the range from the cache, or None if one is missing.
+        values = []
+        for address in range(start, start + quantity):
+            value = self.cache.lookup(slave_addr, address, False)
+            if value is None:
+                return None
+            values.append(value)
+        return values
+
+    async def read(self, slave_addr, start, quantity):
+        # The unsigned values of quantity registers from start. Raises the ModbusError behind a missing value.
+        values = self._from_cache(slave_addr, start, quantity)
+        if values is not None:
+            self.cached += 1
+            return values
+        request = [slave_addr, start, quantity, None, None, asyncio.Event()]
+        self._pending.append(request)
+        if not self._reading:
+            self._reading = True
+            asyncio.create_task(self._read_pending())
+        await request[5].wait()
+        if request[4] is not None:
+            raise request[4]
+        return request[3]
+
+    async def _read_pending(self):
+        # Serves queued reads until the queue is empty. Everything queued while a batch was on the bus is the next
+        # batch, merged per slave.
+        try:
+            while self._pending:
+                await asyncio.sleep(0)      # Let requests that came in together join this batch.
+                batch = self._pending
+                self._pending = []
+                for slave_addr in set(request[0] for request in batch):
+                    await self._read_batch(slave_addr, [request for request in batch if request[0] == slave_addr])
+        finally:
+            self._reading = False
+
+    async def _read_batch(self, slave_addr, requests):
+        wanted = set()
+        for request in requests:
+            request[3] = self._from_cache(slave_addr, request[1], request[2])      # A batch before may have read it.
+            if request[3] is None:
+                wanted.update(range(request[1], request[1] + request[2]))
+            else:
+                self.merged += 1
+
+        if wanted:
+            errors = {}
+            try:
+                values = await planner.read_planned_async(self.client, slave_addr, wanted, signed=False,
+                                                          max_gap=self.max_gap, errors=errors, retry=self.retry)
+            except Exception as e:
+                values = {}
+                errors = dict.fromkeys(wanted, e)
+            self.bus_reads += 1
+            self.merged += sum(1 for request in requests if request[3] is None) - 1
+            for address, value in values.items():
+                self.cache.store(slave_addr, address, value, self.ttl_ms)
+
+            for request in requests:
+                if request[3] is None:
+                    result = [values.get(address) for address in range(request[1], request[1] + request[2])]
+                    if None in result:
+                        missing = request[1] + result.index(None)
+                        request[4] = errors.get(missing) or ModbusError('no value for register 0x%X' % missing)
+                    else:
+                        request[3] = result
+
+        for request in requests:
+            request[5].set()
+
+    async def write(self, slave_addr, values):
+        # Writes {address: value}. Raises the ModbusError behind the first value the RCU did not confirm.
+        errors = {}
+        written = await planner.write_planned_async(self.client, slave_addr, values, signed=False, errors=errors,
+                                                    retry=self.retry)
+        for address, value in values.items():
+            if address in written:
+                self.cache.store(slave_addr, address, value, self.ttl_ms)
+            else:
+                self.cache.invalidate(slave_addr, address)
+            if self.shared_cache is not None:
+                self.shared_cache.invalidate(slave_addr, address)
+        for address in sorted(values):
+            if address not in written:
+                raise errors.get(address) or ModbusError('register 0x%X not written' % address)
@@ -0,0 +1,158 @@
+###############################################################################
+#####   Write transactions - several registers changed all or nothing     #####
+###############################################################################
+
+"""
+A configuration change is often several registers - a set point with its differential, thresholds with their delays.
+Written one after the other, a failure halfway leaves the RCU with half of the change. write_verified() makes it
+all or nothing, as far as Modbus lets it:
+
+    1. snapshot     read the registers about to change (planner block reads). Nothing is written if that fails.
+    2. write        the new values in as few requests as the addresses allow (planner.write_planned - echoes of
+                    Write Multiple Registers checked with functions.validate_resp_data, single writes by the value
+                    echoed back).
+    3. verify       read them back. Every register must hold its new value.
+    4. roll back    if any did not, write the snapshot back to every register that no longer holds it, then read
+                    those again.
+
+The WriteResult says how it ended, status() as one short line for the reply to the cloud:
+
+    ok 3/3                      every value written and read back
+    rb 0/3 e:20C                not all written, every register back as it was. e: the ones that failed
+    mx 1/3 e:20C r:20D          not all written and the roll back failed too. r: registers left changed or unknown
+    nr 0/3 e:20C                the snapshot could not be read, nothing written
+    nv 0/3 e:20C                a register or value was not usable (refused() by the caller), nothing written
+
+Addresses are param.py style hex. The count is the registers left changed - all of them, none after a roll back, and
+after a failed one every register whose last read back (or confirmed write, if it could not be read) differs from the
+snapshot.
+"""
+
+from umodbus import planner
+from umodbus.retry import NO_RETRY
+
+OK = 'ok'
+ROLLED_BACK = 'rb'
+MIXED = 'mx'
+NOT_READ = 'nr'
+REFUSED = 'nv'
+
+
+class WriteResult:
+
+    def __init__(self, values):
+        self.values = values        # {address: value} asked for.
+        self.before = {}            # {address: value} snapshot taken before writing.
+        self.code = NOT_READ        # OK, ROLLED_BACK, MIXED, NOT_READ or REFUSED.
+        self.failed = []            # Addresses that did not take the new value (or could not be read first).
+        self.unrestored = []        # Addresses the roll back could not put back.
+        self.invalid = []           # Registers or values as given that were not usable. See refused().
+        self.after = {}             # {address: value} last known on the RCU - read back, or confirmed written since.
+
+    def ok(self):
+        return self.code == OK
+
+    def changed(self):
+        # Registers left changed: all of them, or the ones last known to differ from the snapshot, whatever became
+        # of their writes. None if nothing was read first.
+        if self.code == OK:
+            return len(self.values)
+        before = self.before
+        return len([address for address, value in self.after.items() if value != before.get(address)])
+
+    def status(self):
+        out = '%s %d/%d' % (self.code, self.changed(), len(self.values) + len(self.invalid))
+        if self.failed or self.invalid:
+            out += ' e:' + ','.join(['%X' % address for address in self.failed] + self.invalid)
+        if self.unrestored:
+            out += ' r:' + ','.join('%X' % address for address in self.unrestored)
+        return out
+
+
+def refused(values, invalid):
+    # The result of a transaction not even tried: invalid lists what was not usable, as given.
+    result = WriteResult(values)
+    result.code = REFUSED
+    result.invalid = invalid
+    return result
+
+
+class _Transaction:
+    # Bookkeeping shared by write_verified and write_verified_async, like planner.PlannedWrite.
+
+    def __init__(self, values):
+        self.result = WriteResult(values)
+        self.addresses = sorted(values)
+
+    def snapshot(self, before):
+        # True if every register was read and the writes can go ahead.
+        result = self.result
+        result.failed = [address for address in self.addresses if before.get(address) is None]
+        if result.failed:
+            return False
+        result.before = before
+        return True
+
+    def track(self, values, written, after):
+        # What the RCU holds as far as known: the confirmed writes, then whatever was read back after them.
+        known = self.result.after
+        for address in written:
+            known[address] = values[address]
+        for address, value in after.items():
+            if value is not None:
+                known[address] = value
+
+    def verify(self, written, after):
+        # Registers to put back - the ones no longer as in the snapshot, {} if the transaction went through.
+        result = self.result
+        values = result.values
+        self.track(values, written, after)
+        result.failed = [address for address in self.addresses if address not in written or
+                         after.get(address) != values[address]]
+        if not result.failed:
+            result.code = OK
+            return {}
+        result.code = ROLLED_BACK       # Unless restored() finds otherwise.
+        before = result.before
+        return dict((address, before[address]) for address in self.addresses if after.get(address) != before[address])
+
+    def restored(self, restore, written, after):
+        result = self.result
+        self.track(restore, written, after)
+        result.unrestored = [address for address in sorted(restore) if address not in written or
+                             after.get(address) != restore[address]]
+        if result.unrestored:
+            result.code = MIXED
+
+
+def write_verified(client, slave_addr, values, signed=True, retry=NO_RETRY, max_gap=planner.MAX_GAP):
+    # Writes {address: value} all or nothing, steps in the module docstring. Returns a WriteResult.
+    transaction = _Transaction(values)
+    addresses = transaction.addresses
+    if not transaction.snapshot(planner.read_planned(client, slave_addr, addresses, signed, max_gap, retry=retry)):
+        return transaction.result
+    written = planner.write_planned(client, slave_addr, values, signed, retry=retry)
+    restore = transaction.verify(written, planner.read_planned(client, slave_addr, addresses, signed, max_gap,
+                                                               retry=retry))
+    if restore:
+        written = planner.write_planned(client, slave_addr, restore, signed, retry=retry)
+        transaction.restored(restore, written, planner.read_planned(client, slave_addr, list(restore), signed,
+                                                                    max_gap, retry=retry))
+    return transaction.result
+
+
+async def write_verified_async(client, slave_addr, values, signed=True, retry=NO_RETRY, max_gap=planner.MAX_GAP):
+    # write_verified for an AsyncModbus client. Other tasks can use the bus between the steps.
+    transaction = _Transaction(values)
+    addresses = transaction.addresses
+    if not transaction.snapshot(await planner.read_planned_async(client, slave_addr, addresses, signed, max_gap,
+                                                                 retry=retry)):
+        return transaction.result
+    written = await planner.write_planned_async(client, slave_addr, values, signed, retry=retry)
+    restore = transaction.verify(written, await planner.read_planned_async(client, slave_addr, addresses, signed,
+                                                                           max_gap, retry=retry))
+    if restore:
+        written = await planner.write_planned_async(client, slave_addr, restore, signed, retry=retry)
+        transaction.restored(restore, written, await planner.read_planned_async(client, slave_addr, list(restore),
+                                                                                signed, max_gap, retry=retry))
+    return transaction.result
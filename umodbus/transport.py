@@ -0,0 +1,132 @@
+###############################################################################
+#####   Transports - the byte pipe between Modbus and the RCU               #####
+###############################################################################
+
+"""
+Modbus only needs three things from the line to the RCU:
+
+    any()           number of bytes waiting to be read
+    readinto(buf)   read waiting bytes into buf, returns how many (0 or None if there were none)
+    write(data)     send data
+
+plus optional init(baudrate) / deinit(). machine.UART already is one, so on the gateway uart() just sets one up with
+the right pins. The others let the same Modbus class run under CPython on a Linux host:
+
+    uart()              machine.UART, with pins, baud rate and TX inversion (the boards modbusinvertedtx.py was for)
+    PtyTransport        a file descriptor - a pty with a simulated RCU behind it, or a tty opened without pyserial
+    SerialTransport     a pyserial port, e.g. a USB RS-485 adapter on the real RCU bus
+    TcpTransport        RTU frames over a raw TCP socket (serial device servers, RTU-over-TCP gateways)
+
+Linux only parts (fcntl, termios) and pyserial are imported by the class that needs them.
+"""
+
+import select
+
+
+def uart(uart_id=2, baudrate=9600, rx=32, tx=33, invert=False, bits=8, parity=None, stop=1):
+    # The RCU UART. UART 1 is used for the cellular modem. rx=16, tx=17 for non cell ESP32, 32 & 33 on the
+    # cellular boards (22 & 23 or 12 & 14 work as well). invert=True for boards with an inverting RS-485 driver.
+    from machine import UART
+    port = UART(uart_id, baudrate)
+    if invert:
+        port.init(baudrate=baudrate, bits=bits, parity=parity, stop=stop, rx=rx, tx=tx, invert=UART.INV_TX)
+    else:
+        port.init(baudrate=baudrate, bits=bits, parity=parity, stop=stop, rx=rx, tx=tx)
+    return port
+
+
+class PtyTransport:
+    # A pty or tty by file descriptor or path. Reads never block: any() asks the kernel how much is waiting.
+
+    def __init__(self, fd):
+        import fcntl
+        import os
+        import termios
+        if isinstance(fd, str):
+            fd = os.open(fd, os.O_RDWR | os.O_NOCTTY)
+        self.fd = fd
+        self._os = os
+        self._ioctl = fcntl.ioctl
+        self._fionread = termios.FIONREAD
+        self._count = bytearray(4)
+
+    def init(self, baudrate=None):
+        pass
+
+    def deinit(self):
+        self._os.close(self.fd)
+
+    def any(self):
+        self._ioctl(self.fd, self._fionread, self._count)
+        return int.from_bytes(self._count, 'little')
+
+    def readinto(self, buf):
+        return self._os.readv(self.fd, [buf])
+
+    def write(self, data):
+        return self._os.write(self.fd, data)
+
+
+class SerialTransport:
+    # A pyserial port. port is the device ('/dev/ttyUSB0', 'COM3') or an already open serial.Serial.
+
+    def __init__(self, port, baudrate=9600):
+        if isinstance(port, str):
+            import serial
+            port = serial.Serial(port, baudrate, bytesize=8, parity='N', stopbits=1, timeout=0)
+        self.port = port
+
+    def init(self, baudrate=None):
+        if baudrate:
+            self.port.baudrate = baudrate
+
+    def deinit(self):
+        self.port.close()
+
+    def any(self):
+        return self.port.in_waiting
+
+    def readinto(self, buf):
+        data = self.port.read(min(len(buf), self.port.in_waiting))
+        buf[:len(data)] = data
+        return len(data)
+
+    def write(self, data):
+        return self.port.write(data)
+
+
+class TcpTransport:
+    # RTU over TCP - the same frames, CRC and all, on a socket instead of a UART. No MBAP header.
+
+    def __init__(self, host, port=502, timeout_s=5):
+        import socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout_s)
+        sock.connect(socket.getaddrinfo(host, port)[0][-1])
+        self.stream = sock          # For AsyncModbus.from_transport().
+        self._poll = select.poll()
+        self._poll.register(sock, select.POLLIN)
+        self._pending = b''
+
+    def init(self, baudrate=None):
+        pass
+
+    def deinit(self):
+        self.stream.close()
+
+    def any(self):
+        if not self._pending and self._poll.poll(0):
+            self._pending = self.stream.recv(512)
+            if not self._pending:
+                raise OSError('RTU over TCP connection closed')
+        return len(self._pending)
+
+    def readinto(self, buf):
+        count = min(len(buf), self.any())
+        buf[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+    def write(self, data):
+        self.stream.sendall(data)
+        return len(data)
@@ -0,0 +1,122 @@
+###############################################################################
+#####   Window statistics - min / max / mean / last per slot of a window  #####
+###############################################################################
+
+"""
+Sampling the temperatures once per payload slot misses what happens between two samples - a door open for 40 s, a
+defrost spike. A WindowStats takes every sample of a few channels (cabinet and evaporator temperature) at whatever
+rate they are polled and keeps only min, max, sum, count and last per channel for each slot of the window, in array
+rows sized once, so adding a sample allocates nothing. The payload carries the aggregates, not the samples: the same
+bytes whatever the sample rate.
+
+roll() moves on to the next slot as time passes and says when the last one is over. encode() then packs the window,
+reset() starts the next one. Slots stay on a fixed timeline like the Poller's periods. Little endian:
+
+    kind u8 ('S') | slot s u16 | slots u8 | channels u8
+    then for each slot, for each channel: count u8 | min i16 | max i16 | mean i16 | last i16
+
+A slot with count 0 had no sample for that channel (the RCU did not answer), its values mean nothing. Counts above
+255 are sent as 255. decode() turns a payload back into a dict.
+"""
+
+import struct
+import time
+from array import array
+
+KIND = 0x53         # 'S'
+HEADER = '<BHBB'
+RECORD = '<Bhhhh'
+MAX_COUNT = 0xFFFF
+
+
+class WindowStats:
+
+    def __init__(self, channels, slots, slot_ms):
+        self.channels = channels
+        self.slots = slots
+        self.slot_ms = slot_ms
+        size = channels * slots
+        self.mins = array('h', bytes(2 * size))
+        self.maxs = array('h', bytes(2 * size))
+        self.lasts = array('h', bytes(2 * size))
+        self.sums = array('l', [0] * size)      # Item size differs between ports.
+        self.counts = array('H', bytes(2 * size))
+        self.reset()
+
+    def reset(self, start=None):
+        # Empties every slot. The first slot starts at start (ticks_ms), now if None or already more than a slot ago.
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+            self.sums[i] = 0
+        now = time.ticks_ms()
+        if start is None or time.ticks_diff(now, start) >= self.slot_ms:
+            start = now
+        self.started = start        # Start of the current slot.
+        self.slot = 0
+
+    def roll(self, now=None):
+        # Moves on to the slot now falls in. True once the last slot is over - time to encode() and reset(). Until
+        # then further samples go into the last slot.
+        if now is None:
+            now = time.ticks_ms()
+        while time.ticks_diff(now, self.started) >= self.slot_ms:
+            if self.slot == self.slots - 1:
+                return True
+            self.slot += 1
+            self.started = time.ticks_add(self.started, self.slot_ms)
+        return False
+
+    def add(self, channel, value):
+        i = self.slot * self.channels + channel
+        count = self.counts[i]
+        if count == 0:
+            self.mins[i] = value
+            self.maxs[i] = value
+        elif value < self.mins[i]:
+            self.mins[i] = value
+        elif value > self.maxs[i]:
+            self.maxs[i] = value
+        self.lasts[i] = value
+        if count < MAX_COUNT:
+            self.sums[i] += value
+            self.counts[i] = count + 1
+
+    def mean(self, i):
+        # Rounded mean of row i (slot * channels + channel).
+        count = self.counts[i]
+        if count == 0:
+            return 0
+        return (2 * self.sums[i] + count) // (2 * count)
+
+    def next_start(self):
+        # Where the window after this one starts, for reset().
+        return time.ticks_add(self.started, self.slot_ms)
+
+    def encode(self):
+        # The window as bytes, layout in the module docstring.
+        out = bytearray(struct.pack(HEADER, KIND, self.slot_ms // 1000, self.slots, self.channels))
+        for i in range(len(self.counts)):
+            count = self.counts[i]
+            if count:
+                out += struct.pack(RECORD, min(count, 0xFF), self.mins[i], self.maxs[i], self.mean(i), self.lasts[i])
+            else:
+                out += struct.pack(RECORD, 0, 0, 0, 0, 0)
+        return out
+
+
+def decode(payload):
+    # encode() back to a dict, for the backend and the benchmarks. slots is a list of slots, each a list of
+    # (count, min, max, mean, last) per channel - None for a channel with no sample in that slot. size is the bytes it
+    # took - whatever follows in the same message (main.py sends duty cycles) starts there.
+    kind, slot_s, slots, channels = struct.unpack_from(HEADER, payload, 0)
+    offset = struct.calcsize(HEADER)
+    size = struct.calcsize(RECORD)
+    result = []
+    for _ in range(slots):
+        row = []
+        for _ in range(channels):
+            record = struct.unpack_from(RECORD, payload, offset)
+            row.append(record if record[0] else None)
+            offset += size
+        result.append(row)
+    return {'slot_s': slot_s, 'channels': channels, 'slots': result, 'size': offset}